@@ -17,6 +17,8 @@ class CaptionedImageBlock(StructBlock):
     class Meta:
         icon = "image"
         template = "base/blocks/captioned_image_block.html"
+        # Renditions used by the template, generated when a page is published
+        rendition_filters = ["fill-600x338"]
 
 
 class HeadingBlock(StructBlock):
@@ -0,0 +1,84 @@
+"""
+Conditional GET support for page responses.
+
+Pages using ``ConditionalGetMixin`` send an ETag and Last-Modified, and
+requests whose validators still match are answered with a 304 before the
+page is rendered.
+
+The ETag is built from the page's ``last_published_at`` and the
+generations that base/page_cache.py and base/navigation.py bump when
+anything shown on the page changes: pages referencing it, the authors and
+images it shows, the menus and the footer text. Generations record when
+they were bumped, so Last-Modified is the latest of those times and
+``last_published_at``.
+
+Only anonymous visitors get validators. Pages of signed-in visitors embed
+their CSRF token, which a 304 would keep after it was rotated.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+
+from base import navigation, page_cache, sites
+
+
+def get_validators(page, request):
+    """Returns the ``(etag, last_modified)`` of ``page`` for anonymous ``request``."""
+    site = sites.get_site(request)
+    paths = {page_cache.GLOBAL_GENERATION, request.path}
+    generations = page_cache._current_generations(site.pk if site else None, paths)
+    navigation_generations = cache.get_many(
+        [navigation.MENU_GENERATION_KEY, navigation.FOOTER_GENERATION_KEY]
+    )
+
+    raw = repr((
+        page.pk,
+        page.last_published_at.isoformat() if page.last_published_at else None,
+        sorted(generations.items()),
+        sorted(navigation_generations.items()),
+    ))
+    etag = quote_etag(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+
+    changed = [page_cache.generation_time(generation) for generation in generations.values()]
+    changed += [page_cache.generation_time(generation) for generation in navigation_generations.values()]
+    last_modified = max(filter(None, [page.last_published_at, *changed]), default=None)
+    return etag, last_modified
+
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    patch_vary_headers(response, ['Cookie'])
+
+
+class ConditionalGetMixin:
+    """
+    Page mixin answering conditional GETs with a 304 before rendering.
+
+    Must come before ``PageCacheMixin`` in the bases, so that 304s are never
+    offered to the page cache.
+    """
+
+    def serve(self, request, *args, **kwargs):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or getattr(request, 'is_preview', False)
+            or not page_cache._is_anonymous(request)
+        ):
+            return super().serve(request, *args, **kwargs)
+
+        etag, last_modified = get_validators(self, request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=_timestamp(last_modified)
+        )
+        if response is None:
+            response = super().serve(request, *args, **kwargs)
+        set_validators(response, etag, last_modified)
+        return response
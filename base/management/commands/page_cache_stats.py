@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from base import page_cache
+
+
+class Command(BaseCommand):
+    help = "Shows the hit and miss counters of the full-page cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help="Reset the counters after showing them.",
+        )
+
+    def handle(self, *args, **options):
+        stats = page_cache.get_stats()
+        self.stdout.write(
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {stats['hit_rate']:.1%}"
+        )
+        if options['reset']:
+            page_cache.reset_stats()
+            self.stdout.write("Counters reset")
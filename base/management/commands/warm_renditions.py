@@ -0,0 +1,94 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter
+from wagtail.models import Page
+
+from base.renditions import get_rendition_targets
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked
+    django.setup()
+
+
+def _generate_renditions(image_id, filter_specs):
+    image = get_image_model().objects.get(pk=image_id)
+    image.get_renditions(*filter_specs)
+    return image_id, len(filter_specs)
+
+
+class Command(BaseCommand):
+    help = "Generates every missing rendition used by the templates of live pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes. With 1, renditions are generated in this process.",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report the missing renditions.",
+        )
+
+    def handle(self, *args, **options):
+        missing = self.find_missing_renditions()
+        total = sum(len(filter_specs) for filter_specs in missing.values())
+        self.stdout.write(f"{total} missing renditions across {len(missing)} images")
+
+        if options['dry_run'] or not missing:
+            return
+
+        workers = max(options['workers'], 1)
+        failed = 0
+        if workers == 1:
+            for image_id, filter_specs in missing.items():
+                _generate_renditions(image_id, filter_specs)
+        else:
+            # Workers must open their own connections rather than share ours
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                futures = {
+                    executor.submit(_generate_renditions, image_id, sorted(filter_specs)): image_id
+                    for image_id, filter_specs in missing.items()
+                }
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"Image {futures[future]}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated renditions for {len(missing) - failed} images ({failed} failed)"
+        ))
+
+    def find_missing_renditions(self):
+        """
+        Returns ``{image_id: {filter_spec, ...}}`` for the renditions that live
+        pages need and that do not exist yet.
+        """
+        wanted = defaultdict(set)
+        for page in Page.objects.live().specific().iterator(chunk_size=200):
+            for image, filter_specs in get_rendition_targets(page).items():
+                wanted[image.pk].update(filter_specs)
+
+        all_specs = set().union(*wanted.values())
+        images = get_image_model().objects.filter(pk__in=wanted).prefetch_renditions(*all_specs)
+
+        missing = {}
+        for image in images.iterator(chunk_size=200):
+            filters = [Filter(spec=spec) for spec in wanted[image.pk]]
+            existing = image.find_existing_renditions(*filters)
+            not_found = {f.spec for f in filters if f not in existing}
+            if not_found:
+                missing[image.pk] = not_found
+        return missing
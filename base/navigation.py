@@ -0,0 +1,41 @@
+"""
+Cache for the navigation fragments rendered on every page: the header
+menu, the footer links and the footer text.
+
+Fragments are cached per site and language, under a generation that is
+bumped when their content changes (see base/signals.py), so stale entries
+are never read again.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import translation
+
+from base.page_cache import new_generation
+
+MENU_GENERATION_KEY = 'navigation:gen:menu'
+FOOTER_GENERATION_KEY = 'navigation:gen:footer'
+# Old generations are never read again, let them expire
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def render_fragment(name, generation_key, site_id, template_name, get_context, request):
+    """
+    Returns the rendered fragment from the cache. On a miss, ``get_context``
+    is called to build the template context, so its queries only run then.
+    """
+    generation = cache.get(generation_key, '')
+    key = f'navigation:{name}:{site_id}:{translation.get_language()}:{generation}'
+
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(template_name, get_context(), request=request)
+        cache.set(key, html, timeout=FRAGMENT_TIMEOUT)
+    return html
+
+
+def evict_menus():
+    cache.set(MENU_GENERATION_KEY, new_generation(), timeout=None)
+
+
+def evict_footer():
+    cache.set(FOOTER_GENERATION_KEY, new_generation(), timeout=None)
@@ -0,0 +1,364 @@
+"""
+Full-page response cache for anonymous visitors.
+
+Responses of page types with ``cache_response = True`` are stored per site,
+path and query string. Every entry records the generation of the paths it
+was rendered from; evicting a page bumps the generation of its path, and
+entries whose generations no longer match are treated as misses. A global
+generation evicts everything at once, for changes that show on every page
+(menus, footer, sites).
+
+Hits and misses are counted in memory and added to the shared counters in
+batches, every PAGE_CACHE_STATS_FLUSH_INTERVAL seconds or
+PAGE_CACHE_STATS_BATCH_SIZE lookups, so a hit writes nothing to the cache.
+"""
+import atexit
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from wagtail.models import Page, ReferenceIndex, Site
+
+from base import sites
+
+GLOBAL_GENERATION = 'all'
+STATS_KEYS = {
+    'hits': 'pagecache:stats:hits',
+    'misses': 'pagecache:stats:misses',
+}
+
+
+def get_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+
+
+def new_generation():
+    """Returns a new generation token, starting with the time it was made."""
+    return f'{time.time():.6f}:{uuid.uuid4().hex}'
+
+
+def generation_time(generation):
+    """Returns when a generation token was made, or None if unknown."""
+    timestamp, _, token = (generation or '').partition(':')
+    if not token:
+        return None
+    return datetime.fromtimestamp(float(timestamp), tz=timezone.utc)
+
+
+def _hash(value):
+    return hashlib.md5(value.encode(), usedforsecurity=False).hexdigest()
+
+
+def _generation_key(site_id, path):
+    if path == GLOBAL_GENERATION:
+        return 'pagecache:gen:all'
+    return f'pagecache:gen:{site_id}:{_hash(path)}'
+
+
+def _response_key(site_id, request):
+    # Sort the query string so ?a=1&b=2 and ?b=2&a=1 share an entry
+    query = sorted(request.GET.lists())
+    return f'pagecache:response:{site_id}:{_hash(request.path)}:{_hash(repr(query))}'
+
+
+def _current_generations(site_id, paths):
+    keys = {_generation_key(site_id, path): path for path in paths}
+    found = get_cache().get_many(keys.keys())
+    return {path: found.get(key) for key, path in keys.items()}
+
+
+_stats_lock = threading.Lock()
+_pending_stats = Counter()
+_stats_flushed_at = time.monotonic()
+
+
+def get_stats_flush_interval():
+    return getattr(settings, 'PAGE_CACHE_STATS_FLUSH_INTERVAL', 30)
+
+
+def get_stats_batch_size():
+    return getattr(settings, 'PAGE_CACHE_STATS_BATCH_SIZE', 100)
+
+
+def _increment_stat(name):
+    with _stats_lock:
+        _pending_stats[name] += 1
+        due = (
+            sum(_pending_stats.values()) >= get_stats_batch_size()
+            or time.monotonic() - _stats_flushed_at >= get_stats_flush_interval()
+        )
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Adds the counts of this process to the shared counters."""
+    global _stats_flushed_at
+    with _stats_lock:
+        counts = _pending_stats.copy()
+        _pending_stats.clear()
+        _stats_flushed_at = time.monotonic()
+    if not counts:
+        return
+
+    cache = get_cache()
+    for name, count in counts.items():
+        key = STATS_KEYS[name]
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, count, timeout=None)
+
+
+def get_stats():
+    """Returns the hit and miss counters shared by every worker."""
+    flush_stats()
+    values = get_cache().get_many(STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_stats():
+    global _stats_flushed_at
+    with _stats_lock:
+        _pending_stats.clear()
+        _stats_flushed_at = time.monotonic()
+    get_cache().delete_many(STATS_KEYS.values())
+
+
+def _is_anonymous(request):
+    # Without a session cookie the visitor is anonymous, and loading the
+    # empty session would only add a Vary: Cookie header to the response
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated
+
+
+def _is_cacheable_response(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header('Cache-Control')
+    )
+
+
+class PageCacheMiddleware:
+    """
+    Serves anonymous page requests from the cache before Wagtail routes them.
+
+    Must come after AuthenticationMiddleware. Only responses of pages marked
+    by ``PageCacheMixin.serve`` are stored.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method != 'GET' or get_timeout() <= 0:
+            return self.get_response(request)
+
+        site = sites.get_site(request)
+        if site is None:
+            return self.get_response(request)
+
+        cache = get_cache()
+        key = _response_key(site.pk, request)
+        entry = cache.get(key)
+        # The session is only loaded for paths the cache holds a page for, so
+        # requests it never serves, such as search autocomplete, leave it alone
+        if entry is not None and _is_anonymous(request):
+            generations = _current_generations(site.pk, entry['generations'].keys())
+            if generations == entry['generations']:
+                _increment_stat('hits')
+                response = entry['response']
+                response['X-Page-Cache'] = 'HIT'
+                # Validators stored by ConditionalGetMixin still hold, as
+                # the generations they were built from have not changed
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(response.get('Last-Modified')),
+                    response=response,
+                )
+
+        # Read before rendering, so a publish landing during the render
+        # leaves the entry stale rather than storing old content as new
+        generations = _current_generations(site.pk, {GLOBAL_GENERATION, request.path})
+        request._page_cache_site_id = site.pk
+        response = self.get_response(request)
+
+        page = getattr(request, '_page_cache_page', None)
+        if page is not None and _is_cacheable_response(response) and _is_anonymous(request):
+            entry = {
+                'generations': {**generations, **request._page_cache_generations},
+                'response': response,
+            }
+            cache.set(key, entry, get_timeout())
+            _increment_stat('misses')
+            response['X-Page-Cache'] = 'MISS'
+
+        return response
+
+
+class PageCacheMixin:
+    """
+    Page mixin opting a page type into the full-page cache.
+
+    Pages can define ``get_cache_dependents()`` to name other pages that
+    render their content and must be evicted along with them.
+    """
+
+    cache_response = True
+
+    def serve(self, request, *args, **kwargs):
+        # serve() is only reached once every before_serve_page hook has let
+        # the request through, so the response is the page itself. Pages
+        # behind a view restriction are never shared between visitors.
+        site_id = getattr(request, '_page_cache_site_id', None)
+        if site_id is not None and not self.get_view_restrictions().exists():
+            # The page's own path, when served from another one, is read
+            # before rendering too
+            url_parts = self.get_url_parts(request)
+            paths = {url_parts[2]} if url_parts else set()
+            request._page_cache_generations = _current_generations(site_id, paths)
+            request._page_cache_page = self
+        return super().serve(request, *args, **kwargs)
+
+
+def _site_paths(url_paths):
+    """Translates Wagtail url_paths into ``(site_id, path)`` pairs."""
+    site_paths = set()
+    root_paths = Site.get_site_root_paths()
+    for url_path in url_paths:
+        for root_path in root_paths:
+            if url_path.startswith(root_path.root_path):
+                site_paths.add((root_path.site_id, url_path[len(root_path.root_path) - 1:]))
+    return site_paths
+
+
+def evict_url_paths(url_paths):
+    """Evicts every cached response rendered for the given url_paths."""
+    token = new_generation()
+    get_cache().set_many(
+        {_generation_key(site_id, path): token for site_id, path in _site_paths(url_paths)},
+        timeout=None,
+    )
+
+
+def evict_all():
+    get_cache().set(_generation_key(None, GLOBAL_GENERATION), new_generation(), timeout=None)
+
+
+def _parent_url_path(url_path):
+    return url_path.rstrip('/').rsplit('/', 1)[0] + '/'
+
+
+def _is_menu_level(url_path):
+    # Site root pages and their children appear in the header and footer menus
+    root_paths = {root_path.root_path for root_path in Site.get_site_root_paths()}
+    return url_path in root_paths or _parent_url_path(url_path) in root_paths
+
+
+def get_referencing_pages(obj):
+    """Returns the pages whose content references ``obj``, such as an image."""
+    page_type = ContentType.objects.get_for_model(Page)
+    referencing_ids = (
+        ReferenceIndex.get_references_to(obj)
+        .filter(base_content_type=page_type)
+        .values_list('object_id', flat=True)
+    )
+    return Page.objects.filter(pk__in=[int(pk) for pk in referencing_ids])
+
+
+def is_image_edit(update_fields):
+    """
+    Tells an edit of an image from Wagtail recording the file size or hash
+    it computed while rendering, which changes nothing on the page.
+    """
+    return not update_fields or not set(update_fields) <= {'file_size', 'file_hash'}
+
+
+def get_dependent_url_paths(page):
+    """
+    Returns the url_paths whose rendering depends on ``page``: the page
+    itself, its parent listing, pages referencing it (such as a
+    FeaturedPostsBlock) and any declared by ``get_cache_dependents()``.
+    """
+    page = page.specific
+    url_paths = {page.url_path, _parent_url_path(page.url_path)}
+
+    url_paths.update(get_referencing_pages(page).values_list('url_path', flat=True))
+
+    if hasattr(page, 'get_cache_dependents'):
+        url_paths.update(dependent.url_path for dependent in page.get_cache_dependents())
+
+    return url_paths
+
+
+def evict_page(page):
+    if _is_menu_level(page.url_path):
+        evict_all()
+    else:
+        evict_url_paths(get_dependent_url_paths(page))
+
+
+def get_pages_url_paths(pages):
+    """
+    Returns the url_paths depending on any of ``pages``, or None when one of
+    them shows in the menus and every page depends on it.
+    """
+    url_paths = set()
+    for page in pages:
+        if _is_menu_level(page.url_path):
+            return None
+        url_paths |= get_dependent_url_paths(page)
+    return url_paths
+
+
+def evict_pages_url_paths(url_paths):
+    """Evicts what ``get_pages_url_paths`` returned."""
+    if url_paths is None:
+        evict_all()
+    elif url_paths:
+        evict_url_paths(url_paths)
+
+
+def evict_deleted_url_path(url_path):
+    if _is_menu_level(url_path):
+        evict_all()
+    else:
+        evict_url_paths({url_path, _parent_url_path(url_path)})
+
+
+def evict_moved_page(page, url_path_before):
+    """Evicts a page whose url_path changed, and its subtree at both locations."""
+    if _is_menu_level(page.url_path) or _is_menu_level(url_path_before):
+        evict_all()
+        return
+
+    url_paths = get_dependent_url_paths(page)
+    url_paths.add(_parent_url_path(url_path_before))
+    for url_path in page.get_descendants(inclusive=True).values_list('url_path', flat=True):
+        url_paths.add(url_path)
+        url_paths.add(url_path_before + url_path[len(page.url_path):])
+    evict_url_paths(url_paths)
+
+
+atexit.register(flush_stats)
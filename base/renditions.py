@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+from wagtail.blocks import ListBlock, StreamBlock, StructBlock, StructValue
+from wagtail.fields import StreamField
+
+
+def get_rendition_targets(page):
+    """
+    Returns a ``{image: {filter_spec, ...}}`` dict of the renditions the
+    templates of ``page`` will ask for.
+
+    Pages declare their own images through a ``get_rendition_targets()``
+    method returning ``(image, filter_specs)`` pairs, and blocks declare theirs
+    with a ``rendition_filters`` Meta option, which is looked up in every
+    StreamField of the page.
+    """
+    page = page.specific
+    targets = defaultdict(set)
+
+    def add(image, filter_specs):
+        if image is not None:
+            targets[image].update(filter_specs)
+
+    if hasattr(page, 'get_rendition_targets'):
+        for image, filter_specs in page.get_rendition_targets():
+            add(image, filter_specs)
+
+    for field in page._meta.get_fields():
+        if isinstance(field, StreamField):
+            for image, filter_specs in _block_rendition_targets(field.stream_block, getattr(page, field.name)):
+                add(image, filter_specs)
+
+    return targets
+
+
+def _block_rendition_targets(block, value):
+    if value is None:
+        return
+
+    filter_specs = getattr(block.meta, 'rendition_filters', None)
+    if filter_specs and isinstance(value, StructValue):
+        yield value.get('image'), filter_specs
+
+    if isinstance(block, StreamBlock):
+        for child in value:
+            yield from _block_rendition_targets(child.block, child.value)
+    elif isinstance(block, StructBlock) and isinstance(value, StructValue):
+        # ImageBlock is a StructBlock too, but its value is the image itself
+        for name, child_block in block.child_blocks.items():
+            yield from _block_rendition_targets(child_block, value.get(name))
+    elif isinstance(block, ListBlock):
+        for item in value:
+            yield from _block_rendition_targets(block.child_block, item)
+
+
+def generate_page_renditions(page):
+    """Creates any renditions of ``page`` that do not exist yet."""
+    for image, filter_specs in get_rendition_targets(page).items():
+        image.get_renditions(*filter_specs)
@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from wagtail.images import get_image_model
+from wagtail.models import Page, PageViewRestriction, Site
+from wagtail.signals import (
+    page_published,
+    page_slug_changed,
+    page_unpublished,
+    post_page_move,
+    published,
+    unpublished,
+)
+
+from base import navigation, page_cache, sitemaps, sites
+from base.models import FooterText, NavigationSettings
+from base.tasks import generate_page_renditions_task
+
+
+@receiver(page_published)
+def pregenerate_renditions(sender, instance, **kwargs):
+    # Generate the renditions the page's templates will need, so the first
+    # visitor after a publish does not pay for them
+    transaction.on_commit(lambda: generate_page_renditions_task.enqueue(instance.pk))
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def evict_published_page(sender, instance, **kwargs):
+    transaction.on_commit(lambda: page_cache.evict_page(instance))
+
+
+@receiver(page_slug_changed)
+def evict_renamed_page(sender, instance, instance_before, **kwargs):
+    transaction.on_commit(lambda: page_cache.evict_moved_page(instance, instance_before.url_path))
+
+
+@receiver(post_page_move)
+def evict_moved_page(sender, instance, url_path_before, **kwargs):
+    transaction.on_commit(lambda: page_cache.evict_moved_page(instance, url_path_before))
+
+
+@receiver(post_delete, sender=Page)
+def evict_deleted_page(sender, instance, **kwargs):
+    url_path = instance.url_path
+    transaction.on_commit(lambda: page_cache.evict_deleted_url_path(url_path))
+
+
+@receiver(post_save, sender=get_image_model())
+@receiver(pre_delete, sender=get_image_model())
+def evict_pages_showing_image(sender, instance, update_fields=None, **kwargs):
+    if not page_cache.is_image_edit(update_fields):
+        return
+    # Collected now, as a deleted image's pages are no longer found after commit
+    url_paths = page_cache.get_pages_url_paths(page_cache.get_referencing_pages(instance))
+    transaction.on_commit(lambda: page_cache.evict_pages_url_paths(url_paths))
+
+
+@receiver(published, sender=FooterText)
+@receiver(unpublished, sender=FooterText)
+@receiver(post_delete, sender=FooterText)
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+@receiver(post_save, sender=NavigationSettings)
+def evict_all_pages(sender, **kwargs):
+    # These show on, or decide who may see, every page
+    transaction.on_commit(page_cache.evict_all)
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete, sender=Page)
+def evict_menus_for_page(sender, instance, **kwargs):
+    # Titles and show_in_menus only reach the menus once published
+    if page_cache._is_menu_level(instance.url_path):
+        transaction.on_commit(navigation.evict_menus)
+
+
+@receiver(page_slug_changed)
+@receiver(post_page_move)
+def evict_menus_for_moved_page(sender, instance, **kwargs):
+    url_path_before = kwargs.get('url_path_before') or kwargs['instance_before'].url_path
+    if page_cache._is_menu_level(instance.url_path) or page_cache._is_menu_level(url_path_before):
+        transaction.on_commit(navigation.evict_menus)
+
+
+@receiver(post_save, sender=NavigationSettings)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def evict_menus(sender, **kwargs):
+    transaction.on_commit(navigation.evict_menus)
+
+
+@receiver(published, sender=FooterText)
+@receiver(unpublished, sender=FooterText)
+@receiver(post_delete, sender=FooterText)
+def evict_footer(sender, **kwargs):
+    transaction.on_commit(navigation.evict_footer)
+
+
+def _evict_sites():
+    # Evict right away so this process stops using the old site, and again
+    # on commit in case another worker resolved it before the commit
+    sites.evict()
+    transaction.on_commit(sites.evict)
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def evict_sites(sender, **kwargs):
+    _evict_sites()
+
+
+def _evict_sites_for_pages(url_paths, include_children=False):
+    root_paths = {root_path.root_path for root_path in Site.get_site_root_paths()}
+    if include_children:
+        # Adding or removing children changes the tree fields (numchild) of
+        # the cached root page, which Wagtail routes requests through
+        url_paths = url_paths | {page_cache._parent_url_path(url_path) for url_path in url_paths}
+    if url_paths & root_paths:
+        _evict_sites()
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def evict_sites_for_published_page(sender, instance, **kwargs):
+    _evict_sites_for_pages({instance.url_path})
+
+
+@receiver(page_slug_changed)
+def evict_sites_for_renamed_page(sender, instance, instance_before, **kwargs):
+    _evict_sites_for_pages({instance.url_path, instance_before.url_path})
+
+
+@receiver(post_page_move)
+def evict_sites_for_moved_page(sender, instance, url_path_before, **kwargs):
+    _evict_sites_for_pages({instance.url_path, url_path_before}, include_children=True)
+
+
+@receiver(post_save)
+def evict_sites_for_created_page(sender, instance, created, **kwargs):
+    # Sent with the specific page class as sender, so no sender filter here
+    if created and isinstance(instance, Page):
+        _evict_sites_for_pages({instance.url_path}, include_children=True)
+
+
+@receiver(post_delete, sender=Page)
+def evict_sites_for_deleted_page(sender, instance, **kwargs):
+    _evict_sites_for_pages({instance.url_path}, include_children=True)
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete, sender=Page)
+def evict_sitemap_shard(sender, instance, **kwargs):
+    path = instance.path
+    transaction.on_commit(lambda: sitemaps.evict_path(path))
+
+
+@receiver(page_slug_changed)
+def evict_sitemap_subtree(sender, instance, **kwargs):
+    # The new slug changes the URL of every descendant, which may fill later shards
+    path = instance.path
+    transaction.on_commit(lambda: sitemaps.evict_path(path, include_descendants=True))
+
+
+@receiver(post_page_move)
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def evict_sitemaps(sender, **kwargs):
+    # Moves change tree paths, the others which pages are listed at all
+    transaction.on_commit(sitemaps.evict_all)
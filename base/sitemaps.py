@@ -0,0 +1,169 @@
+"""
+XML sitemap index split into cached shards.
+
+The live, public pages of a site are split into shards of about
+SITEMAP_SHARD_SIZE pages by tree path, so each shard is one bounded range
+query. Shard boundaries and rendered shards are cached; publishing a page
+only evicts the shard whose path range holds it. As in base/page_cache.py,
+cached entries record the tokens they were built under and are misses once
+a token changes.
+"""
+import bisect
+import uuid
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from wagtail.models import Page, Site
+
+from base import sites
+
+TIMEOUT = 60 * 60 * 24
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def get_shard_size():
+    return getattr(settings, 'SITEMAP_SHARD_SIZE', 1000)
+
+
+def _token_key(site_id, name):
+    return f'sitemap:token:{site_id}:{name}'
+
+
+def _get_tokens(site_id, *names):
+    keys = [_token_key(None, 'all'), _token_key(site_id, 'boundaries')]
+    keys += [_token_key(site_id, name) for name in names]
+    found = cache.get_many(keys)
+    return [found.get(key) for key in keys]
+
+
+def _bump(*keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def _live_pages(site):
+    return Page.objects.live().public().descendant_of(site.root_page, inclusive=True)
+
+
+def get_boundaries(site):
+    """Returns the first tree path of every shard of ``site``, in order."""
+    key = f'sitemap:boundaries:{site.pk}'
+    tokens = _get_tokens(site.pk)
+    entry = cache.get(key)
+    if entry is not None and entry['tokens'] == tokens:
+        return entry['boundaries']
+
+    shard_size = get_shard_size()
+    paths = _live_pages(site).order_by('path').values_list('path', flat=True)
+    boundaries = [
+        path for number, path in enumerate(paths.iterator(chunk_size=2000))
+        if number % shard_size == 0
+    ]
+    # Pages published later before the first boundary belong to the first shard
+    boundaries[:1] = [site.root_page.path]
+
+    cache.set(key, {'tokens': tokens, 'boundaries': boundaries}, TIMEOUT)
+    return boundaries
+
+
+def get_shard(site, index, request):
+    """
+    Returns ``(xml, lastmod)`` for a shard of ``site``, or None if there is
+    no such shard.
+    """
+    boundaries = get_boundaries(site)
+    if not 0 <= index < len(boundaries):
+        return None
+
+    start = boundaries[index]
+    key = f'sitemap:shard:{site.pk}:{start}'
+    tokens = _get_tokens(site.pk, f'shard:{start}')
+    entry = cache.get(key)
+    if entry is not None and entry['tokens'] == tokens:
+        return entry['xml'], entry['lastmod']
+
+    pages = _live_pages(site).filter(path__gte=start)
+    if index + 1 < len(boundaries):
+        pages = pages.filter(path__lt=boundaries[index + 1])
+
+    lastmod = None
+    count = 0
+    urls = []
+    for page in pages.order_by('path').iterator(chunk_size=500):
+        url = page.get_full_url(request)
+        if url is None:
+            continue
+        count += 1
+        urls.append(f'<url><loc>{escape(url)}</loc>')
+        if page.last_published_at:
+            urls.append(f'<lastmod>{page.last_published_at.date().isoformat()}</lastmod>')
+            lastmod = max(lastmod or page.last_published_at, page.last_published_at)
+        urls.append('</url>')
+
+    if count > 2 * get_shard_size():
+        # The shard has outgrown its range, split the tree again next time
+        _bump(_token_key(site.pk, 'boundaries'))
+
+    xml = f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{XMLNS}">{"".join(urls)}</urlset>\n'
+    cache.set(key, {'tokens': tokens, 'xml': xml, 'lastmod': lastmod}, TIMEOUT)
+    return xml, lastmod
+
+
+def _get_site(request):
+    site = sites.get_site(request)
+    if site is None:
+        raise Http404
+    return site
+
+
+def sitemap_index(request):
+    site = _get_site(request)
+    entries = []
+    for index in range(len(get_boundaries(site))):
+        xml, lastmod = get_shard(site, index, request)
+        loc = request.build_absolute_uri(reverse('sitemap_shard', args=[index]))
+        entries.append(f'<sitemap><loc>{escape(loc)}</loc>')
+        if lastmod:
+            entries.append(f'<lastmod>{lastmod.isoformat()}</lastmod>')
+        entries.append('</sitemap>')
+
+    xml = f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{XMLNS}">{"".join(entries)}</sitemapindex>\n'
+    return HttpResponse(xml, content_type='application/xml')
+
+
+def sitemap_shard(request, index):
+    shard = get_shard(_get_site(request), index, request)
+    if shard is None:
+        raise Http404
+    return HttpResponse(shard[0], content_type='application/xml')
+
+
+def evict_path(path, include_descendants=False):
+    """
+    Evicts the shard holding the page at tree ``path``, on every site. With
+    ``include_descendants``, every shard holding a page of its subtree is
+    evicted too, for changes such as a new slug that alter their URLs.
+    """
+    keys = []
+    for site in Site.objects.select_related('root_page'):
+        if not path.startswith(site.root_page.path):
+            continue
+        entry = cache.get(f'sitemap:boundaries:{site.pk}')
+        if entry is None:
+            keys.append(_token_key(site.pk, 'boundaries'))
+            continue
+        boundaries = entry['boundaries']
+        first = max(bisect.bisect_right(boundaries, path) - 1, 0)
+        last = first
+        if include_descendants:
+            # Descendant paths all start with path, so they sort before this
+            last = max(bisect.bisect_left(boundaries, path + '\uffff') - 1, first)
+        keys += [_token_key(site.pk, f'shard:{start}') for start in boundaries[first:last + 1]]
+    if keys:
+        _bump(*keys)
+
+
+def evict_all():
+    _bump(_token_key(None, 'all'))
@@ -0,0 +1,72 @@
+"""
+Resolves the Wagtail site, root page and root URL serving a request.
+
+``Site.find_for_request`` runs a query on every request. Resolutions are
+kept in a per-process dict keyed by hostname and port, and memoized on the
+request itself. The dict is dropped whenever the generation stored in the
+shared cache changes, so a Site or root page change made in one worker
+reaches every other worker (see base/signals.py).
+"""
+import threading
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.http.request import split_domain_port
+from wagtail.models import Site
+
+GENERATION_KEY = 'sites:gen'
+
+ResolvedSite = namedtuple('ResolvedSite', ['site', 'root_page', 'root_url'])
+
+_lock = threading.Lock()
+_generation = None
+_resolved = {}
+
+
+def _resolve(request):
+    site = Site._find_for_request(request)
+    # Set before get_url(), which looks the site up again otherwise
+    request._wagtail_site = site
+    if site is None:
+        return ResolvedSite(None, None, None)
+    return ResolvedSite(site, site.root_page, site.root_page.get_url(request))
+
+
+def resolve_site(request):
+    """
+    Returns the ``ResolvedSite`` for ``request``, whose fields are all None
+    when no site matches. Also primes ``Site.find_for_request`` for the rest
+    of the request.
+    """
+    if hasattr(request, '_resolved_site'):
+        return request._resolved_site
+
+    global _generation
+    generation = cache.get(GENERATION_KEY)
+    key = (split_domain_port(request._get_raw_host())[0], request.get_port())
+
+    with _lock:
+        if generation != _generation:
+            _resolved.clear()
+            _generation = generation
+        resolved = _resolved.get(key)
+
+    if resolved is None:
+        resolved = _resolve(request)
+        with _lock:
+            if generation == _generation:
+                _resolved[key] = resolved
+
+    request._resolved_site = resolved
+    request._wagtail_site = resolved.site
+    return resolved
+
+
+def get_site(request):
+    return resolve_site(request).site
+
+
+def evict():
+    """Makes every process resolve sites again."""
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
@@ -0,0 +1,14 @@
+from django_tasks import task
+from wagtail.models import Page
+
+from base.renditions import generate_page_renditions
+
+
+@task(backend="renditions")
+def generate_page_renditions_task(page_id):
+    try:
+        page = Page.objects.get(pk=page_id)
+    except Page.DoesNotExist:
+        # Deleted before the task got to run
+        return
+    generate_page_renditions(page)
@@ -1,24 +1,57 @@
 from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 
-from wagtail.models import Site
-
+from base import navigation, sites
 from base.models import FooterText
 
 register = template.Library()
 
 
-@register.inclusion_tag("base/includes/footer_text.html", takes_context=True)
+@register.simple_tag(takes_context=True)
 def get_footer_text(context):
     footer_text = context.get("footer_text", "")
 
-    if not footer_text:
+    if footer_text:
+        # Previewing a FooterText revision, so skip the cache
+        return render_to_string("base/includes/footer_text.html", {"footer_text": footer_text})
+
+    def get_footer_context():
         instance = FooterText.objects.filter(live=True).first()
-        footer_text = instance.body if instance else ""
+        return {"footer_text": instance.body if instance else ""}
+
+    return _render_cached_fragment(
+        context, "footer_text", navigation.FOOTER_GENERATION_KEY,
+        "base/includes/footer_text.html", get_footer_context,
+    )
+
+
+@register.simple_tag(takes_context=True)
+def menu(context, template_name):
+    """
+    Renders a menu template with the site root and its live, in-menu
+    children. The result is cached per site and language.
+    """
+    def get_menu_context():
+        site_root = get_site_root(context)
+        return {
+            "site_root": site_root,
+            "menuitems": site_root.get_children().live().in_menu(),
+        }
+
+    return _render_cached_fragment(
+        context, template_name, navigation.MENU_GENERATION_KEY, template_name, get_menu_context,
+    )
+
+
+def _render_cached_fragment(context, name, generation_key, template_name, get_context):
+    request = context["request"]
+    site = sites.get_site(request)
+    return mark_safe(navigation.render_fragment(
+        name, generation_key, site.pk if site else None, template_name, get_context, request,
+    ))
 
-    return {
-        "footer_text": footer_text,
-    }
 
 @register.simple_tag(takes_context=True)
 def get_site_root(context):
-    return Site.find_for_request(context["request"]).root_page
\ No newline at end of file
+    return sites.resolve_site(context["request"]).root_page
@@ -1,3 +1,465 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import RequestContext, Template
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from wagtail.images.models import Image, Rendition
+from wagtail.images.tests.utils import get_test_image_file
+from wagtail.models import Page, Site
+from wagtail.test.utils import WagtailPageTestCase
+
+from base import page_cache, sites
+from base.models import FooterText
+from blog.models import Author, BlogIndexPage, BlogPage, BlogPageGalleryImage, BlogTagIndexPage
+from home.models import HomePage
+from portfolio.models import PortfolioPage
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RenditionWarmingTests(WagtailPageTestCase):
+    """
+    Renditions declared by page models and blocks are generated ahead of the first visit.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.site_root = Site.objects.get(is_default_site=True).root_page
+
+    def create_image(self, title):
+        return Image.objects.create(title=title, file=get_test_image_file())
+
+    def rendition_specs(self, image):
+        return set(Rendition.objects.filter(image=image).values_list("filter_spec", flat=True))
+
+    def test_publishing_a_post_generates_its_renditions(self):
+        blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        self.site_root.add_child(instance=blog_index)
+
+        card_image = self.create_image("Card")
+        author = Author.objects.create(name="Author", author_image=self.create_image("Avatar"))
+        post = BlogPage(title="Post", slug="post", intro="Intro")
+        post.gallery_images = [BlogPageGalleryImage(image=card_image)]
+        blog_index.add_child(instance=post)
+        post.authors.add(author)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save_revision().publish()
+
+        self.assertEqual(self.rendition_specs(card_image), {"fill-1024x768"})
+        self.assertEqual(self.rendition_specs(author.author_image), {"fill-48x48"})
+
+    def test_warm_renditions_command_generates_block_renditions(self):
+        image = self.create_image("Card")
+        # Added live without a publish, so nothing has been generated yet
+        self.site_root.add_child(instance=PortfolioPage(
+            title="Portfolio",
+            slug="portfolio",
+            body=[
+                ("card", {"heading": "Card", "text": "Text", "image": image}),
+                ("image_block", {"image": image}),
+            ],
+        ))
+        self.assertEqual(self.rendition_specs(image), set())
+
+        call_command("warm_renditions", workers=1, stdout=StringIO())
+        self.assertEqual(self.rendition_specs(image), {"width-480", "fill-600x338"})
+
+        output = StringIO()
+        call_command("warm_renditions", workers=1, dry_run=True, stdout=output)
+        self.assertIn("0 missing renditions", output.getvalue())
+
+
+class PageCacheTests(WagtailPageTestCase):
+    """
+    Anonymous page views are served from the cache until a publish evicts them.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+        site = Site.objects.get(is_default_site=True)
+        self.home = HomePage(title="Home", slug="cached-home")
+        Page.objects.get(pk=1).add_child(instance=self.home)
+        site.root_page = self.home
+        site.save()
+
+        self.blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        self.home.add_child(instance=self.blog_index)
+        self.tag_index = BlogTagIndexPage(title="Tags", slug="tags")
+        self.home.add_child(instance=self.tag_index)
+
+        self.post = BlogPage(title="Post", slug="post", intro="Intro")
+        self.blog_index.add_child(instance=self.post)
+        self.other_post = BlogPage(title="Other post", slug="other-post", intro="Intro")
+        self.blog_index.add_child(instance=self.other_post)
+
+        self.portfolio = PortfolioPage(
+            title="Portfolio",
+            slug="portfolio",
+            body=[("featured_posts", {"heading": "Featured", "posts": [self.post]})],
+        )
+        # The reference index behind FeaturedPostsBlock is updated on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.home.add_child(instance=self.portfolio)
+
+    def get_cache_status(self, page):
+        response = self.client.get(page.url)
+        self.assertEqual(response.status_code, 200)
+        return response["X-Page-Cache"]
+
+    def test_second_view_is_a_hit(self):
+        page_cache.reset_stats()
+        self.assertEqual(self.get_cache_status(self.post), "MISS")
+        self.assertEqual(self.get_cache_status(self.post), "HIT")
+
+        stats = page_cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    @override_settings(PAGE_CACHE_STATS_BATCH_SIZE=3, PAGE_CACHE_STATS_FLUSH_INTERVAL=60)
+    def test_stats_are_shared_in_batches(self):
+        page_cache.reset_stats()
+        self.get_cache_status(self.post)
+        self.get_cache_status(self.post)
+        self.assertIsNone(cache.get(page_cache.STATS_KEYS["hits"]))
+
+        self.get_cache_status(self.post)
+        self.assertEqual(cache.get(page_cache.STATS_KEYS["hits"]), 2)
+        self.assertEqual(cache.get(page_cache.STATS_KEYS["misses"]), 1)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get(self.tag_index.url, {"tag": "a"})
+        response = self.client.get(self.tag_index.url, {"tag": "b"})
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+
+    def test_publishing_a_post_evicts_the_pages_showing_it(self):
+        pages = [self.post, self.other_post, self.blog_index, self.tag_index, self.portfolio]
+        for page in pages:
+            self.get_cache_status(page)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save_revision().publish()
+
+        self.assertEqual(self.get_cache_status(self.post), "MISS")
+        self.assertEqual(self.get_cache_status(self.blog_index), "MISS")
+        self.assertEqual(self.get_cache_status(self.tag_index), "MISS")
+        self.assertEqual(self.get_cache_status(self.portfolio), "MISS")
+        # Pages that do not show the post are left alone
+        self.assertEqual(self.get_cache_status(self.other_post), "HIT")
+
+    def test_editing_an_author_evicts_their_posts(self):
+        author = Author.objects.create(name="Ada")
+        self.post.authors = [author]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save_revision().publish()
+        for page in [self.post, self.blog_index, self.other_post]:
+            self.get_cache_status(page)
+
+        author.name = "Grace"
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+
+        response = self.client.get(self.post.url)
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertContains(response, "Grace")
+        self.assertEqual(self.get_cache_status(self.blog_index), "MISS")
+        self.assertEqual(self.get_cache_status(self.other_post), "HIT")
+
+    @override_settings(MEDIA_ROOT=MEDIA_ROOT)
+    def test_editing_an_image_evicts_the_pages_showing_it(self):
+        image = Image.objects.create(title="Card", file=get_test_image_file())
+        author = Author.objects.create(name="Ada", author_image=image)
+        self.post.gallery_images = [BlogPageGalleryImage(image=image)]
+        self.other_post.authors = [author]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save_revision().publish()
+            self.other_post.save_revision().publish()
+        for page in [self.post, self.other_post, self.portfolio]:
+            self.get_cache_status(page)
+
+        # Wagtail recording the file hash it computed changes nothing shown
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save(update_fields=["file_hash"])
+        self.assertEqual(self.get_cache_status(self.post), "HIT")
+
+        image.title = "New card"
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+
+        self.assertEqual(self.get_cache_status(self.post), "MISS")
+        self.assertEqual(self.get_cache_status(self.other_post), "MISS")
+        # It features the post's card
+        self.assertEqual(self.get_cache_status(self.portfolio), "MISS")
+
+    def test_publish_during_rendering_is_not_cached_as_current(self):
+        get_context = BlogPage.get_context
+
+        def publish_while_rendering(page, request, *args, **kwargs):
+            page_cache.evict_page(page)
+            return get_context(page, request, *args, **kwargs)
+
+        with mock.patch.object(BlogPage, "get_context", publish_while_rendering):
+            self.assertEqual(self.get_cache_status(self.post), "MISS")
+        # The entry holds what was rendered before the publish
+        self.assertEqual(self.get_cache_status(self.post), "MISS")
+        self.assertEqual(self.get_cache_status(self.post), "HIT")
+
+    def test_moving_a_post_evicts_its_old_path(self):
+        self.get_cache_status(self.post)
+        old_url = self.post.url
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.move(self.other_post, pos="last-child")
+
+        # Wagtail now redirects the old URL instead of the cache serving the post
+        self.assertEqual(self.client.get(old_url).status_code, 301)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class NavigationCacheTests(WagtailPageTestCase):
+    """
+    The header menu and footer are rendered once per site and language, until
+    a change to the pages or snippets they show.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+        site = Site.objects.get(is_default_site=True)
+        self.home = HomePage(title="Home", slug="nav-home")
+        Page.objects.get(pk=1).add_child(instance=self.home)
+        site.root_page = self.home
+        site.save()
+
+        self.blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts", show_in_menus=True)
+        self.home.add_child(instance=self.blog_index)
+
+    def render_navigation(self, request):
+        template = Template(
+            '{% load navigation_tags %}{% menu "includes/header_menu.html" %}{% get_footer_text %}'
+        )
+        return template.render(RequestContext(request))
+
+    def test_fragments_are_rendered_once(self):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        self.render_navigation(request)
+
+        with self.assertNumQueries(0):
+            html = self.render_navigation(request)
+        self.assertIn(">Blog</a>", html)
+
+    def test_publishing_a_menu_page_updates_the_menus(self):
+        self.assertContains(self.client.get(self.home.url), ">Blog</a>")
+
+        self.blog_index.title = "Writing"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog_index.save_revision().publish()
+
+        self.assertContains(self.client.get(self.home.url), ">Writing</a>")
+
+    def test_publishing_the_footer_text_updates_the_footer(self):
+        self.client.get(self.home.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FooterText.objects.create(body="<p>New footer</p>").save_revision().publish()
+
+        self.assertContains(self.client.get(self.home.url), "New footer")
+
+
+class SiteResolutionTests(WagtailPageTestCase):
+    """
+    Sites are resolved once per process, until a site or its root page changes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.site = Site.objects.get(is_default_site=True)
+
+    def get_request(self):
+        return RequestFactory().get("/")
+
+    def test_resolution_is_cached(self):
+        sites.resolve_site(self.get_request())
+
+        request = self.get_request()
+        with self.assertNumQueries(0):
+            resolved = sites.resolve_site(request)
+            self.assertEqual(Site.find_for_request(request), self.site)
+        self.assertEqual(resolved.root_page, self.site.root_page)
+
+    def test_changing_the_root_page_is_picked_up(self):
+        sites.resolve_site(self.get_request())
+
+        home = HomePage(title="Home", slug="new-home")
+        Page.objects.get(pk=1).add_child(instance=home)
+        self.site.root_page = home
+        self.site.save()
+
+        resolved = sites.resolve_site(self.get_request())
+        self.assertEqual(resolved.root_page.pk, home.pk)
+        self.assertEqual(resolved.root_url, "/")
+
+
+@override_settings(SITEMAP_SHARD_SIZE=2)
+class SitemapTests(WagtailPageTestCase):
+    """
+    The sitemap is split into cached shards, evicted one at a time on publish.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.site_root = Site.objects.get(is_default_site=True).root_page
+        self.pages = []
+        for number in range(4):
+            page = PortfolioPage(title=f"Page {number}", slug=f"page-{number}")
+            self.site_root.add_child(instance=page)
+            self.pages.append(page)
+
+    def get_shard(self, index):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/sitemap-{index}.xml")
+        self.assertEqual(response.status_code, 200)
+        rebuilt = any("wagtailcore_page" in query["sql"] for query in queries)
+        return response.content.decode(), rebuilt
+
+    def test_index_lists_the_shards(self):
+        response = self.client.get("/sitemap.xml")
+        self.assertContains(response, "sitemap-0.xml")
+        self.assertContains(response, "sitemap-2.xml")
+        self.assertNotContains(response, "sitemap-3.xml")
+
+        content, rebuilt = self.get_shard(1)
+        self.assertFalse(rebuilt)
+        self.assertIn(self.pages[1].full_url, content)
+
+    def test_publishing_evicts_only_its_shard(self):
+        self.client.get("/sitemap.xml")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pages[3].save_revision().publish()
+
+        self.assertFalse(self.get_shard(0)[1])
+        self.assertFalse(self.get_shard(1)[1])
+        content, rebuilt = self.get_shard(2)
+        self.assertTrue(rebuilt)
+        self.assertIn("<lastmod>", content)
+
+    def test_slug_change_evicts_the_shards_of_descendants(self):
+        parent = self.pages[1]
+        children = []
+        for number in range(2):
+            child = PortfolioPage(title=f"Child {number}", slug=f"child-{number}")
+            parent.add_child(instance=child)
+            children.append(child)
+        self.client.get("/sitemap.xml")
+        # The second child is in the shard after its parent's
+        self.assertIn(children[1].full_url, self.get_shard(2)[0])
+
+        parent.slug = "renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            parent.save_revision().publish()
+
+        self.assertFalse(self.get_shard(0)[1])
+        content, rebuilt = self.get_shard(2)
+        self.assertTrue(rebuilt)
+        self.assertIn("/renamed/child-1/", content)
+
+
+class ConditionalGetTests(WagtailPageTestCase):
+    """
+    Unchanged pages are answered with a 304 before being rendered.
+    """
+
+    def setUp(self):
+        cache.clear()
+        site_root = Site.objects.get(is_default_site=True).root_page
+        blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        site_root.add_child(instance=blog_index)
+        self.post = BlogPage(title="Post", slug="post", intro="Intro")
+        blog_index.add_child(instance=self.post)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save_revision().publish()
+
+    def get(self, **headers):
+        return self.client.get(self.post.url, headers=headers)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_not_modified_before_rendering(self):
+        response = self.get()
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        response = self.get(If_None_Match=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertTemplateNotUsed(response, "blog/blog_page.html")
+
+        response = self.get(If_Modified_Since=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_footer_change_changes_the_etag(self):
+        etag = self.get()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            FooterText.objects.create(body="<p>Footer</p>").save_revision().publish()
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 200)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_footer_change_changes_last_modified(self):
+        last_modified = self.get()["Last-Modified"]
+        # Last-Modified has a one second resolution
+        later = time.time() + 60
+        with mock.patch("base.page_cache.time.time", return_value=later):
+            with self.captureOnCommitCallbacks(execute=True):
+                FooterText.objects.create(body="<p>Footer</p>").save_revision().publish()
+        self.assertEqual(self.get(If_Modified_Since=last_modified).status_code, 200)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_author_change_changes_the_etag(self):
+        author = Author.objects.create(name="Ada")
+        self.post.authors = [author]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save_revision().publish()
+        etag = self.get()["ETag"]
+
+        author.name = "Grace"
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 200)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_signed_in_visitors_get_no_validators(self):
+        etag = self.get()["ETag"]
+
+        # Their pages embed a CSRF token, which changes when they sign in again
+        request = RequestFactory().get(self.post.url, headers={"If-None-Match": etag})
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = "session"
+        request.user = mock.Mock(is_authenticated=True)
+        with mock.patch.object(Page, "serve", return_value=HttpResponse("Post")):
+            response = self.post.serve(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+    def test_page_cache_hits_answer_conditional_requests(self):
+        page_cache.reset_stats()
+        etag = self.get()["ETag"]
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(page_cache.get_stats()["hits"], 1)
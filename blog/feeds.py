@@ -0,0 +1,132 @@
+"""
+RSS and Atom feeds of a blog index, streamed post by post.
+
+Posts are read with a chunked iterator and each entry is serialized and
+sent as soon as it is read, so neither the posts nor the document are held
+in memory. Responses carry an ETag and Last-Modified derived from the
+newest publish under the index, and unchanged feeds are answered with 304.
+"""
+from io import StringIO
+
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.feedgenerator import get_tag_uri, rfc2822_date, rfc3339_date
+from django.utils.http import http_date
+from django.utils.xmlutils import SimplerXMLGenerator
+
+CONTENT_TYPES = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+}
+CHUNK_SIZE = 100
+
+
+def get_validators(index_page, posts):
+    """
+    Returns the ``(etag, last_modified)`` of a feed. The number of live posts
+    is part of the ETag, so unpublishing an older post changes it too.
+    """
+    stats = posts.aggregate(newest=Max('last_published_at'), count=Count('pk'))
+    last_modified = max(
+        filter(None, [stats['newest'], index_page.last_published_at]), default=None
+    )
+    timestamp = int(last_modified.timestamp()) if last_modified else 0
+    etag = quote_etag(f"{index_page.pk}-{stats['count']}-{timestamp}")
+    return etag, last_modified
+
+
+def serve_feed(request, index_page, posts, kind, length):
+    etag, last_modified = get_validators(index_page, posts)
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if response is None:
+        entries = posts.defer('body').order_by('-first_published_at', '-id')[:length]
+        write = _write_atom if kind == 'atom' else _write_rss
+        response = StreamingHttpResponse(
+            write(request, index_page, entries.iterator(chunk_size=CHUNK_SIZE), last_modified),
+            content_type=CONTENT_TYPES[kind],
+        )
+
+    response['ETag'] = etag
+    if last_modified_ts is not None:
+        response['Last-Modified'] = http_date(last_modified_ts)
+    return response
+
+
+class _Writer:
+    """Serializes XML into a buffer that is drained after every element."""
+
+    def __init__(self):
+        self.buffer = StringIO()
+        self.xml = SimplerXMLGenerator(self.buffer, 'utf-8', short_empty_elements=True)
+
+    def drain(self):
+        value = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return value
+
+
+def _write_rss(request, index_page, posts, last_modified):
+    writer = _Writer()
+    xml = writer.xml
+    xml.startDocument()
+    xml.startElement('rss', {'version': '2.0'})
+    xml.startElement('channel', {})
+    xml.addQuickElement('title', index_page.title)
+    xml.addQuickElement('link', index_page.get_full_url(request))
+    xml.addQuickElement('description', index_page.intro)
+    if last_modified:
+        xml.addQuickElement('lastBuildDate', rfc2822_date(last_modified))
+    yield writer.drain()
+
+    for post in posts:
+        url = post.get_full_url(request)
+        xml.startElement('item', {})
+        xml.addQuickElement('title', post.title)
+        xml.addQuickElement('link', url)
+        xml.addQuickElement('guid', url, {'isPermaLink': 'true'})
+        xml.addQuickElement('description', post.intro)
+        if post.first_published_at:
+            xml.addQuickElement('pubDate', rfc2822_date(post.first_published_at))
+        xml.endElement('item')
+        yield writer.drain()
+
+    xml.endElement('channel')
+    xml.endElement('rss')
+    yield writer.drain()
+
+
+def _write_atom(request, index_page, posts, last_modified):
+    writer = _Writer()
+    xml = writer.xml
+    index_url = index_page.get_full_url(request)
+    xml.startDocument()
+    xml.startElement('feed', {'xmlns': 'http://www.w3.org/2005/Atom'})
+    xml.addQuickElement('title', index_page.title)
+    xml.addQuickElement('link', '', {'rel': 'alternate', 'href': index_url})
+    xml.addQuickElement('link', '', {'rel': 'self', 'href': request.build_absolute_uri()})
+    xml.addQuickElement('id', index_url)
+    if last_modified:
+        xml.addQuickElement('updated', rfc3339_date(last_modified))
+    xml.addQuickElement('subtitle', index_page.intro)
+    yield writer.drain()
+
+    for post in posts:
+        url = post.get_full_url(request)
+        xml.startElement('entry', {})
+        xml.addQuickElement('title', post.title)
+        xml.addQuickElement('link', '', {'rel': 'alternate', 'href': url})
+        xml.addQuickElement('id', get_tag_uri(url, post.first_published_at))
+        if post.last_published_at:
+            xml.addQuickElement('updated', rfc3339_date(post.last_published_at))
+        if post.first_published_at:
+            xml.addQuickElement('published', rfc3339_date(post.first_published_at))
+        xml.addQuickElement('summary', post.intro)
+        xml.endElement('entry')
+        yield writer.drain()
+
+    xml.endElement('feed')
+    yield writer.drain()
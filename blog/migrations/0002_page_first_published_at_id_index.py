@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Composite index backing the keyset pagination of the blog listings,
+    which order and seek on (first_published_at, id).
+
+    first_published_at lives on wagtailcore_page, so the index cannot be
+    declared on a blog model's Meta.
+    """
+
+    dependencies = [
+        ('blog', '0001_initial'),
+        ('wagtailcore', '0095_groupsitepermission'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX IF NOT EXISTS blog_page_first_published_at_id_idx '
+                'ON wagtailcore_page (first_published_at DESC, id DESC);'
+            ),
+            reverse_sql='DROP INDEX IF EXISTS blog_page_first_published_at_id_idx;',
+        ),
+    ]
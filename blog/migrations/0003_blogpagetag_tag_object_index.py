@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_page_first_published_at_id_index'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpagetag',
+            index=models.Index(fields=['tag', 'content_object'], name='blog_pagetag_tag_object_idx'),
+        ),
+    ]
@@ -1,15 +1,25 @@
 from django import forms
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import models
+from django.db.models import Count
 from modelcluster.fields import ParentalKey, ParentalManyToManyField
 from modelcluster.contrib.taggit import ClusterTaggableManager
-from taggit.models import TaggedItemBase
+from taggit.models import Tag, TaggedItemBase
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel
-from wagtail.models import Page, Orderable
+from wagtail.contrib.routable_page.models import RoutablePageMixin, path
+from wagtail.images import get_image_model
+from wagtail.models import Page, Orderable, PageManager
+from wagtail.query import PageQuerySet
 from wagtail.fields import RichTextField
 from wagtail.search import index
 from wagtail.snippets.models import register_snippet
 
+from base.conditional import ConditionalGetMixin
+from base.page_cache import PageCacheMixin
+from blog import feeds
+from blog.pagination import paginate_after
+
 class BlogPageTag(TaggedItemBase):
     content_object = ParentalKey(
         'BlogPage',
@@ -17,43 +27,173 @@ class BlogPageTag(TaggedItemBase):
         on_delete=models.CASCADE
     )
 
-    search_fields = Page.search_fields + [
-        index.SearchField('intro'),
-        index.SearchField('body'),
-    ]
+    tag_cloud_cache_key = 'blog:tag-cloud'
+
+    class Meta:
+        indexes = [
+            # Covers the tag -> posts lookups of the tag index page
+            models.Index(fields=['tag', 'content_object'], name='blog_pagetag_tag_object_idx'),
+        ]
+
+    @classmethod
+    def get_tag_cloud(cls):
+        """
+        Returns the precomputed tag cloud, building it only if it is missing
+        from the cache. It is refreshed whenever a BlogPage is published or
+        unpublished (see blog/signals.py).
+        """
+        tag_cloud = cache.get(cls.tag_cloud_cache_key)
+        if tag_cloud is None:
+            tag_cloud = cls.refresh_tag_cloud()
+        return tag_cloud
+
+    @classmethod
+    def refresh_tag_cloud(cls):
+        """Recounts the live posts of every tag and stores the result."""
+        tag_cloud = list(
+            cls.objects.filter(content_object__live=True)
+            .values('tag__name', 'tag__slug')
+            .annotate(count=Count('content_object', distinct=True))
+            .order_by('-count', 'tag__name')
+        )
+        tag_cloud = [
+            {'name': row['tag__name'], 'slug': row['tag__slug'], 'count': row['count']}
+            for row in tag_cloud
+        ]
+        cache.set(cls.tag_cloud_cache_key, tag_cloud, timeout=None)
+        return tag_cloud
+
+
+class BlogTagIndexPage(PageCacheMixin, Page):
+    posts_per_page = 20
 
-class BlogTagIndexPage(Page):
     def get_context(self, request):
-        # Filter by tag
-        tag = request.GET.get('tag')
-        blogpages = BlogPage.objects.filter(tags__name=tag)
+        # Filter by one or more tags, e.g. ?tag=a&tag=b&match=any
+        tags = [tag for tag in request.GET.getlist('tag') if tag]
+        match_any = request.GET.get('match') == 'any'
+
+        tag_ids = BlogPage.objects.resolve_tag_ids(tags)
+        if tags and not match_any and len(tag_ids) < len(set(tags)):
+            # An unknown tag can never be matched by every post
+            blogpages = BlogPage.objects.none()
+        else:
+            blogpages = BlogPage.objects.live().tagged_with(tag_ids, match_any=match_any)
 
         # Update template context
         context = super().get_context(request)
-        context['blogpages'] = blogpages
+        context['tags'] = tags
+        context['match_any'] = match_any
+        context['tag_cloud'] = BlogPageTag.get_tag_cloud()
+        context['blogpages'] = paginate_after(blogpages, request, self.posts_per_page)
         return context
 
 
-class BlogIndexPage(Page):
+class BlogIndexPage(PageCacheMixin, RoutablePageMixin, Page):
     intro = models.CharField(max_length=255)
+
+    posts_per_page = 12
+    feed_length = 50
+
     # add the get_context method:
     def get_context(self, request):
         # Update context to include only published posts, ordered by reverse-chron
         context = super().get_context(request)
-        blogpages = self.get_children().live().order_by('-first_published_at')
-        context['blogpages'] = blogpages
+        blogpages = BlogPage.objects.child_of(self).for_listing()
+        context['blogpages'] = paginate_after(blogpages, request, self.posts_per_page)
         return context
 
+    @path('feed/')
+    def rss_feed(self, request):
+        return feeds.serve_feed(request, self, BlogPage.objects.child_of(self).live(), 'rss', self.feed_length)
+
+    @path('feed/atom/')
+    def atom_feed(self, request):
+        return feeds.serve_feed(request, self, BlogPage.objects.child_of(self).live(), 'atom', self.feed_length)
+
     content_panels = Page.content_panels + ["intro"]
 
 
-class BlogPage(Page):
+class BlogPageQuerySet(PageQuerySet):
+    # Rendition filters used by the blog cards in blog_index_page.html
+    listing_image_filter = "fill-1024x768"
+    author_image_filter = "fill-48x48"
+
+    def for_listing(self):
+        """
+        Returns live posts with everything a blog card renders prefetched:
+        the first gallery image, the authors, the author images and their
+        renditions. The number of queries does not grow with the number of posts.
+        """
+        rendition_model = get_image_model().get_rendition_model()
+
+        return self.live().prefetch_related(
+            models.Prefetch(
+                'gallery_images',
+                queryset=BlogPageGalleryImage.objects.select_related('image'),
+            ),
+            models.Prefetch(
+                'gallery_images__image__renditions',
+                queryset=rendition_model.objects.filter(filter_spec=self.listing_image_filter),
+                to_attr='prefetched_renditions',
+            ),
+            models.Prefetch(
+                'authors',
+                queryset=Author.objects.select_related('author_image'),
+            ),
+            models.Prefetch(
+                'authors__author_image__renditions',
+                queryset=rendition_model.objects.filter(filter_spec=self.author_image_filter),
+                to_attr='prefetched_renditions',
+            ),
+        )
+
+    def tagged_with(self, tag_ids, match_any=False):
+        """
+        Filters posts by tag ids, joining through BlogPageTag in a subquery so
+        posts are never duplicated. By default a post must carry every tag;
+        with ``match_any`` one of them is enough.
+        """
+        tagged_items = BlogPageTag.objects.filter(tag_id__in=tag_ids)
+        if not match_any and len(tag_ids) > 1:
+            tagged_items = (
+                tagged_items.values('content_object')
+                .annotate(matched=Count('tag', distinct=True))
+                .filter(matched=len(tag_ids))
+            )
+        return self.filter(pk__in=tagged_items.values('content_object'))
+
+
+class BlogPageManager(PageManager.from_queryset(BlogPageQuerySet)):
+    def resolve_tag_ids(self, names):
+        """Maps tag names to tag ids in a single query, dropping unknown names."""
+        if not names:
+            return []
+        return list(Tag.objects.filter(name__in=names).values_list('id', flat=True))
+
+
+class BlogPage(ConditionalGetMixin, PageCacheMixin, Page):
     date = models.DateField("Post Date", default=timezone.now)
     intro = models.CharField(max_length=255)
     body = RichTextField(blank=True)
     authors = ParentalManyToManyField('blog.Author', blank=True)
     tags = ClusterTaggableManager(through=BlogPageTag, blank=True)
 
+    objects = BlogPageManager()
+
+    # Boosts map onto the A-D weights of the PostgreSQL search backend
+    search_fields = Page.search_fields + [
+        index.SearchField('intro', boost=1.5),
+        index.SearchField('body'),
+        index.RelatedFields('tags', [
+            index.SearchField('name', boost=1.5),
+            index.AutocompleteField('name'),
+        ]),
+        index.RelatedFields('authors', [
+            index.SearchField('name'),
+        ]),
+        index.FilterField('date'),
+    ]
+
     def main_image(self):
         gallery_item = self.gallery_images.first()
         if gallery_item:
@@ -61,6 +201,19 @@ class BlogPage(Page):
         else:
             return None
 
+    def get_cache_dependents(self):
+        # Tag pages list posts, so they are evicted from the page cache with them
+        return BlogTagIndexPage.objects.live()
+
+    def get_rendition_targets(self):
+        # Renditions used by the blog cards, generated when the post is published
+        targets = [(self.main_image(), [BlogPageQuerySet.listing_image_filter])]
+        targets += [
+            (author.author_image, [BlogPageQuerySet.author_image_filter])
+            for author in self.authors.all()
+        ]
+        return targets
+
     content_panels = Page.content_panels + [
         MultiFieldPanel([
             "date",
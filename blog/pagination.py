@@ -0,0 +1,101 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+# Range of the bigint id column, which larger values would overflow in the query
+MIN_ID = -2 ** 63
+MAX_ID = 2 ** 63 - 1
+
+
+class KeysetPage:
+    """
+    One page of posts from a keyset paginated listing.
+
+    Iterates like a list of posts, and carries the query strings needed to
+    link to the next page and back to the first page.
+    """
+
+    def __init__(self, object_list, next_cursor, is_first, query_params):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+        self._query_params = query_params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def next_querystring(self):
+        params = self._query_params.copy()
+        params['after'] = self.next_cursor
+        return params.urlencode()
+
+    @property
+    def first_querystring(self):
+        params = self._query_params.copy()
+        params.pop('after', None)
+        return params.urlencode()
+
+
+def encode_cursor(page):
+    """Build the opaque ``?after=`` token pointing just past ``page``."""
+    raw = f"{page.first_published_at.isoformat()}|{page.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Returns the ``(first_published_at, id)`` pair stored in a token, or None
+    if the token is missing or has been tampered with.
+    """
+    if not token:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        published_at, pk = raw.split('|')
+        published_at, pk = datetime.fromisoformat(published_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not MIN_ID <= pk <= MAX_ID:
+        return None
+    return published_at, pk
+
+
+def paginate_after(queryset, request, per_page):
+    """
+    Keyset pagination ordered by ``(first_published_at, id)``, newest first.
+
+    Rather than an OFFSET, each page continues from the last post of the
+    previous one, so a deep page costs the same as the first one. Pages that
+    were never published have no ``first_published_at`` and are not listed.
+    """
+    queryset = queryset.filter(first_published_at__isnull=False).order_by(
+        '-first_published_at', '-id'
+    )
+
+    cursor = decode_cursor(request.GET.get('after'))
+    if cursor:
+        published_at, pk = cursor
+        queryset = queryset.filter(
+            Q(first_published_at__lt=published_at)
+            | Q(first_published_at=published_at, id__lt=pk)
+        )
+
+    # Fetch one extra row to find out whether there is a next page
+    object_list = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(object_list) > per_page:
+        object_list = object_list[:per_page]
+        next_cursor = encode_cursor(object_list[-1])
+
+    return KeysetPage(object_list, next_cursor, cursor is None, request.GET)
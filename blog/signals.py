@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from wagtail.images import get_image_model
+from wagtail.signals import page_published, page_unpublished
+
+from base import page_cache
+from blog.models import Author, BlogPage, BlogPageTag
+
+
+@receiver(page_published, sender=BlogPage)
+@receiver(page_unpublished, sender=BlogPage)
+@receiver(post_delete, sender=BlogPage)
+def refresh_tag_cloud(sender, **kwargs):
+    # Recount once the publish has been committed, so the counts include it
+    transaction.on_commit(BlogPageTag.refresh_tag_cloud)
+
+
+def _evict_author_posts(authors):
+    # Posts and their listing cards show the names and images of their
+    # authors. Collected now, as a deleted author's posts are no longer
+    # found after commit.
+    posts = BlogPage.objects.filter(authors__in=authors).distinct()
+    url_paths = page_cache.get_pages_url_paths(posts)
+    transaction.on_commit(lambda: page_cache.evict_pages_url_paths(url_paths))
+
+
+@receiver(post_save, sender=Author)
+@receiver(pre_delete, sender=Author)
+def evict_author(sender, instance, **kwargs):
+    _evict_author_posts([instance])
+
+
+@receiver(post_save, sender=get_image_model())
+@receiver(pre_delete, sender=get_image_model())
+def evict_author_image(sender, instance, update_fields=None, **kwargs):
+    if not page_cache.is_image_edit(update_fields):
+        return
+    authors = list(Author.objects.filter(author_image=instance))
+    if authors:
+        _evict_author_posts(authors)
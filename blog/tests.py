@@ -1,3 +1,280 @@
-from django.test import TestCase
+import base64
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from wagtail.images.models import Image
+from wagtail.images.tests.utils import get_test_image_file
+from wagtail.models import Site
+from wagtail.test.utils import WagtailPageTestCase
+
+from blog.models import (
+    Author,
+    BlogIndexPage,
+    BlogPage,
+    BlogPageGalleryImage,
+    BlogPageTag,
+    BlogTagIndexPage,
+)
+from blog.pagination import decode_cursor
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PAGE_CACHE_TIMEOUT=0)
+class BlogIndexQueryCountTests(WagtailPageTestCase):
+    """
+    The blog index must render in a fixed number of queries, however many posts it lists.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        site_root = Site.objects.get(is_default_site=True).root_page
+        self.blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        site_root.add_child(instance=self.blog_index)
+
+        self.author = Author.objects.create(
+            name="Author",
+            author_image=Image.objects.create(title="Avatar", file=get_test_image_file()),
+        )
+
+    def add_posts(self, count):
+        for _ in range(count):
+            number = BlogPage.objects.count() + 1
+            post = BlogPage(title=f"Post {number}", slug=f"post-{number}", intro="Intro")
+            post.gallery_images = [
+                BlogPageGalleryImage(
+                    image=Image.objects.create(title=f"Image {number}", file=get_test_image_file())
+                )
+            ]
+            self.blog_index.add_child(instance=post)
+            post.authors.add(self.author)
+            post.save_revision().publish()
+
+    def count_index_queries(self):
+        # Render once so renditions exist, then measure a warm render
+        self.client.get(self.blog_index.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.blog_index.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_posts(self):
+        self.add_posts(2)
+        few_posts = self.count_index_queries()
+
+        self.add_posts(5)
+        many_posts = self.count_index_queries()
+
+        self.assertEqual(few_posts, many_posts)
+
+    def test_listing_renders_every_post(self):
+        self.add_posts(3)
+        response = self.client.get(self.blog_index.url)
+
+        for post in BlogPage.objects.live():
+            self.assertContains(response, post.title)
+        self.assertContains(response, self.author.name, count=3)
+
+
+class BlogIndexPaginationTests(WagtailPageTestCase):
+    """
+    Keyset pagination of the blog index over (first_published_at, id).
+    """
+
+    def setUp(self):
+        cache.clear()
+        site_root = Site.objects.get(is_default_site=True).root_page
+        self.blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        site_root.add_child(instance=self.blog_index)
+
+        # Two posts share a timestamp so the id tie-breaker is exercised
+        published_at = timezone.now()
+        offsets = [0, 1, 1, 2, 3]
+        for number, offset in enumerate(offsets, start=1):
+            post = BlogPage(title=f"Post {number}", slug=f"post-{number}", intro="Intro")
+            self.blog_index.add_child(instance=post)
+            post.save_revision().publish()
+            BlogPage.objects.filter(pk=post.pk).update(
+                first_published_at=published_at - timedelta(hours=offset)
+            )
+
+    def get_page(self, after=None):
+        params = {"after": after} if after else {}
+        return self.client.get(self.blog_index.url, params).context["blogpages"]
+
+    @mock.patch.object(BlogIndexPage, "posts_per_page", 2)
+    def test_pages_cover_every_post_once_in_order(self):
+        titles = []
+        page = self.get_page()
+        self.assertTrue(page.is_first)
+        while True:
+            titles += [post.title for post in page]
+            if not page.has_next:
+                break
+            page = self.get_page(page.next_cursor)
+            self.assertFalse(page.is_first)
+
+        expected = list(
+            BlogPage.objects.order_by("-first_published_at", "-id").values_list("title", flat=True)
+        )
+        self.assertEqual(titles, expected)
+
+    @mock.patch.object(BlogIndexPage, "posts_per_page", 2)
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+        page = self.get_page("not-a-cursor")
+        self.assertTrue(page.is_first)
+        self.assertEqual(len(page), 2)
+
+    def test_cursor_with_an_id_out_of_range_is_invalid(self):
+        # Such an id would overflow the bigint column of PostgreSQL
+        def cursor(pk):
+            return base64.urlsafe_b64encode(f"2024-01-01T00:00:00+00:00|{pk}".encode()).decode()
+
+        self.assertIsNotNone(decode_cursor(cursor(2 ** 63 - 1)))
+        self.assertIsNone(decode_cursor(cursor(2 ** 63)))
+        self.assertIsNone(decode_cursor(cursor("9" * 20)))
+
+
+class BlogTagIndexTests(WagtailPageTestCase):
+    """
+    Multi-tag filtering and the precomputed tag cloud of the tag index page.
+    """
+
+    def setUp(self):
+        cache.clear()
+        site_root = Site.objects.get(is_default_site=True).root_page
+        self.tag_index = BlogTagIndexPage(title="Tags", slug="tags")
+        site_root.add_child(instance=self.tag_index)
+        self.blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        site_root.add_child(instance=self.blog_index)
+
+        self.both = self.add_post("Both", ["economics", "python"])
+        self.economics = self.add_post("Economics", ["economics"])
+        self.python = self.add_post("Python", ["python"])
+
+    def add_post(self, title, tags):
+        post = BlogPage(title=title, slug=title.lower(), intro="Intro")
+        self.blog_index.add_child(instance=post)
+        post.tags.add(*tags)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save_revision().publish()
+        return post
+
+    def get_titles(self, params):
+        response = self.client.get(self.tag_index.url, params)
+        return {post.title for post in response.context["blogpages"]}
+
+    def test_match_all_tags(self):
+        self.assertEqual(self.get_titles({"tag": ["economics", "python"]}), {"Both"})
+
+    def test_match_any_tag(self):
+        self.assertEqual(
+            self.get_titles({"tag": ["economics", "python"], "match": "any"}),
+            {"Both", "Economics", "Python"},
+        )
+
+    def test_unknown_tag(self):
+        self.assertEqual(self.get_titles({"tag": ["economics", "missing"]}), set())
+        self.assertEqual(
+            self.get_titles({"tag": ["economics", "missing"], "match": "any"}),
+            {"Both", "Economics"},
+        )
+
+    def test_unpublished_posts_are_hidden(self):
+        self.economics.unpublish()
+        self.assertEqual(self.get_titles({"tag": "economics"}), {"Both"})
+
+    def test_tag_cloud_is_refreshed_on_publish_and_unpublish(self):
+        counts = {tag["name"]: tag["count"] for tag in BlogPageTag.get_tag_cloud()}
+        self.assertEqual(counts, {"economics": 2, "python": 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python.unpublish()
+
+        with self.assertNumQueries(0):
+            counts = {tag["name"]: tag["count"] for tag in BlogPageTag.get_tag_cloud()}
+        self.assertEqual(counts, {"economics": 2, "python": 1})
+
+
+class BlogSearchTests(WagtailPageTestCase):
+    """
+    Posts are found by their intro, body, tags and author names.
+    """
+
+    def setUp(self):
+        site_root = Site.objects.get(is_default_site=True).root_page
+        blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        site_root.add_child(instance=blog_index)
+
+        self.post = BlogPage(
+            title="Post", slug="post", intro="Notes on inflation", body="<p>Central banking</p>",
+        )
+        blog_index.add_child(instance=self.post)
+        self.post.tags.add("econometrics")
+        self.post.authors.add(Author.objects.create(name="Keynes"))
+        # Indexing is queued until the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save_revision().publish()
+
+    def test_searchable_fields(self):
+        for query in ["inflation", "banking", "econometrics", "Keynes"]:
+            with self.subTest(query=query):
+                self.assertEqual(list(BlogPage.objects.live().search(query)), [self.post])
+
+
+class BlogFeedTests(WagtailPageTestCase):
+    """
+    The RSS and Atom feeds stream the newest posts and support conditional GETs.
+    """
+
+    def setUp(self):
+        cache.clear()
+        site_root = Site.objects.get(is_default_site=True).root_page
+        self.blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        site_root.add_child(instance=self.blog_index)
+        self.posts = []
+        for number in range(3):
+            post = BlogPage(title=f"Post {number}", slug=f"post-{number}", intro=f"Intro {number}")
+            self.blog_index.add_child(instance=post)
+            self.posts.append(post)
+        self.feed_url = self.blog_index.url + "feed/"
+
+    def get_feed(self, url=None, **headers):
+        return self.client.get(url or self.feed_url, headers=headers)
+
+    def test_rss_feed(self):
+        response = self.get_feed()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/rss+xml; charset=utf-8")
+        content = b"".join(response.streaming_content).decode()
+        for post in self.posts:
+            self.assertIn(f"<title>{post.title}</title>", content)
+        self.assertTrue(content.rstrip().endswith("</rss>"))
+
+    def test_atom_feed(self):
+        response = self.get_feed(self.blog_index.url + "feed/atom/")
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn("<summary>Intro 0</summary>", content)
+        self.assertTrue(content.rstrip().endswith("</feed>"))
+
+    def test_unchanged_feed_is_not_modified(self):
+        etag = self.get_feed()["ETag"]
+        self.assertEqual(self.get_feed(If_None_Match=etag).status_code, 304)
+
+        self.posts[0].unpublish()
+        self.assertEqual(self.get_feed(If_None_Match=etag).status_code, 200)
@@ -5,7 +5,9 @@ from wagtail.fields import RichTextField
 
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel
 
-class HomePage(Page):
+from base.page_cache import PageCacheMixin
+
+class HomePage(PageCacheMixin, Page):
     image = models.ForeignKey(
         "wagtailimages.Image",
         null=True,
@@ -51,3 +53,7 @@ class HomePage(Page):
         ),
         FieldPanel('body'),
     ]
+
+    def get_rendition_targets(self):
+        # Renditions used by home_page.html, generated when the page is published
+        return [(self.image, ["max-800x600"])]
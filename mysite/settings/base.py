@@ -33,6 +33,8 @@ INSTALLED_APPS = [
     "wagtail.contrib.forms",
     "wagtail.contrib.redirects",
     "wagtail.contrib.settings",
+    "wagtail.contrib.routable_page",
+    "wagtail.contrib.search_promotions",
     "wagtail.embeds",
     "wagtail.sites",
     "wagtail.users",
@@ -62,6 +64,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Serves anonymous page views from the cache, see base/page_cache.py
+    "base.page_cache.PageCacheMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "wagtail.contrib.redirects.middleware.RedirectMiddleware",
@@ -161,6 +165,32 @@ WAGTAILSEARCH_BACKENDS = {
     }
 }
 
+# Search query hits are written in batches (seconds between flushes, and
+# pending hits that trigger an early flush), see search/query_log.py
+SEARCH_QUERY_LOG_FLUSH_INTERVAL = 30
+SEARCH_QUERY_LOG_BATCH_SIZE = 500
+# Deepest search results page served, further ones are 404s
+SEARCH_MAX_PAGE = 1000
+
+# Full-page cache for anonymous visitors (seconds, 0 disables it)
+PAGE_CACHE_TIMEOUT = 60 * 10
+# Its hit and miss counters are shared in batches (seconds between flushes,
+# and lookups that trigger an early flush), see base/page_cache.py
+PAGE_CACHE_STATS_FLUSH_INTERVAL = 30
+PAGE_CACHE_STATS_BATCH_SIZE = 100
+
+# Background tasks. Wagtail's search and reference index updates run in the
+# request. The renditions generated on publish (base/tasks.py) have their own
+# backend, which production can hand to a worker process.
+TASKS = {
+    "default": {
+        "BACKEND": "django_tasks.backends.immediate.ImmediateBackend",
+    },
+    "renditions": {
+        "BACKEND": "django_tasks.backends.immediate.ImmediateBackend",
+    },
+}
+
 # Base URL to use when referring to full URLs within the Wagtail admin backend -
 # e.g. in notification emails. Don't include '/admin' or a trailing slash
 WAGTAILADMIN_BASE_URL = "https://jag-economics.com"
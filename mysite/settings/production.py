@@ -18,12 +18,22 @@ SECURE_SSL_REDIRECT = True
 AWS_S3_REGION_NAME = config("AWS_S3_REGION_NAME")
 INSTALLED_APPS.append("storages")
 
+# Static files get content-hashed names and precompressed variants, either
+# served by whitenoise ("local") or uploaded to the static bucket ("s3", or
+# "s3-incremental" to only upload changed files, in parallel)
+STATIC_STORAGE_MODE = config("STATIC_STORAGE_MODE", default="s3")
+STATIC_STORAGE_BACKENDS = {
+    "local": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    "s3": "mysite.storage.HashedStaticStorage",
+    "s3-incremental": "mysite.storage.IncrementalStaticStorage",
+}
+
 STORAGES = {
     "default": {
         "BACKEND": "mysite.storage.PublicMediaStorage",
     },
     "staticfiles": {
-        "BACKEND": "mysite.storage.StaticStorage",
+        "BACKEND": STATIC_STORAGE_BACKENDS[STATIC_STORAGE_MODE],
     },
 }
 
@@ -38,12 +48,23 @@ STATICFILES_DIRS = [
 AWS_ACL = None
 AWS_STATIC_STORAGE_BUCKET_NAME = config("AWS_STATIC_STORAGE_BUCKET_NAME")
 AWS_MEDIA_STORAGE_BUCKET_NAME = config("AWS_MEDIA_STORAGE_BUCKET_NAME")
-STATIC_URL = f'https://{AWS_STATIC_STORAGE_BUCKET_NAME}.s3.amazonaws.com/static/'
+if STATIC_STORAGE_MODE == "local":
+    STATIC_ROOT = config("DJANGO_STATIC_ROOT", default=os.path.join(BASE_DIR, "staticfiles"))
+    STATIC_URL = "/static/"
+    # Serves the collected files, with immutable caching for hashed names
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("django.middleware.security.SecurityMiddleware") + 1,
+        "whitenoise.middleware.WhiteNoiseMiddleware",
+    )
+else:
+    STATIC_URL = f'https://{AWS_STATIC_STORAGE_BUCKET_NAME}.s3.amazonaws.com/static/'
 MEDIA_URL = f'https://{AWS_MEDIA_STORAGE_BUCKET_NAME}.s3.amazonaws.com/media/'
 
 AWS_S3_OBJECT_PARAMETERS = {
     'CacheControl': 'max-age=86400',
 }
+# Upload threads of IncrementalStaticStorage, which share one connection pool
+AWS_S3_MAX_UPLOAD_WORKERS = config("AWS_S3_MAX_UPLOAD_WORKERS", default=16, cast=int)
 
 LOGGING = {
     "version": 1,
@@ -83,6 +104,28 @@ LOGGING = {
 
 WAGTAIL_REDIRECTS_FILE_STORAGE = "cache"
 
+# The renditions generated on publish (base/tasks.py) are queued in the
+# database when a worker process runs them: python manage.py db_worker --backend renditions
+# Without one they are generated after the publish request commits. Renditions
+# a worker has not made yet are generated by the first request that needs them.
+if config("RENDITIONS_WORKER", default=False, cast=bool):
+    INSTALLED_APPS.append("django_tasks")
+    INSTALLED_APPS.append("django_tasks.backends.database")
+    TASKS["renditions"] = {
+        "BACKEND": "django_tasks.backends.database.DatabaseBackend",
+    }
+
+# The page cache, tag cloud and their invalidation must be shared by every
+# gunicorn worker. Redis updates counters atomically and needs no directory
+# scan to cull entries, unlike a file-based cache.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config("REDIS_URL", default="redis://127.0.0.1:6379/0"),
+        "TIMEOUT": 60 * 60 * 24,
+    }
+}
+
 
 DATABASES = {
     'default': {
@@ -95,6 +138,15 @@ DATABASES = {
     }
 }
 
+# PostgreSQL full-text search: tsvectors in a GIN index, ranked with the
+# A-D weights mapped from the search_fields boosts
+WAGTAILSEARCH_BACKENDS = {
+    "default": {
+        "BACKEND": "wagtail.search.backends.database.postgres.postgres",
+        "SEARCH_CONFIG": config("SEARCH_CONFIG", default="english"),
+    }
+}
+
 
 # reCAPTCHA Configuration
 # Get keys from https://www.google.com/recaptcha/admin
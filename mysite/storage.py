@@ -1,15 +1,222 @@
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin
+from django.core.files.base import ContentFile
 from storages.backends.s3boto3 import S3Boto3Storage
-from django.contrib.staticfiles.finders import FileSystemFinder
-import os
+from storages.utils import clean_name
+from whitenoise.compress import Compressor
+
+# Names produced by ManifestFilesMixin, such as css/output.3f2a9c1b7d4e.css
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
 
 class StaticStorage(S3Boto3Storage):
-    bucket_name = settings.AWS_STATIC_STORAGE_BUCKET_NAME
+    bucket_name = getattr(settings, 'AWS_STATIC_STORAGE_BUCKET_NAME', None)
     location = 'static'
 
 
+class HashedStaticStorage(ManifestFilesMixin, StaticStorage):
+    """
+    Static files under content-hashed names, for one-year immutable caching.
+
+    Next to every hashed file worth compressing, ``.br`` and ``.gz`` variants
+    are uploaded with their Content-Encoding set, for a CDN to pick from. The
+    unhashed copies and the manifest keep the default Cache-Control, as their
+    content changes under the same name.
+
+    For local serving, use whitenoise's CompressedManifestStaticFilesStorage,
+    which does the same on disk.
+    """
+
+    # Signed URLs expire, and would change the content of every stylesheet
+    # referencing them on each run
+    querystring_auth = False
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        if HASHED_NAME_RE.search(name.removesuffix('.gz').removesuffix('.br')):
+            params['CacheControl'] = IMMUTABLE_CACHE_CONTROL
+        return params
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if not dry_run:
+            self.save_compressed_variants(set(self.hashed_files.values()))
+
+    def save_compressed_variants(self, names):
+        compressor = Compressor(quiet=True)
+        for name in names:
+            if not compressor.should_compress(name):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            for data_compressed, suffix in self.compress(compressor, name, data):
+                self._save(name + suffix, ContentFile(data_compressed))
+
+    @staticmethod
+    def compress(compressor, name, data):
+        """Yields ``(compressed_data, suffix)`` for the worthwhile encodings."""
+        variants = [('gzip', compressor.compress_gzip, '.gz')]
+        if compressor.use_brotli:
+            variants.append(('brotli', compressor.compress_brotli, '.br'))
+        for encoding_name, compress, suffix in variants:
+            data_compressed = compress(data)
+            if compressor.is_compressed_effectively(encoding_name, name, len(data), data_compressed):
+                yield data_compressed, suffix
+
+
+class IncrementalStaticStorage(HashedStaticStorage):
+    """
+    HashedStaticStorage that only uploads what changed, in parallel.
+
+    A manifest of content hashes is kept in the bucket. collectstatic asks
+    this storage about existence and modification times from that manifest
+    instead of the network, files whose content hash matches are not sent
+    again, and the others are uploaded by a pool of threads sharing one
+    client (and its connection pool). Deletions are deferred, so files that
+    are deleted and saved again by collectstatic are simply overwritten.
+
+    The thread pool only exists while post processing runs: files saved
+    before it are queued, and uploads and the hash manifest are completed
+    at its end. Delete the hash manifest to force a full upload.
+    """
+
+    hashes_manifest_name = 'staticfiles.hashes.json'
+    max_workers = getattr(settings, 'AWS_S3_MAX_UPLOAD_WORKERS', 16)
+
+    def __init__(self, **settings):
+        # Set before super().__init__(), which reads the Django manifest
+        self._lock = threading.Lock()
+        self._remote_hashes = None
+        self._pending = {}
+        self._queued = []
+        self._uploads = []
+        self._uploaded = set()
+        self._deletes = set()
+        self._executor = None
+        self._client = None
+        super().__init__(**settings)
+        self.client_config = self.client_config.merge(Config(max_pool_connections=self.max_workers))
+
+    @property
+    def remote_hashes(self):
+        if self._remote_hashes is None:
+            try:
+                with super()._open(self.hashes_manifest_name) as f:
+                    self._remote_hashes = json.loads(f.read())
+            except (FileNotFoundError, ClientError, ValueError):
+                self._remote_hashes = {}
+        return self._remote_hashes
+
+    def exists(self, name):
+        name = clean_name(name)
+        return name in self._pending or (name in self.remote_hashes and name not in self._deletes)
+
+    def get_modified_time(self, name):
+        # Content hashes decide what is uploaded, so collectstatic must always
+        # offer the file again
+        return datetime.fromtimestamp(0, timezone.utc)
+
+    def delete(self, name):
+        name = clean_name(name)
+        with self._lock:
+            self._pending.pop(name, None)
+            if name in self.remote_hashes:
+                self._deletes.add(name)
+                return
+        super().delete(name)
+
+    def _open(self, name, mode='rb'):
+        content = self._pending.get(clean_name(name))
+        if content is not None:
+            return ContentFile(content, name=name)
+        return super()._open(name, mode)
+
+    def _save(self, name, content):
+        name = clean_name(name)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        data = content.read()
+        if isinstance(data, str):
+            data = data.encode()
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            self._deletes.discard(name)
+            self._pending[name] = data
+            if self.remote_hashes.get(name) == digest:
+                return name
+            self.remote_hashes[name] = digest
+            self._uploaded.add(name)
+            if self._executor is None:
+                self._queued.append(name)
+            else:
+                self._uploads.append(self._executor.submit(self._upload, name, data))
+        return name
+
+    def _upload(self, name, data):
+        params = self._get_write_parameters(self._normalize_name(name), ContentFile(data, name=name))
+        self._client.put_object(
+            Bucket=self.bucket_name, Key=self._normalize_name(name), Body=data, **params
+        )
+
+    def save_compressed_variants(self, names):
+        # Variants of files that were not uploaded again are unchanged too
+        super().save_compressed_variants(set(names) & self._uploaded)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run=dry_run, **options)
+            return
+
+        # One client for every thread, so they share its connection pool
+        self._client = self.connection.meta.client
+        with ThreadPoolExecutor(max_workers=self.max_workers) as self._executor:
+            try:
+                with self._lock:
+                    for name in self._queued:
+                        self._uploads.append(self._executor.submit(self._upload, name, self._pending[name]))
+                    self._queued = []
+                # Hashed files and their variants are uploaded as they are saved
+                yield from super().post_process(paths, dry_run=dry_run, **options)
+                self.flush()
+            finally:
+                self._executor = None
+
+    def flush(self):
+        """Waits for the uploads, applies deletions and saves the hash manifest."""
+        if self._queued:
+            self._client = self.connection.meta.client
+            for name in self._queued:
+                self._upload(name, self._pending[name])
+            self._queued = []
+        for future in self._uploads:
+            future.result()
+        self._uploads = []
+
+        deletes = sorted(self._deletes)
+        for start in range(0, len(deletes), 1000):
+            self.connection.meta.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': self._normalize_name(name)} for name in deletes[start:start + 1000]]},
+            )
+        for name in deletes:
+            self.remote_hashes.pop(name, None)
+        self._deletes.clear()
+
+        super()._save(self.hashes_manifest_name, ContentFile(json.dumps(self.remote_hashes).encode()))
+
+
 class PublicMediaStorage(S3Boto3Storage):
-    bucket_name = settings.AWS_MEDIA_STORAGE_BUCKET_NAME
+    bucket_name = getattr(settings, 'AWS_MEDIA_STORAGE_BUCKET_NAME', None)
     location = 'media'
     file_overwrite = False
@@ -0,0 +1,175 @@
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from mysite.storage import HASHED_NAME_RE, IMMUTABLE_CACHE_CONTROL, IncrementalStaticStorage
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+BUCKET = "static-test"
+
+
+STYLESHEET = "body { background: url('../img/bg.png'); }\n" * 50
+
+
+class StaticFilesTestCase(SimpleTestCase):
+    """Collects a stylesheet and the image it references, from a temporary folder."""
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.write("css/site.css", STYLESHEET)
+        self.write("img/bg.png", "png")
+
+    def write(self, name, content):
+        path = os.path.join(self.source, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def collectstatic(self, storage, **settings):
+        with override_settings(
+            STORAGES={"staticfiles": storage},
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            **settings,
+        ):
+            call_command("collectstatic", interactive=False, verbosity=0, stdout=StringIO())
+            return storages["staticfiles"].stored_name("css/site.css")
+
+
+class WhiteNoiseTests(StaticFilesTestCase):
+    """
+    With STATIC_STORAGE_MODE "local", whitenoise serves the collected files.
+    """
+
+    @override_settings(DEBUG=False, STATIC_URL="/static/")
+    def test_hashed_names_are_immutable_and_compressed(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        storage = {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"}
+        hashed_css = self.collectstatic(storage, STATIC_ROOT=static_root)
+        self.assertTrue(HASHED_NAME_RE.search(hashed_css))
+        self.assertTrue(os.path.exists(os.path.join(static_root, hashed_css + ".gz")))
+
+        # Whitenoise tells hashed names by asking the storage for their URL
+        middleware = ["whitenoise.middleware.WhiteNoiseMiddleware", *settings.MIDDLEWARE]
+        with override_settings(
+            STORAGES={"staticfiles": storage}, STATIC_ROOT=static_root, MIDDLEWARE=middleware
+        ):
+            response = self.client.get(f"/static/{hashed_css}", headers={"Accept-Encoding": "gzip"})
+            self.assertIn("immutable", response["Cache-Control"])
+            self.assertEqual(response["Content-Encoding"], "gzip")
+
+            # Unhashed names change content, so are not cached for good
+            response = self.client.get("/static/css/site.css")
+            self.assertNotIn("immutable", response["Cache-Control"])
+
+
+@skipUnless(mock_aws, "moto is not installed")
+class S3StaticStorageTestCase(StaticFilesTestCase):
+    """Collects static files into a moto S3 bucket."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(os.environ, {
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_DEFAULT_REGION": "us-east-1",
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.s3 = boto3.client("s3")
+        self.s3.create_bucket(Bucket=BUCKET)
+
+    def get_object(self, key):
+        return self.s3.get_object(Bucket=BUCKET, Key=f"static/{key}")
+
+
+class HashedStaticStorageTests(S3StaticStorageTestCase):
+    """
+    Hashed names are uploaded for immutable caching, with compressed variants.
+    """
+
+    def test_hashed_names_are_immutable_and_compressed(self):
+        hashed_css = self.collectstatic({
+            "BACKEND": "mysite.storage.HashedStaticStorage",
+            "OPTIONS": {"bucket_name": BUCKET},
+        })
+        self.assertTrue(HASHED_NAME_RE.search(hashed_css))
+
+        self.assertEqual(self.get_object(hashed_css)["CacheControl"], IMMUTABLE_CACHE_CONTROL)
+        variant = self.get_object(hashed_css + ".gz")
+        self.assertEqual(variant["CacheControl"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(variant["ContentEncoding"], "gzip")
+        self.assertEqual(gzip.decompress(variant["Body"].read()), self.get_object(hashed_css)["Body"].read())
+
+        # Unhashed names change content, so keep the default Cache-Control
+        self.assertNotEqual(self.get_object("css/site.css").get("CacheControl"), IMMUTABLE_CACHE_CONTROL)
+
+
+class IncrementalStaticStorageTests(S3StaticStorageTestCase):
+    """
+    collectstatic against a moto S3 bucket uploads only the files that changed.
+    """
+
+    def collectstatic(self):
+        """Runs collectstatic with a fresh storage, returns the uploaded names."""
+        storage = {
+            "BACKEND": "mysite.storage.IncrementalStaticStorage",
+            "OPTIONS": {"bucket_name": BUCKET},
+        }
+        original_upload = IncrementalStaticStorage._upload
+        with mock.patch.object(
+            IncrementalStaticStorage, "_upload", autospec=True, side_effect=original_upload,
+        ) as upload:
+            super().collectstatic(storage)
+        return {call.args[1] for call in upload.call_args_list}
+
+    def test_upload_threads_only_run_during_post_processing(self):
+        storage = IncrementalStaticStorage(bucket_name=BUCKET)
+        storage.save("css/early.css", ContentFile(b"body {}"))
+        self.assertIsNone(storage._executor)
+
+        with mock.patch("mysite.storage.ThreadPoolExecutor", wraps=ThreadPoolExecutor) as executor:
+            self.collectstatic()
+        executor.assert_called_once()
+        # Closed once the uploads finished
+        self.assertFalse([thread for thread in threading.enumerate() if "ThreadPoolExecutor" in thread.name])
+
+    def test_only_changed_files_are_uploaded(self):
+        uploaded = self.collectstatic()
+        hashed_css = next(
+            name for name in uploaded if name.startswith("css/site.") and HASHED_NAME_RE.search(name)
+        )
+        self.assertIn(hashed_css + ".gz", uploaded)
+        self.assertEqual(self.get_object(hashed_css)["CacheControl"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.get_object(hashed_css + ".gz")["ContentEncoding"], "gzip")
+
+        self.assertEqual(self.collectstatic(), set())
+
+        self.write("img/bg.png", "new png")
+        uploaded = self.collectstatic()
+        # The image and the stylesheet referencing its new hashed name
+        self.assertIn("img/bg.png", uploaded)
+        self.assertTrue(any(name.startswith("css/site.") for name in uploaded))
+        self.assertNotIn(hashed_css, uploaded)
@@ -18,6 +18,8 @@ class CardBlock(StructBlock):
     class Meta:
         icon = "form"
         template = "portfolio/blocks/card_block.html"
+        # Renditions used by the template, generated when a page is published
+        rendition_filters = ["width-480"]
 
 class FeaturedPostsBlock(StructBlock):
     heading = CharBlock()
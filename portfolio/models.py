@@ -2,10 +2,12 @@ from wagtail.models import Page
 from wagtail.fields import StreamField
 from wagtail.admin.panels import FieldPanel
 
+from base.conditional import ConditionalGetMixin
+from base.page_cache import PageCacheMixin
 from portfolio.blocks import PortfolioStreamBlock
 
 
-class PortfolioPage(Page):
+class PortfolioPage(ConditionalGetMixin, PageCacheMixin, Page):
     parent_page_types = ["home.HomePage"]
 
     body = StreamField(
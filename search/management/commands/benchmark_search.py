@@ -0,0 +1,111 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from wagtail.models import Site
+from wagtail.search.backends import get_search_backend
+
+from blog.models import BlogIndexPage, BlogPage
+
+WORDS = (
+    "inflation market labour wage price demand supply policy rate bank growth "
+    "trade tax budget deficit python model data regression forecast index "
+    "housing energy climate currency export import capital debt yield bond"
+).split()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures blog search latency as the number of posts grows. Posts are "
+        "created in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1_000, 10_000, 30_000],
+            help="Numbers of posts to measure at.",
+        )
+        parser.add_argument(
+            '--queries',
+            nargs='+',
+            default=["inflation", "wage growth", "python regression model"],
+            help="Search queries to time.",
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help="Number of timed runs of each query at each size.",
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help="Keep the generated posts instead of rolling them back.",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(0)
+        try:
+            with transaction.atomic():
+                self.run(options)
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write("Generated posts rolled back")
+
+    def run(self, options):
+        site_root = Site.objects.get(is_default_site=True).root_page
+        blog_index = site_root.add_child(instance=BlogIndexPage(
+            title="Search benchmark", slug=f"search-benchmark-{int(time.time())}", intro="Benchmark",
+        ))
+        backend = get_search_backend()
+
+        self.stdout.write(f"Backend: {type(backend).__module__}")
+        self.stdout.write(f"{'posts':>8}  {'query':<28}{'median ms':>10}{'p95 ms':>10}")
+
+        count = 0
+        for size in sorted(options['sizes']):
+            batch = []
+            while count < size:
+                count += 1
+                batch.append(blog_index.add_child(instance=self.make_post(count)))
+                if len(batch) == 500:
+                    backend.add_bulk(BlogPage, batch)
+                    batch = []
+            if batch:
+                backend.add_bulk(BlogPage, batch)
+
+            for query in options['queries']:
+                median, p95 = self.time_query(query, options['repeat'])
+                self.stdout.write(f"{size:>8}  {query:<28}{median:>10.2f}{p95:>10.2f}")
+
+    def make_post(self, number):
+        def text(words):
+            return " ".join(self.random.choices(WORDS, k=words))
+
+        return BlogPage(
+            title=f"{text(4)} {number}",
+            slug=f"post-{number}",
+            intro=text(20),
+            body=f"<p>{text(300)}</p>",
+        )
+
+    def time_query(self, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            # One page of results, as served by the search view
+            list(BlogPage.objects.live().search(query)[:10])
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return statistics.median(timings), p95
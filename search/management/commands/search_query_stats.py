@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from wagtail.contrib.search_promotions.models import Query
+
+
+class Command(BaseCommand):
+    help = "Shows the most popular search queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help="Only count hits from the last DAYS days.",
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help="Number of queries to show.",
+        )
+
+    def handle(self, *args, **options):
+        date_since = timezone.now().date() - timedelta(days=options['days'])
+        queries = Query.get_most_popular(date_since)[:options['limit']]
+        for query in queries:
+            self.stdout.write(f"{query._hits:>8}  {query.query_string}")
@@ -0,0 +1,61 @@
+class ResultsPage:
+    """
+    One page of search results, found without counting them all.
+
+    ``total`` is only known once the last page has been reached; before
+    that, ``lower_bound`` tells how many results there are at least.
+    """
+
+    def __init__(self, object_list, number, has_next, per_page):
+        self.object_list = object_list
+        self.number = number
+        self.has_next = has_next
+        self.per_page = per_page
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def start_index(self):
+        return (self.number - 1) * self.per_page
+
+    @property
+    def lower_bound(self):
+        return self.start_index + len(self.object_list)
+
+    @property
+    def total(self):
+        return None if self.has_next else self.lower_bound
+
+
+def parse_page_number(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def paginate_without_count(results, number, per_page):
+    """
+    Slices a page out of ``results`` with a single query and no COUNT: one
+    extra row is fetched to find out whether there is a next page.
+    """
+    start = (number - 1) * per_page
+    object_list = list(results[start:start + per_page + 1])
+    has_next = len(object_list) > per_page
+    return ResultsPage(object_list[:per_page], number, has_next, per_page)
@@ -0,0 +1,125 @@
+"""
+Batched logging of search query hits for the "Promoted search results"
+module.
+
+``record_hit()`` only increments an in-memory counter, so logging adds no
+write to the search path. Each worker process flushes its counts in bulk
+from a background thread, every SEARCH_QUERY_LOG_FLUSH_INTERVAL seconds or
+as soon as SEARCH_QUERY_LOG_BATCH_SIZE hits are pending. Flushes add to the
+stored counts with F() expressions, so workers never overwrite each other.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from wagtail.contrib.search_promotions.models import Query, QueryDailyHits
+from wagtail.search.utils import normalise_query_string
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = Counter()
+_flush_requested = threading.Event()
+_flusher_pid = None
+
+
+def get_flush_interval():
+    return getattr(settings, 'SEARCH_QUERY_LOG_FLUSH_INTERVAL', 30)
+
+
+def get_batch_size():
+    return getattr(settings, 'SEARCH_QUERY_LOG_BATCH_SIZE', 500)
+
+
+def record_hit(query_string):
+    """Counts a hit for ``query_string``, to be written by the next flush."""
+    query_string = normalise_query_string(query_string)
+    if not query_string:
+        return
+
+    with _lock:
+        _pending[query_string, timezone.now().date()] += 1
+        pending = sum(_pending.values())
+
+    if get_flush_interval() <= 0:
+        # No background thread, flush in the request once the batch is full
+        if pending >= get_batch_size():
+            flush()
+        return
+
+    _ensure_flusher()
+    if pending >= get_batch_size():
+        _flush_requested.set()
+
+
+def flush():
+    """Writes the pending hits in bulk. Returns the number of hits written."""
+    with _lock:
+        hits = _pending.copy()
+        _pending.clear()
+    if not hits:
+        return 0
+
+    try:
+        _write_hits(hits)
+    except Exception:
+        logger.exception("Could not write %d search query hits", sum(hits.values()))
+        # Keep them for the next flush
+        with _lock:
+            _pending.update(hits)
+        return 0
+    return sum(hits.values())
+
+
+def _write_hits(hits):
+    query_strings = {query_string for query_string, date in hits}
+
+    with transaction.atomic():
+        Query.objects.bulk_create(
+            [Query(query_string=query_string) for query_string in query_strings],
+            ignore_conflicts=True,
+        )
+        query_ids = dict(
+            Query.objects.filter(query_string__in=query_strings).values_list('query_string', 'id')
+        )
+
+        QueryDailyHits.objects.bulk_create(
+            [
+                QueryDailyHits(query_id=query_ids[query_string], date=date, hits=0)
+                for query_string, date in hits
+            ],
+            ignore_conflicts=True,
+        )
+        for (query_string, date), count in hits.items():
+            QueryDailyHits.objects.filter(query_id=query_ids[query_string], date=date).update(
+                hits=F('hits') + count
+            )
+
+
+def _ensure_flusher():
+    # Started lazily, so each forked gunicorn worker gets its own thread
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_run_flusher, name='search-query-log', daemon=True).start()
+
+
+def _run_flusher():
+    while True:
+        _flush_requested.wait(get_flush_interval())
+        _flush_requested.clear()
+        close_old_connections()
+        flush()
+
+
+atexit.register(flush)
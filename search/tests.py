@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from wagtail.contrib.search_promotions.models import Query, SearchPromotion
+from wagtail.models import Site
+from wagtail.test.utils import WagtailPageTestCase
+
+from blog.models import BlogIndexPage, BlogPage
+from search import query_log
+
+
+class AutocompleteTests(WagtailPageTestCase):
+    """
+    The header search box gets page suggestions as JSON, from the cache when it can.
+    """
+
+    def setUp(self):
+        cache.clear()
+        site_root = Site.objects.get(is_default_site=True).root_page
+        blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        site_root.add_child(instance=blog_index)
+
+        self.post = BlogPage(title="Inflation targeting", slug="inflation", intro="Intro")
+        blog_index.add_child(instance=self.post)
+        self.post.tags.add("monetary policy")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save_revision().publish()
+
+    def autocomplete(self, query):
+        return self.client.get(reverse("search_autocomplete"), {"q": query})
+
+    def test_title_and_tag_prefixes_match(self):
+        for query in ["infl", "Inflation targ", "moneta"]:
+            with self.subTest(query=query):
+                response = self.autocomplete(query)
+                self.assertEqual(
+                    response.json()["results"],
+                    [{"title": "Inflation targeting", "url": self.post.url}],
+                )
+
+    def test_short_queries_are_not_searched(self):
+        self.autocomplete("i")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.autocomplete("i").json()["results"], [])
+
+    def test_answers_are_cached(self):
+        response = self.autocomplete("infl")
+        self.assertIn("max-age", response["Cache-Control"])
+        self.assertNotIn("Vary", response)
+
+        with self.assertNumQueries(0):
+            self.autocomplete("  INFL ")
+
+    def test_session_is_not_loaded(self):
+        self.autocomplete("infl")
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "visitor-session"
+        with self.assertNumQueries(0):
+            response = self.autocomplete("infl")
+        self.assertNotIn("Vary", response)
+
+
+@override_settings(SEARCH_RESULTS_PER_PAGE=2, SEARCH_QUERY_LOG_FLUSH_INTERVAL=0)
+class SearchResultsTests(WagtailPageTestCase):
+    """
+    Search result pages are found without a COUNT and cached per query.
+    """
+
+    def setUp(self):
+        cache.clear()
+        site_root = Site.objects.get(is_default_site=True).root_page
+        blog_index = BlogIndexPage(title="Blog", slug="blog", intro="Posts")
+        site_root.add_child(instance=blog_index)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(3):
+                blog_index.add_child(instance=BlogPage(
+                    title=f"Inflation {number}", slug=f"inflation-{number}", intro="Intro",
+                ))
+
+    def tearDown(self):
+        # Write the logged hits while the test database is still there
+        query_log.flush()
+
+    def search(self, query, page=1):
+        return self.client.get(reverse("search"), {"query": query, "page": page})
+
+    def test_pages_are_found_without_counting(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.search("inflation")
+        self.assertFalse(any("COUNT(" in query["sql"].upper() for query in queries))
+        self.assertContains(response, "more than 2 results")
+        self.assertContains(response, "page=2")
+
+        response = self.search("inflation", page=2)
+        self.assertContains(response, "3 results found")
+        self.assertNotContains(response, "page=3")
+
+    def test_out_of_range_page(self):
+        self.assertContains(self.search("inflation", page=5), "No more results")
+
+    @override_settings(SEARCH_MAX_PAGE=10)
+    def test_pages_past_the_last_one_served_are_not_found(self):
+        self.assertEqual(self.search("inflation", page=10).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search("inflation", page=11).status_code, 404)
+            self.assertEqual(self.search("inflation", page="9" * 30).status_code, 404)
+        self.assertFalse(any("wagtailsearch" in query["sql"] for query in queries))
+
+    def test_result_pages_are_cached_per_normalized_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search("inflation")
+        self.assertTrue(any("wagtailsearch" in query["sql"] for query in queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.search("  INFLATION ")
+        self.assertFalse(any("wagtailsearch" in query["sql"] for query in queries))
+        self.assertContains(response, "more than 2 results")
+
+
+@override_settings(SEARCH_QUERY_LOG_FLUSH_INTERVAL=0, SEARCH_QUERY_LOG_BATCH_SIZE=3)
+class QueryLogTests(WagtailPageTestCase):
+    """
+    Query hits are counted in memory and written in batches.
+    """
+
+    def setUp(self):
+        cache.clear()
+        query_log.flush()
+
+    def tearDown(self):
+        query_log.flush()
+
+    def get_hits(self, query_string):
+        return Query.objects.get(query_string=query_string).hits
+
+    def test_hits_are_written_in_batches(self):
+        with self.assertNumQueries(0):
+            query_log.record_hit("Inflation")
+            query_log.record_hit("inflation ")
+        self.assertFalse(Query.objects.exists())
+
+        # The third hit fills the batch
+        query_log.record_hit("wages")
+        self.assertEqual(self.get_hits("inflation"), 2)
+        self.assertEqual(self.get_hits("wages"), 1)
+
+        query_log.record_hit("inflation")
+        self.assertEqual(query_log.flush(), 1)
+        self.assertEqual(self.get_hits("inflation"), 3)
+
+    def test_search_view_logs_hits_and_shows_promotions(self):
+        page = Site.objects.get(is_default_site=True).root_page
+        SearchPromotion.objects.create(
+            query=Query.get("inflation"), page=page, description="Start here",
+        )
+
+        response = self.client.get(reverse("search"), {"query": "Inflation"})
+        self.assertContains(response, "Start here")
+
+        query_log.flush()
+        self.assertEqual(self.get_hits("inflation"), 1)
@@ -1,46 +1,112 @@
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
 from django.template.response import TemplateResponse
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_GET
 
+from wagtail.contrib.search_promotions.models import SearchPromotion
 from wagtail.models import Page
+from wagtail.search.utils import normalise_query_string
 
-# To enable logging of search queries for use with the "Promoted search results" module
-# <https://docs.wagtail.org/en/stable/reference/contrib/searchpromotions.html>
-# uncomment the following line and the lines indicated in the search function
-# (after adding wagtail.contrib.search_promotions to INSTALLED_APPS):
-
-# from wagtail.contrib.search_promotions.models import Query
+from base.sites import get_site
+from search import query_log
+from search.pagination import paginate_without_count, parse_page_number
 
 
 def search(request):
     search_query = request.GET.get("query", None)
-    page = request.GET.get("page", 1)
-
-    # Search
-    if search_query:
-        search_results = Page.objects.live().search(search_query)
-
-        # To log this query for use with the "Promoted search results" module:
+    query = normalize_query(search_query or "")
+    page_number = parse_page_number(request.GET.get("page"))
+    # Deeper pages would mean huge OFFSETs, and a cache entry per number asked for
+    if page_number > getattr(settings, "SEARCH_MAX_PAGE", 1000):
+        raise Http404("No such results page")
 
-        # query = Query.get(search_query)
-        # query.add_hit()
+    results_html = ""
+    if query:
+        if page_number == 1:
+            # Counted in memory and written in batches, see search/query_log.py
+            query_log.record_hit(query)
 
-    else:
-        search_results = Page.objects.none()
-
-    # Pagination
-    paginator = Paginator(search_results, 10)
-    try:
-        search_results = paginator.page(page)
-    except PageNotAnInteger:
-        search_results = paginator.page(1)
-    except EmptyPage:
-        search_results = paginator.page(paginator.num_pages)
+        results_html = get_results_html(request, query, page_number)
 
     return TemplateResponse(
         request,
         "search/search.html",
         {
             "search_query": search_query,
-            "search_results": search_results,
+            "results_html": results_html,
         },
     )
+
+
+def get_results_html(request, query, page_number):
+    """
+    Renders one page of results for a normalized query, cached per site for
+    a short while so popular queries do not run the full-text search again.
+    """
+    site = get_site(request)
+    query_hash = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    key = f"search:results:{site.pk if site else None}:{page_number}:{query_hash}"
+
+    results_html = cache.get(key)
+    if results_html is None:
+        per_page = getattr(settings, "SEARCH_RESULTS_PER_PAGE", 10)
+        search_results = paginate_without_count(
+            Page.objects.live().search(query), page_number, per_page
+        )
+        search_picks = []
+        if page_number == 1:
+            search_picks = SearchPromotion.objects.filter(
+                query__query_string=normalise_query_string(query)
+            ).select_related("page").order_by("sort_order")
+        results_html = render_to_string(
+            "search/includes/results.html",
+            {"search_query": query, "search_results": search_results, "search_picks": search_picks},
+            request=request,
+        )
+        cache.set(key, results_html, getattr(settings, "SEARCH_RESULTS_TIMEOUT", 60))
+    return mark_safe(results_html)
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+@require_GET
+def autocomplete(request):
+    """
+    Returns the titles and URLs of the live pages whose title or tags start
+    with the words typed so far, as JSON for the header search box.
+
+    Answers are cached per site and query, and sent with cache headers so
+    browsers and proxies can reuse them. Sessions and templates are never
+    touched.
+    """
+    query = normalize_query(request.GET.get("q", ""))
+    min_length = getattr(settings, "SEARCH_AUTOCOMPLETE_MIN_LENGTH", 2)
+    limit = getattr(settings, "SEARCH_AUTOCOMPLETE_LIMIT", 8)
+    timeout = getattr(settings, "SEARCH_AUTOCOMPLETE_TIMEOUT", 60 * 5)
+
+    results = []
+    if len(query) >= min_length:
+        site = get_site(request)
+        query_hash = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+        key = f"search:autocomplete:{site.pk if site else None}:{limit}:{query_hash}"
+
+        results = cache.get(key)
+        if results is None:
+            pages = Page.objects.live().public().autocomplete(query)[:limit]
+            results = [
+                {"title": page.title, "url": page.get_url(request)}
+                for page in pages
+            ]
+            cache.set(key, results, timeout)
+
+    response = JsonResponse({"query": query, "results": results})
+    patch_cache_control(response, public=True, max_age=timeout)
+    return response
@@ -0,0 +1,318 @@
+from botocore.exceptions import ClientError, NoCredentialsError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decouple import Config, RepositoryEnv
+import io
+import json
+import os
+import shutil
+import tarfile
+import zipfile
+
+from tools.aws.utils import create_s3_client, format_size, is_selected
+
+TAR_MODES = {
+    'tar': 'w',
+    'tar.gz': 'w:gz',
+    'tar.bz2': 'w:bz2',
+    'tar.xz': 'w:xz',
+}
+
+
+def archive_s3_bucket(
+        bucket_name,
+        archive_path,
+        archive_format='tar.gz',
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        region_name='us-east-2',
+        prefix='',
+        exclude_patterns=None,
+        include_patterns=None,
+        base_manifest_path=None,
+        max_workers=8,
+        prefetch_size=8 * 1024 * 1024,
+        max_buffer_size=128 * 1024 * 1024,
+        endpoint_url=None
+):
+    """
+    Back up an S3 bucket straight into a compressed archive, without a local copy.
+
+    Objects are read from the paginated listing and written to the archive
+    in listing order. Objects up to prefetch_size bytes are fetched ahead in
+    parallel by max_workers threads, holding at most max_buffer_size bytes
+    in memory; larger objects are streamed from S3 into the archive as they
+    are written.
+
+    A manifest of the archived keys and ETags is written next to the archive
+    (archive_path + '.manifest.json'). Given the manifest of an earlier backup
+    as base_manifest_path, only objects that are new or changed since are
+    archived, and the manifest lists the keys deleted since.
+
+    Run from the project root with: python -m tools.aws.archive_s3_bucket
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        archive_path (str): Path of the archive to create
+        archive_format (str): One of 'tar', 'tar.gz', 'tar.bz2', 'tar.xz' or 'zip'
+        aws_access_key_id (str, optional): AWS access key (uses default credentials if not provided)
+        aws_secret_access_key (str, optional): AWS secret key
+        region_name (str): AWS region name
+        prefix (str, optional): Only archive files with this prefix (folder path)
+        exclude_patterns (list, optional): List of patterns to exclude (e.g., ['*.log', 'temp/*'])
+        include_patterns (list, optional): List of patterns to include (e.g., ['*.jpg', '*.png'])
+        base_manifest_path (str, optional): Manifest of an earlier backup, for an incremental backup
+        max_workers (int): Number of objects fetched at the same time
+        prefetch_size (int): Size in bytes up to which objects are fetched ahead
+        max_buffer_size (int): Bytes of fetched objects held in memory at most
+        endpoint_url (str, optional): Endpoint of an S3-compatible service
+
+    Returns:
+        dict: Summary of archive operation
+
+    Example:
+        result = archive_s3_bucket(
+            bucket_name='my-wagtail-media',
+            archive_path='./backups/media-2025-01-01.tar.gz',
+            base_manifest_path='./backups/media-2024-12-01.tar.gz.manifest.json'
+        )
+    """
+
+    if archive_format != 'zip' and archive_format not in TAR_MODES:
+        return {
+            'success': False,
+            'error': f"Unknown archive format: {archive_format}"
+        }
+
+    print(f"========================================")
+    print(f"S3 Bucket Archive")
+    print(f"========================================")
+    print(f"Bucket: {bucket_name}")
+    print(f"Archive: {archive_path} ({archive_format})")
+    print(f"Prefix: {prefix if prefix else '(root)'}")
+    print(f"Base manifest: {base_manifest_path if base_manifest_path else '(full backup)'}")
+    print(f"========================================\n")
+
+    try:
+        s3_client = create_s3_client(
+            aws_access_key_id,
+            aws_secret_access_key,
+            region_name,
+            endpoint_url=endpoint_url,
+            max_pool_connections=max_workers + 1
+        )
+        print("✓ Connected to S3")
+    except NoCredentialsError:
+        print("✗ AWS credentials not found!")
+        return {
+            'success': False,
+            'error': 'No AWS credentials found. Set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY environment variables or pass them as parameters.'
+        }
+    except Exception as e:
+        print(f"✗ Error connecting to S3: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+    base_objects = {}
+    if base_manifest_path:
+        with open(base_manifest_path) as f:
+            base_objects = json.load(f)['objects']
+
+    archive_dir = os.path.dirname(archive_path)
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+
+    manifest_path = archive_path + '.manifest.json'
+    # Every selected object of the bucket, archived now or before
+    objects = {}
+    archived_files = []
+    unchanged_files = []
+    skipped_files = []
+    total_size = 0
+
+    def fetch(s3_key):
+        return s3_client.get_object(Bucket=bucket_name, Key=s3_key)['Body'].read()
+
+    def list_objects():
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                s3_key = obj['Key']
+
+                # Skip directories (keys ending with /)
+                if s3_key.endswith('/'):
+                    continue
+                if not is_selected(s3_key, include_patterns, exclude_patterns):
+                    skipped_files.append(s3_key)
+                    continue
+
+                objects[s3_key] = {
+                    'etag': obj['ETag'],
+                    'size': obj['Size'],
+                    'last_modified': obj['LastModified'].isoformat()
+                }
+                if base_objects.get(s3_key, {}).get('etag') == obj['ETag']:
+                    unchanged_files.append(s3_key)
+                    continue
+                yield obj
+
+    # Objects waiting to be written, in listing order, with the fetch of the
+    # small ones already running
+    window = deque()
+    buffered = 0
+
+    def write_next():
+        nonlocal buffered, total_size
+        obj, future = window.popleft()
+        if future is not None:
+            fileobj = io.BytesIO(future.result())
+            buffered -= obj['Size']
+        else:
+            fileobj = s3_client.get_object(Bucket=bucket_name, Key=obj['Key'])['Body']
+        writer.add(_relative_path(obj['Key'], prefix), obj['Size'], obj['LastModified'], fileobj)
+        archived_files.append({
+            's3_key': obj['Key'],
+            'etag': obj['ETag'],
+            'size': obj['Size']
+        })
+        total_size += obj['Size']
+        print(f"+ {obj['Key']} ({format_size(obj['Size'])})")
+
+    writer = _ArchiveWriter(archive_path, archive_format)
+    try:
+        print(f"Archiving objects of bucket '{bucket_name}' with {max_workers} workers...\n")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for obj in list_objects():
+                prefetch = obj['Size'] <= prefetch_size
+                # Write out the oldest objects until this one fits in the window
+                while window and (
+                        len(window) >= 2 * max_workers
+                        or (prefetch and buffered + obj['Size'] > max_buffer_size)
+                ):
+                    write_next()
+
+                future = None
+                if prefetch:
+                    future = executor.submit(fetch, obj['Key'])
+                    buffered += obj['Size']
+                window.append((obj, future))
+
+            while window:
+                write_next()
+    except ClientError as e:
+        writer.close()
+        error_code = e.response['Error']['Code']
+        print(f"\n✗ S3 Error: {error_code}")
+        return {
+            'success': False,
+            'error': f"S3 Error: {error_code}",
+            'archive_path': archive_path
+        }
+    except Exception as e:
+        writer.close()
+        print(f"\n✗ Error: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'archive_path': archive_path
+        }
+    writer.close()
+
+    deleted_files = sorted(set(base_objects) - set(objects))
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            'bucket': bucket_name,
+            'prefix': prefix,
+            'created': datetime.now(timezone.utc).isoformat(),
+            'base_manifest': base_manifest_path,
+            'objects': objects,
+            'archived': [item['s3_key'] for item in archived_files],
+            'deleted': deleted_files
+        }, f, indent=2)
+
+    # Summary
+    print(f"\n{'=' * 50}")
+    print(f"✓ Archive Complete!")
+    print(f"{'=' * 50}")
+    print(f"Archived: {len(archived_files)} files ({format_size(total_size)})")
+    print(f"Unchanged: {len(unchanged_files)} files")
+    print(f"Deleted since base: {len(deleted_files)} files")
+    print(f"Skipped: {len(skipped_files)} files")
+    print(f"Archive size: {format_size(os.path.getsize(archive_path))}")
+    print(f"Manifest: {manifest_path}")
+    print(f"{'=' * 50}\n")
+
+    return {
+        'success': True,
+        'archived_files': archived_files,
+        'unchanged_files': unchanged_files,
+        'deleted_files': deleted_files,
+        'skipped_files': skipped_files,
+        'total_files': len(archived_files),
+        'total_size': total_size,
+        'archive_path': archive_path,
+        'manifest_path': manifest_path
+    }
+
+
+class _ArchiveWriter:
+    """Writes entries of known size from file objects to a tar or zip archive"""
+
+    def __init__(self, archive_path, archive_format):
+        if archive_format == 'zip':
+            self.zip = zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED)
+            self.tar = None
+        else:
+            self.tar = tarfile.open(archive_path, TAR_MODES[archive_format])
+            self.zip = None
+
+    def add(self, name, size, last_modified, fileobj):
+        if self.tar is not None:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = last_modified.timestamp()
+            self.tar.addfile(info, fileobj)
+        else:
+            info = zipfile.ZipInfo(name, date_time=last_modified.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.file_size = size
+            with self.zip.open(info, 'w', force_zip64=True) as entry:
+                shutil.copyfileobj(fileobj, entry, 1024 * 1024)
+
+    def close(self):
+        (self.tar or self.zip).close()
+
+
+def _relative_path(s3_key, prefix):
+    """Name of an object in the archive, without the prefix"""
+    if prefix and s3_key.startswith(prefix):
+        return s3_key[len(prefix):]
+    return s3_key
+
+
+# Example usage
+if __name__ == "__main__":
+    config = Config(RepositoryEnv(".env.dev"))
+
+    bucket_name = config('AWS_MEDIA_STORAGE_BUCKET_NAME')
+    today = datetime.now(timezone.utc).date().isoformat()
+
+    result = archive_s3_bucket(
+        bucket_name=bucket_name,
+        archive_path=f'./backups/{bucket_name}-{today}.tar.gz',
+        aws_access_key_id=config('S3_ACCESS_KEY'),
+        aws_secret_access_key=config('S3_SECRET_KEY'),
+        region_name=config('AWS_S3_REGION_NAME'),
+        prefix='',  # Archive everything
+    )
+
+    if result['success']:
+        print(f"\n✓ Successfully archived {result['total_files']} files")
+        print(f"  Total size: {format_size(result['total_size'])}")
+        print(f"  Archive: {result['archive_path']}")
+    else:
+        print(f"\n✗ Archive failed: {result['error']}")
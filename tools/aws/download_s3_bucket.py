@@ -1,9 +1,20 @@
-import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, NoCredentialsError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from decouple import Config, RepositoryEnv
+import hashlib
+import json
 import os
+import threading
 from pathlib import Path
 
+from tools.aws.utils import create_s3_client, format_size, is_selected
+
+# Name of the file in local_dir recording the ETag of every downloaded object
+MANIFEST_NAME = '.s3-manifest.json'
+# Ranged GETs of one object run in parallel with this many threads
+PART_CONCURRENCY = 4
+
 
 def download_s3_bucket(
         bucket_name,
@@ -13,11 +24,24 @@ def download_s3_bucket(
         region_name='us-east-2',
         prefix='',
         exclude_patterns=None,
-        include_patterns=None
+        include_patterns=None,
+        max_workers=16,
+        multipart_threshold=16 * 1024 * 1024,
+        multipart_chunksize=8 * 1024 * 1024,
+        endpoint_url=None
 ):
     """
     Download all files from an S3 bucket.
 
+    Objects are downloaded concurrently by a pool of max_workers threads
+    sharing one client. Objects larger than multipart_threshold are fetched
+    with parallel ranged GETs of multipart_chunksize bytes.
+
+    The ETag of every downloaded object is recorded in a manifest in
+    local_dir, and files whose size and ETag still match are skipped, so an
+    interrupted download resumes where it stopped. Files without a manifest
+    entry are compared by MD5 when the object has a single-part ETag.
+
     Args:
         bucket_name (str): Name of the S3 bucket
         local_dir (str): Local directory to download files to
@@ -27,6 +51,10 @@ def download_s3_bucket(
         prefix (str, optional): Only download files with this prefix (folder path)
         exclude_patterns (list, optional): List of patterns to exclude (e.g., ['*.log', 'temp/*'])
         include_patterns (list, optional): List of patterns to include (e.g., ['*.jpg', '*.png'])
+        max_workers (int): Number of objects downloaded at the same time
+        multipart_threshold (int): Size in bytes from which ranged GETs are used
+        multipart_chunksize (int): Size in bytes of each ranged GET
+        endpoint_url (str, optional): Endpoint of an S3-compatible service
 
     Returns:
         dict: Summary of download operation
@@ -48,19 +76,16 @@ def download_s3_bucket(
     print(f"Prefix: {prefix if prefix else '(root)'}")
     print(f"========================================\n")
 
-    # Create S3 client
+    # Create S3 client, shared by every thread, with a connection for each
+    # ranged GET that can run at the same time
     try:
-        if aws_access_key_id and aws_secret_access_key:
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=aws_access_key_id,
-                aws_secret_access_key=aws_secret_access_key,
-                region_name=region_name
-            )
-        else:
-            # Use default credentials (from ~/.aws/credentials or environment variables)
-            s3_client = boto3.client('s3', region_name=region_name)
-
+        s3_client = create_s3_client(
+            aws_access_key_id,
+            aws_secret_access_key,
+            region_name,
+            endpoint_url=endpoint_url,
+            max_pool_connections=max_workers * PART_CONCURRENCY
+        )
         print("✓ Connected to S3")
     except NoCredentialsError:
         print("✗ AWS credentials not found!")
@@ -78,11 +103,26 @@ def download_s3_bucket(
     # Create local directory
     Path(local_dir).mkdir(parents=True, exist_ok=True)
 
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=PART_CONCURRENCY
+    )
+    manifest_path = os.path.join(local_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+    manifest_lock = threading.Lock()
+
     downloaded_files = []
     skipped_files = []
+    unchanged_files = []
     failed_files = []
     total_size = 0
 
+    def download(s3_key, local_file_path, file_size, etag):
+        s3_client.download_file(bucket_name, s3_key, local_file_path, Config=transfer_config)
+        with manifest_lock:
+            manifest[s3_key] = {'etag': etag, 'size': file_size}
+
     try:
         # List all objects in the bucket
         print(f"Listing objects in bucket '{bucket_name}'...\n")
@@ -90,6 +130,7 @@ def download_s3_bucket(
         paginator = s3_client.get_paginator('list_objects_v2')
         pages = paginator.paginate(Bucket=bucket_name, Prefix=prefix)
 
+        to_download = []
         for page in pages:
             if 'Contents' not in page:
                 continue
@@ -102,16 +143,9 @@ def download_s3_bucket(
                 if s3_key.endswith('/'):
                     continue
 
-                # Check exclude patterns
-                if exclude_patterns and any(_matches_pattern(s3_key, pattern) for pattern in exclude_patterns):
-                    skipped_files.append(s3_key)
-                    print(f"⊝ Skipped (excluded): {s3_key}")
-                    continue
-
-                # Check include patterns
-                if include_patterns and not any(_matches_pattern(s3_key, pattern) for pattern in include_patterns):
+                # Check include and exclude patterns
+                if not is_selected(s3_key, include_patterns, exclude_patterns):
                     skipped_files.append(s3_key)
-                    print(f"⊝ Skipped (not included): {s3_key}")
                     continue
 
                 # Determine local file path
@@ -123,41 +157,61 @@ def download_s3_bucket(
 
                 local_file_path = os.path.join(local_dir, relative_path)
 
+                if _is_unchanged(local_file_path, file_size, obj['ETag'], manifest.get(s3_key)):
+                    manifest[s3_key] = {'etag': obj['ETag'], 'size': file_size}
+                    unchanged_files.append(s3_key)
+                    continue
+
                 # Create subdirectories if needed
                 local_file_dir = os.path.dirname(local_file_path)
                 if local_file_dir:
                     Path(local_file_dir).mkdir(parents=True, exist_ok=True)
 
-                # Download the file
+                to_download.append((s3_key, local_file_path, file_size, obj['ETag']))
+
+        print(f"Unchanged: {len(unchanged_files)} files, excluded: {len(skipped_files)} files")
+        print(f"Downloading {len(to_download)} files with {max_workers} workers...\n")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(download, *item): item for item in to_download}
+            for number, future in enumerate(as_completed(futures), start=1):
+                s3_key, local_file_path, file_size, etag = futures[future]
                 try:
-                    print(f"↓ Downloading: {s3_key} ({_format_size(file_size)})")
-                    s3_client.download_file(bucket_name, s3_key, local_file_path)
+                    future.result()
                     downloaded_files.append({
                         's3_key': s3_key,
                         'local_path': local_file_path,
                         'size': file_size
                     })
                     total_size += file_size
-                    print(f"  ✓ Saved to: {local_file_path}")
+                    print(f"↓ [{number}/{len(to_download)}] {s3_key} ({format_size(file_size)})")
                 except ClientError as e:
                     error_code = e.response['Error']['Code']
-                    print(f"  ✗ Failed: {error_code}")
+                    print(f"✗ [{number}/{len(to_download)}] {s3_key}: {error_code}")
                     failed_files.append({
                         's3_key': s3_key,
                         'error': str(e)
                     })
                 except Exception as e:
-                    print(f"  ✗ Failed: {e}")
+                    print(f"✗ [{number}/{len(to_download)}] {s3_key}: {e}")
                     failed_files.append({
                         's3_key': s3_key,
                         'error': str(e)
                     })
 
+                # Save progress regularly, so an interruption loses little
+                if number % 100 == 0:
+                    with manifest_lock:
+                        _save_manifest(manifest_path, manifest)
+
+        _save_manifest(manifest_path, manifest)
+
         # Summary
         print(f"\n{'=' * 50}")
         print(f"✓ Download Complete!")
         print(f"{'=' * 50}")
-        print(f"Downloaded: {len(downloaded_files)} files ({_format_size(total_size)})")
+        print(f"Downloaded: {len(downloaded_files)} files ({format_size(total_size)})")
+        print(f"Unchanged: {len(unchanged_files)} files")
         print(f"Skipped: {len(skipped_files)} files")
         print(f"Failed: {len(failed_files)} files")
         print(f"{'=' * 50}\n")
@@ -166,6 +220,7 @@ def download_s3_bucket(
             'success': True,
             'downloaded_files': downloaded_files,
             'skipped_files': skipped_files,
+            'unchanged_files': unchanged_files,
             'failed_files': failed_files,
             'total_files': len(downloaded_files),
             'total_size': total_size,
@@ -173,6 +228,7 @@ def download_s3_bucket(
         }
 
     except ClientError as e:
+        _save_manifest(manifest_path, manifest)
         error_code = e.response['Error']['Code']
         print(f"\n✗ S3 Error: {error_code}")
         return {
@@ -182,6 +238,7 @@ def download_s3_bucket(
             'failed_files': failed_files
         }
     except Exception as e:
+        _save_manifest(manifest_path, manifest)
         print(f"\n✗ Error: {e}")
         return {
             'success': False,
@@ -191,19 +248,43 @@ def download_s3_bucket(
         }
 
 
-def _matches_pattern(path, pattern):
-    """Check if path matches a glob-style pattern"""
-    import fnmatch
-    return fnmatch.fnmatch(path, pattern)
+def _is_unchanged(local_file_path, file_size, etag, manifest_entry):
+    """Check if the local file already holds the object with this size and ETag"""
+    try:
+        if os.path.getsize(local_file_path) != file_size:
+            return False
+    except OSError:
+        return False
+
+    if manifest_entry is not None:
+        return manifest_entry['etag'] == etag and manifest_entry['size'] == file_size
+
+    # Without a manifest entry, only single-part ETags can be checked, as the
+    # ETag of a multipart upload depends on its part size
+    if '-' in etag:
+        return False
+    md5 = hashlib.md5(usedforsecurity=False)
+    with open(local_file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest() == etag.strip('"')
+
+
+def _load_manifest(manifest_path):
+    """Load the ETags recorded by a previous download, if any"""
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
 
-def _format_size(bytes):
-    """Format bytes to human-readable size"""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if bytes < 1024.0:
-            return f"{bytes:.2f} {unit}"
-        bytes /= 1024.0
-    return f"{bytes:.2f} PB"
+def _save_manifest(manifest_path, manifest):
+    """Write the manifest atomically, so an interruption never corrupts it"""
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
 
 
 # Example usage
@@ -229,7 +310,7 @@ if __name__ == "__main__":
 
         if result['success']:
             print(f"\n✓ Successfully downloaded {result['total_files']} files")
-            print(f"  Total size: {_format_size(result['total_size'])}")
+            print(f"  Total size: {format_size(result['total_size'])}")
             print(f"  Location: {result['local_directory']}")
         else:
             print(f"\n✗ Download failed: {result['error']}")
\ No newline at end of file
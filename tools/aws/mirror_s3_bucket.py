@@ -0,0 +1,309 @@
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError, NoCredentialsError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decouple import Config, RepositoryEnv
+
+from tools.aws.utils import create_s3_client, format_size, is_selected
+
+# Largest object a single CopyObject request can copy
+COPY_OBJECT_LIMIT = 5 * 1024 * 1024 * 1024
+# Parts of one managed copy run in parallel with this many threads
+PART_CONCURRENCY = 4
+# Metadata recording the source ETag on copies whose ETag cannot match it
+SOURCE_ETAG_METADATA = 'mirror-source-etag'
+# Headers kept when a copy has to replace the metadata of the source object
+COPIED_HEADERS = [
+    'CacheControl', 'ContentDisposition', 'ContentEncoding', 'ContentLanguage', 'ContentType'
+]
+
+
+def mirror_s3_bucket(
+        source_bucket,
+        destination_bucket,
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        region_name='us-east-2',
+        prefix='',
+        destination_prefix=None,
+        exclude_patterns=None,
+        include_patterns=None,
+        delete=False,
+        dry_run=False,
+        max_workers=32,
+        endpoint_url=None
+):
+    """
+    Mirror a bucket into another one with server-side copies.
+
+    Both buckets are listed and diffed by key and ETag, and only missing or
+    changed objects are copied, by max_workers concurrent CopyObject
+    requests. Objects larger than 5 GB use a managed multipart copy. The
+    data never leaves S3, so the credentials must be able to read the
+    source and write the destination.
+
+    Objects uploaded in parts have an ETag that a copy cannot reproduce, so
+    their copies record the source ETag in their metadata, which is checked
+    with a HEAD request when the listings disagree.
+
+    Run from the project root with: python -m tools.aws.mirror_s3_bucket
+
+    Args:
+        source_bucket (str): Name of the bucket to copy from
+        destination_bucket (str): Name of the bucket to copy to
+        aws_access_key_id (str, optional): AWS access key (uses default credentials if not provided)
+        aws_secret_access_key (str, optional): AWS secret key
+        region_name (str): AWS region name
+        prefix (str, optional): Only mirror objects with this prefix (folder path)
+        destination_prefix (str, optional): Prefix replacing prefix in the destination (defaults to prefix)
+        exclude_patterns (list, optional): List of patterns to exclude (e.g., ['*.log', 'temp/*'])
+        include_patterns (list, optional): List of patterns to include (e.g., ['*.jpg', '*.png'])
+        delete (bool): Delete destination objects that are not in the source
+        dry_run (bool): Only report what would be copied and deleted
+        max_workers (int): Number of copies running at the same time
+        endpoint_url (str, optional): Endpoint of an S3-compatible service
+
+    Returns:
+        dict: Summary of mirror operation
+
+    Example:
+        result = mirror_s3_bucket(
+            source_bucket='my-wagtail-media',
+            destination_bucket='my-wagtail-media-staging',
+            prefix='media/',
+            delete=True
+        )
+    """
+
+    if destination_prefix is None:
+        destination_prefix = prefix
+
+    print(f"========================================")
+    print(f"S3 Bucket Mirror")
+    print(f"========================================")
+    print(f"Source: {source_bucket}/{prefix}")
+    print(f"Destination: {destination_bucket}/{destination_prefix}")
+    print(f"Delete extras: {'yes' if delete else 'no'}{' (dry run)' if dry_run else ''}")
+    print(f"========================================\n")
+
+    try:
+        s3_client = create_s3_client(
+            aws_access_key_id,
+            aws_secret_access_key,
+            region_name,
+            endpoint_url=endpoint_url,
+            max_pool_connections=max_workers * PART_CONCURRENCY
+        )
+        print("✓ Connected to S3")
+    except NoCredentialsError:
+        print("✗ AWS credentials not found!")
+        return {
+            'success': False,
+            'error': 'No AWS credentials found. Set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY environment variables or pass them as parameters.'
+        }
+    except Exception as e:
+        print(f"✗ Error connecting to S3: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+    transfer_config = TransferConfig(
+        multipart_threshold=COPY_OBJECT_LIMIT,
+        multipart_chunksize=512 * 1024 * 1024,
+        max_concurrency=PART_CONCURRENCY
+    )
+
+    copied_files = []
+    unchanged_files = []
+    skipped_files = []
+    deleted_files = []
+    failed_files = []
+    total_size = 0
+
+    def list_objects(bucket_name, list_prefix):
+        objects = {}
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=list_prefix):
+            for obj in page.get('Contents', []):
+                objects[obj['Key'][len(list_prefix):]] = obj
+        return objects
+
+    def is_copy_of(source, destination_key):
+        """Check the source ETag recorded on a copy of a multipart object"""
+        head = s3_client.head_object(Bucket=destination_bucket, Key=destination_key)
+        return head.get('Metadata', {}).get(SOURCE_ETAG_METADATA) == source['ETag']
+
+    def copy(relative_path, source, destination):
+        """Copy an object unless the destination holds it. Returns True if copied."""
+        destination_key = destination_prefix + relative_path
+        if destination is not None and destination['Size'] == source['Size']:
+            if destination['ETag'] == source['ETag']:
+                return False
+            if '-' in source['ETag'] and is_copy_of(source, destination_key):
+                return False
+        if dry_run:
+            return True
+
+        copy_source = {'Bucket': source_bucket, 'Key': source['Key']}
+        if '-' not in source['ETag'] and source['Size'] <= COPY_OBJECT_LIMIT:
+            # The copy keeps the metadata and the ETag of the source
+            s3_client.copy_object(Bucket=destination_bucket, Key=destination_key, CopySource=copy_source)
+            return True
+
+        # The copy gets an ETag of its own, so record the source one
+        head = s3_client.head_object(Bucket=source_bucket, Key=source['Key'])
+        extra_args = {header: head[header] for header in COPIED_HEADERS if head.get(header)}
+        extra_args['Metadata'] = {**head.get('Metadata', {}), SOURCE_ETAG_METADATA: source['ETag']}
+        if source['Size'] <= COPY_OBJECT_LIMIT:
+            s3_client.copy_object(
+                Bucket=destination_bucket,
+                Key=destination_key,
+                CopySource=copy_source,
+                MetadataDirective='REPLACE',
+                **extra_args
+            )
+        else:
+            s3_client.copy(
+                copy_source, destination_bucket, destination_key, ExtraArgs=extra_args, Config=transfer_config
+            )
+        return True
+
+    try:
+        print(f"Listing objects in '{source_bucket}' and '{destination_bucket}'...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            source_listing = executor.submit(list_objects, source_bucket, prefix)
+            destination_listing = executor.submit(list_objects, destination_bucket, destination_prefix)
+            source_objects = source_listing.result()
+            destination_objects = destination_listing.result()
+        print(f"Found {len(source_objects)} source and {len(destination_objects)} destination objects\n")
+
+        to_copy = []
+        for relative_path, source in sorted(source_objects.items()):
+            # Skip directories (keys ending with /)
+            if source['Key'].endswith('/'):
+                continue
+            if not is_selected(source['Key'], include_patterns, exclude_patterns):
+                skipped_files.append(source['Key'])
+                continue
+            to_copy.append((relative_path, source, destination_objects.get(relative_path)))
+
+        print(f"Comparing and copying {len(to_copy)} objects with {max_workers} workers...\n")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(copy, *item): item for item in to_copy}
+            for future in as_completed(futures):
+                relative_path, source, destination = futures[future]
+                try:
+                    if not future.result():
+                        unchanged_files.append(source['Key'])
+                        continue
+                    copied_files.append({
+                        'source_key': source['Key'],
+                        'destination_key': destination_prefix + relative_path,
+                        'size': source['Size']
+                    })
+                    total_size += source['Size']
+                    print(f"→ [{len(copied_files)}] {source['Key']} ({format_size(source['Size'])})")
+                except ClientError as e:
+                    error_code = e.response['Error']['Code']
+                    print(f"✗ {source['Key']}: {error_code}")
+                    failed_files.append({
+                        's3_key': source['Key'],
+                        'error': str(e)
+                    })
+                except Exception as e:
+                    print(f"✗ {source['Key']}: {e}")
+                    failed_files.append({
+                        's3_key': source['Key'],
+                        'error': str(e)
+                    })
+
+        if delete:
+            # Only delete objects the patterns select, so excluded ones are kept
+            extra_keys = sorted(
+                destination_prefix + relative_path
+                for relative_path in destination_objects
+                if relative_path not in source_objects
+                and is_selected(prefix + relative_path, include_patterns, exclude_patterns)
+            )
+            for start in range(0, len(extra_keys), 1000):
+                batch = extra_keys[start:start + 1000]
+                errors = {}
+                if not dry_run:
+                    response = s3_client.delete_objects(
+                        Bucket=destination_bucket,
+                        Delete={'Objects': [{'Key': s3_key} for s3_key in batch], 'Quiet': True}
+                    )
+                    errors = {error['Key']: error for error in response.get('Errors', [])}
+                for s3_key in batch:
+                    if s3_key in errors:
+                        print(f"✗ Not deleted: {s3_key} ({errors[s3_key]['Code']})")
+                        failed_files.append({
+                            's3_key': s3_key,
+                            'error': errors[s3_key]['Message']
+                        })
+                    else:
+                        print(f"- Deleted: {s3_key}")
+                        deleted_files.append(s3_key)
+
+        # Summary
+        print(f"\n{'=' * 50}")
+        print(f"✓ Mirror Complete!{' (dry run)' if dry_run else ''}")
+        print(f"{'=' * 50}")
+        print(f"Copied: {len(copied_files)} files ({format_size(total_size)})")
+        print(f"Unchanged: {len(unchanged_files)} files")
+        print(f"Deleted: {len(deleted_files)} files")
+        print(f"Skipped: {len(skipped_files)} files")
+        print(f"Failed: {len(failed_files)} files")
+        print(f"{'=' * 50}\n")
+
+        return {
+            'success': True,
+            'copied_files': copied_files,
+            'unchanged_files': unchanged_files,
+            'deleted_files': deleted_files,
+            'skipped_files': skipped_files,
+            'failed_files': failed_files,
+            'total_files': len(copied_files),
+            'total_size': total_size
+        }
+
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        print(f"\n✗ S3 Error: {error_code}")
+        return {
+            'success': False,
+            'error': f"S3 Error: {error_code}",
+            'copied_files': copied_files,
+            'failed_files': failed_files
+        }
+    except Exception as e:
+        print(f"\n✗ Error: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'copied_files': copied_files,
+            'failed_files': failed_files
+        }
+
+
+# Example usage
+if __name__ == "__main__":
+    config = Config(RepositoryEnv(".env.dev"))
+
+    result = mirror_s3_bucket(
+        source_bucket=config('AWS_MEDIA_STORAGE_BUCKET_NAME'),
+        destination_bucket=config('AWS_STAGING_MEDIA_STORAGE_BUCKET_NAME'),
+        aws_access_key_id=config('S3_ACCESS_KEY'),
+        aws_secret_access_key=config('S3_SECRET_KEY'),
+        region_name=config('AWS_S3_REGION_NAME'),
+        prefix='media/',
+        delete=True,
+        dry_run=True,  # Review the changes first
+    )
+
+    if result['success']:
+        print(f"\n✓ Successfully mirrored {result['total_files']} files")
+        print(f"  Total size: {format_size(result['total_size'])}")
+    else:
+        print(f"\n✗ Mirror failed: {result['error']}")
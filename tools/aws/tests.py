@@ -0,0 +1,331 @@
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+
+from tools.aws.archive_s3_bucket import archive_s3_bucket
+from tools.aws.download_s3_bucket import MANIFEST_NAME, download_s3_bucket
+from tools.aws.mirror_s3_bucket import SOURCE_ETAG_METADATA, mirror_s3_bucket
+from tools.aws.upload_s3_bucket import IMMUTABLE_CACHE_CONTROL, upload_s3_bucket
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+BUCKET = "tools-test"
+MIRROR_BUCKET = "tools-test-mirror"
+REGION = "us-east-1"
+# Smallest part size S3 accepts for multipart uploads
+PART_SIZE = 5 * 1024 * 1024
+
+
+@skipUnless(mock_aws, "moto is not installed")
+class S3ToolTestCase(SimpleTestCase):
+    """Runs the aws tools against a moto S3, in a temporary folder."""
+
+    def setUp(self):
+        # The tools report their progress on stdout
+        self.enterContext(redirect_stdout(StringIO()))
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        self.enterContext(mock.patch.dict(os.environ, {
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_DEFAULT_REGION": REGION,
+        }))
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.s3 = boto3.client("s3", region_name=REGION)
+        self.s3.create_bucket(Bucket=BUCKET)
+
+    def path(self, *parts):
+        return os.path.join(self.tmp, *parts)
+
+    def put(self, key, content, bucket=BUCKET, multipart=False):
+        """Uploads an object, in PART_SIZE parts if multipart."""
+        config = TransferConfig(multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE)
+        if not multipart:
+            config.multipart_threshold = len(content) + 1
+        self.s3.upload_fileobj(BytesIO(content), bucket, key, Config=config)
+
+    def keys(self, bucket=BUCKET):
+        return sorted(obj["Key"] for obj in self.s3.list_objects_v2(Bucket=bucket).get("Contents", []))
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class DownloadTests(S3ToolTestCase):
+    """
+    Downloads skip files whose size and ETag match, so interrupted downloads resume.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.objects = {
+            "media/a.txt": b"a" * 100,
+            "media/images/b.jpg": b"b" * 2000,
+            "media/large.bin": os.urandom(PART_SIZE + 1024),
+        }
+        for key, content in self.objects.items():
+            self.put(key, content, multipart=len(content) > PART_SIZE)
+
+    def download(self):
+        return download_s3_bucket(BUCKET, local_dir=self.path("media"), region_name=REGION, prefix="media/")
+
+    def downloaded_keys(self, result):
+        return sorted(item["s3_key"] for item in result["downloaded_files"])
+
+    def test_second_run_downloads_nothing(self):
+        result = self.download()
+        self.assertEqual(self.downloaded_keys(result), sorted(self.objects))
+        self.assertEqual(self.read(self.path("media", "large.bin")), self.objects["media/large.bin"])
+        with open(self.path("media", MANIFEST_NAME)) as f:
+            self.assertEqual(set(json.load(f)), set(self.objects))
+
+        result = self.download()
+        self.assertEqual(result["downloaded_files"], [])
+        self.assertEqual(sorted(result["unchanged_files"]), sorted(self.objects))
+
+    def test_interrupted_download_resumes(self):
+        self.download()
+        # As if the run had stopped before these two files
+        os.remove(self.path("media", "a.txt"))
+        os.remove(self.path("media", "large.bin"))
+
+        result = self.download()
+        self.assertEqual(self.downloaded_keys(result), ["media/a.txt", "media/large.bin"])
+
+    def test_changed_object_is_downloaded_again(self):
+        self.download()
+        self.put("media/images/b.jpg", b"c" * 2000)
+
+        result = self.download()
+        self.assertEqual(self.downloaded_keys(result), ["media/images/b.jpg"])
+        self.assertEqual(self.read(self.path("media", "images", "b.jpg")), b"c" * 2000)
+
+    def test_files_without_manifest_are_compared_by_md5(self):
+        self.download()
+        os.remove(self.path("media", MANIFEST_NAME))
+
+        # The multipart ETag cannot be checked without the manifest
+        result = self.download()
+        self.assertEqual(self.downloaded_keys(result), ["media/large.bin"])
+
+
+class ArchiveTests(S3ToolTestCase):
+    """
+    Buckets are archived in listing order, fully or since an earlier backup.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.put("a.txt", b"a" * 100)
+        self.put("docs/b.pdf", b"b" * 3000)
+        self.put("docs/c.log", b"log")
+        self.put("large.bin", os.urandom(PART_SIZE + 1024), multipart=True)
+
+    def archive(self, name, archive_format='tar.gz', **kwargs):
+        return archive_s3_bucket(
+            BUCKET, self.path(name), archive_format=archive_format, region_name=REGION,
+            exclude_patterns=["*.log"], prefetch_size=4096, **kwargs
+        )
+
+    def archived_names(self, name):
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(self.path(name)) as archive:
+                return {info.filename: archive.read(info) for info in archive.infolist()}
+        with tarfile.open(self.path(name)) as archive:
+            return {member.name: archive.extractfile(member).read() for member in archive}
+
+    def test_full_backup(self):
+        for archive_format in ["tar.gz", "zip"]:
+            with self.subTest(archive_format=archive_format):
+                name = f"full.{archive_format}"
+                result = self.archive(name, archive_format)
+
+                self.assertTrue(result["success"], result.get("error"))
+                self.assertEqual(result["skipped_files"], ["docs/c.log"])
+                entries = self.archived_names(name)
+                self.assertEqual(list(entries), ["a.txt", "docs/b.pdf", "large.bin"])
+                self.assertEqual(entries["docs/b.pdf"], b"b" * 3000)
+                self.assertEqual(len(entries["large.bin"]), PART_SIZE + 1024)
+
+    def test_incremental_backup(self):
+        base = self.archive("base.tar.gz")
+        self.put("docs/b.pdf", b"B" * 3000)
+        self.put("new.txt", b"new")
+        self.s3.delete_object(Bucket=BUCKET, Key="a.txt")
+
+        result = self.archive("incremental.tar.gz", base_manifest_path=base["manifest_path"])
+
+        self.assertEqual(self.archived_names("incremental.tar.gz"), {"docs/b.pdf": b"B" * 3000, "new.txt": b"new"})
+        self.assertEqual(result["unchanged_files"], ["large.bin"])
+        self.assertEqual(result["deleted_files"], ["a.txt"])
+        with open(result["manifest_path"]) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest["deleted"], ["a.txt"])
+        self.assertEqual(manifest["archived"], ["docs/b.pdf", "new.txt"])
+        # The manifest lists every object, so it can be the base of the next backup
+        self.assertEqual(sorted(manifest["objects"]), ["docs/b.pdf", "large.bin", "new.txt"])
+
+
+class MirrorTests(S3ToolTestCase):
+    """
+    Mirrors copy the objects whose ETag differs, server-side, and delete extras.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.s3.create_bucket(Bucket=MIRROR_BUCKET)
+        self.put("media/a.txt", b"a" * 100)
+        self.put("media/b.log", b"log")
+        self.put("media/large.bin", os.urandom(PART_SIZE + 1024), multipart=True)
+
+    def mirror(self, **kwargs):
+        return mirror_s3_bucket(
+            BUCKET, MIRROR_BUCKET, region_name=REGION, prefix="media/", exclude_patterns=["*.log"], **kwargs
+        )
+
+    def copied_keys(self, result):
+        return sorted(item["destination_key"] for item in result["copied_files"])
+
+    def test_second_run_copies_nothing(self):
+        result = self.mirror()
+        self.assertEqual(self.copied_keys(result), ["media/a.txt", "media/large.bin"])
+        self.assertEqual(result["skipped_files"], ["media/b.log"])
+        # The copy of the multipart object cannot keep its ETag, so records it
+        source = self.s3.head_object(Bucket=BUCKET, Key="media/large.bin")
+        copy = self.s3.head_object(Bucket=MIRROR_BUCKET, Key="media/large.bin")
+        self.assertEqual(copy["Metadata"][SOURCE_ETAG_METADATA], source["ETag"])
+
+        result = self.mirror()
+        self.assertEqual(result["copied_files"], [])
+        self.assertEqual(sorted(result["unchanged_files"]), ["media/a.txt", "media/large.bin"])
+
+    def test_changed_object_is_copied_again(self):
+        self.mirror()
+        self.put("media/a.txt", b"b" * 100)
+
+        result = self.mirror()
+        self.assertEqual(self.copied_keys(result), ["media/a.txt"])
+        body = self.s3.get_object(Bucket=MIRROR_BUCKET, Key="media/a.txt")["Body"].read()
+        self.assertEqual(body, b"b" * 100)
+
+    def test_delete_keeps_objects_the_patterns_exclude(self):
+        self.put("media/extra.txt", b"extra", bucket=MIRROR_BUCKET)
+        self.put("media/kept.log", b"log", bucket=MIRROR_BUCKET)
+
+        result = self.mirror(delete=True)
+        self.assertEqual(result["deleted_files"], ["media/extra.txt"])
+        self.assertEqual(self.keys(MIRROR_BUCKET), ["media/a.txt", "media/kept.log", "media/large.bin"])
+
+    def test_dry_run_writes_nothing(self):
+        self.put("media/extra.txt", b"extra", bucket=MIRROR_BUCKET)
+
+        result = self.mirror(delete=True, dry_run=True)
+        self.assertEqual(self.copied_keys(result), ["media/a.txt", "media/large.bin"])
+        self.assertEqual(result["deleted_files"], ["media/extra.txt"])
+        self.assertEqual(self.keys(MIRROR_BUCKET), ["media/extra.txt"])
+
+
+class UploadTests(S3ToolTestCase):
+    """
+    Uploads skip files whose ETag S3 already has, and delete extra objects.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.files = {
+            "a.txt": b"a" * 100,
+            "css/output.3f2a9c1b7d4e.css": b"body {}",
+            "large.bin": os.urandom(2 * PART_SIZE + 1024),
+            "debug.log": b"log",
+        }
+        for relative_path, content in self.files.items():
+            os.makedirs(os.path.dirname(self.path("static", relative_path)), exist_ok=True)
+            with open(self.path("static", relative_path), "wb") as f:
+                f.write(content)
+
+    def upload(self, **kwargs):
+        return upload_s3_bucket(
+            BUCKET, self.path("static"), region_name=REGION, prefix="static/", exclude_patterns=["*.log"],
+            multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE, **kwargs
+        )
+
+    def uploaded_keys(self, result):
+        return sorted(item["s3_key"] for item in result["uploaded_files"])
+
+    def test_second_run_uploads_nothing(self):
+        uploaded = ["static/a.txt", "static/css/output.3f2a9c1b7d4e.css", "static/large.bin"]
+        result = self.upload()
+        self.assertEqual(self.uploaded_keys(result), uploaded)
+        self.assertEqual(result["skipped_files"], ["static/debug.log"])
+        # The ETag of large.bin is that of a three part upload
+        etag = self.s3.head_object(Bucket=BUCKET, Key="static/large.bin")["ETag"]
+        self.assertTrue(etag.endswith('-3"'), etag)
+
+        result = self.upload()
+        self.assertEqual(result["uploaded_files"], [])
+        self.assertEqual(sorted(result["unchanged_files"]), uploaded)
+
+    def test_changed_file_is_uploaded_again(self):
+        self.upload()
+        with open(self.path("static", "a.txt"), "wb") as f:
+            f.write(b"b" * 100)
+
+        result = self.upload()
+        self.assertEqual(self.uploaded_keys(result), ["static/a.txt"])
+
+    def test_hashed_names_are_cached_for_good(self):
+        self.upload(cache_control="max-age=60")
+
+        head = self.s3.head_object(Bucket=BUCKET, Key="static/css/output.3f2a9c1b7d4e.css")
+        self.assertEqual(head["CacheControl"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(head["ContentType"], "text/css")
+        head = self.s3.head_object(Bucket=BUCKET, Key="static/a.txt")
+        self.assertEqual(head["CacheControl"], "max-age=60")
+
+    def test_compressed_files_get_their_content_headers(self):
+        os.makedirs(self.path("static", "js"))
+        for relative_path in ["css/app.css.gz", "js/app.js.br", "backup.tar.gz"]:
+            with open(self.path("static", relative_path), "wb") as f:
+                f.write(b"compressed")
+        self.upload()
+
+        def content_headers(key):
+            head = self.s3.head_object(Bucket=BUCKET, Key=key)
+            return head["ContentType"], head.get("ContentEncoding")
+
+        # Browsers decompress precompressed assets, but not downloads
+        self.assertEqual(content_headers("static/css/app.css.gz"), ("text/css", "gzip"))
+        self.assertEqual(content_headers("static/js/app.js.br"), ("text/javascript", "br"))
+        self.assertEqual(content_headers("static/backup.tar.gz"), ("application/gzip", None))
+
+    def test_delete_keeps_objects_the_patterns_exclude(self):
+        self.put("static/extra.txt", b"extra")
+        self.put("static/kept.log", b"log")
+        self.put("media/photo.jpg", b"photo")
+
+        result = self.upload(delete=True)
+        self.assertEqual(result["deleted_files"], ["static/extra.txt"])
+        self.assertEqual(self.keys(), [
+            "media/photo.jpg",
+            "static/a.txt",
+            "static/css/output.3f2a9c1b7d4e.css",
+            "static/kept.log",
+            "static/large.bin",
+        ])
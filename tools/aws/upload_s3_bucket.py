@@ -0,0 +1,345 @@
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError, NoCredentialsError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decouple import Config, RepositoryEnv
+from s3transfer.utils import ChunksizeAdjuster
+import hashlib
+import mimetypes
+import os
+import re
+
+from tools.aws.utils import create_s3_client, format_size, is_selected
+
+# Parts of one multipart upload run in parallel with this many threads
+PART_CONCURRENCY = 4
+# Names with a content hash, such as css/output.3f2a9c1b7d4e.css, never change
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Types of compressed files as downloaded, for encodings mimetypes guesses
+COMPRESSED_TYPES = {
+    'br': 'application/x-brotli',
+    'bzip2': 'application/x-bzip2',
+    'compress': 'application/x-compress',
+    'gzip': 'application/gzip',
+    'xz': 'application/x-xz',
+}
+# Encodings browsers decompress, for precompressed web assets such as app.css.gz
+CONTENT_ENCODINGS = {'br', 'gzip'}
+WEB_ASSET_TYPES = {
+    'application/javascript', 'application/json', 'application/manifest+json',
+    'application/wasm', 'application/xml', 'image/svg+xml',
+}
+
+
+def upload_s3_bucket(
+        bucket_name,
+        local_dir,
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        region_name='us-east-2',
+        prefix='',
+        exclude_patterns=None,
+        include_patterns=None,
+        cache_control='max-age=86400',
+        delete=False,
+        max_workers=16,
+        multipart_threshold=16 * 1024 * 1024,
+        multipart_chunksize=8 * 1024 * 1024,
+        endpoint_url=None
+):
+    """
+    Upload a local directory to an S3 bucket, skipping unchanged files.
+
+    The counterpart of download_s3_bucket: files are uploaded under
+    prefix + their path relative to local_dir, and include/exclude patterns
+    are matched against that key. Files are uploaded concurrently by a pool
+    of max_workers threads sharing one client, and files larger than
+    multipart_threshold are sent as parallel multipart uploads.
+
+    The bucket is listed once, and a file is skipped when its size and the
+    ETag S3 would compute for it (MD5, or the MD5 of part MD5s for multipart
+    uploads of multipart_chunksize parts) match the object. This does not
+    hold for buckets encrypted with SSE-KMS, whose ETags are not checksums.
+
+    Content types are guessed from file names. Precompressed web assets, such
+    as app.css.gz, get the type of the asset and a Content-Encoding; other
+    compressed files, such as .tar.gz archives, the type of the compression.
+    Files with a content hash in their name get a one-year immutable
+    Cache-Control, others cache_control.
+
+    Run from the project root with: python -m tools.aws.upload_s3_bucket
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        local_dir (str): Local directory to upload files from
+        aws_access_key_id (str, optional): AWS access key (uses default credentials if not provided)
+        aws_secret_access_key (str, optional): AWS secret key
+        region_name (str): AWS region name
+        prefix (str, optional): Upload files under this prefix (folder path)
+        exclude_patterns (list, optional): List of patterns to exclude (e.g., ['*.log', 'temp/*'])
+        include_patterns (list, optional): List of patterns to include (e.g., ['*.jpg', '*.png'])
+        cache_control (str, optional): Cache-Control of files without a content hash
+        delete (bool): Delete objects under prefix that have no local file
+        max_workers (int): Number of files uploaded at the same time
+        multipart_threshold (int): Size in bytes from which multipart uploads are used
+        multipart_chunksize (int): Size in bytes of each part
+        endpoint_url (str, optional): Endpoint of an S3-compatible service, such as a local stand-in
+
+    Returns:
+        dict: Summary of upload operation
+
+    Example:
+        result = upload_s3_bucket(
+            bucket_name='my-wagtail-media',
+            local_dir='./media',
+            prefix='media/',
+            exclude_patterns=['*.log', 'cache/*']
+        )
+    """
+
+    print(f"========================================")
+    print(f"S3 Bucket Upload")
+    print(f"========================================")
+    print(f"Bucket: {bucket_name}")
+    print(f"Local directory: {local_dir}")
+    print(f"Prefix: {prefix if prefix else '(root)'}")
+    print(f"========================================\n")
+
+    if not os.path.isdir(local_dir):
+        print(f"✗ Local directory not found: {local_dir}")
+        return {
+            'success': False,
+            'error': f"Local directory not found: {local_dir}"
+        }
+
+    try:
+        s3_client = create_s3_client(
+            aws_access_key_id,
+            aws_secret_access_key,
+            region_name,
+            endpoint_url=endpoint_url,
+            max_pool_connections=max_workers * PART_CONCURRENCY
+        )
+        print("✓ Connected to S3")
+    except NoCredentialsError:
+        print("✗ AWS credentials not found!")
+        return {
+            'success': False,
+            'error': 'No AWS credentials found. Set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY environment variables or pass them as parameters.'
+        }
+    except Exception as e:
+        print(f"✗ Error connecting to S3: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=PART_CONCURRENCY
+    )
+
+    uploaded_files = []
+    unchanged_files = []
+    skipped_files = []
+    deleted_files = []
+    failed_files = []
+    total_size = 0
+
+    def upload(s3_key, local_file_path, file_size, remote):
+        """Upload a file unless the object matches it. Returns True if uploaded."""
+        if remote is not None and remote['Size'] == file_size:
+            etag = _expected_etag(local_file_path, file_size, multipart_threshold, multipart_chunksize)
+            if etag == remote['ETag'].strip('"'):
+                return False
+
+        extra_args = _content_headers(local_file_path)
+        if HASHED_NAME_RE.search(s3_key):
+            extra_args['CacheControl'] = IMMUTABLE_CACHE_CONTROL
+        elif cache_control:
+            extra_args['CacheControl'] = cache_control
+
+        s3_client.upload_file(
+            local_file_path, bucket_name, s3_key, ExtraArgs=extra_args, Config=transfer_config
+        )
+        return True
+
+    try:
+        print(f"Listing objects in bucket '{bucket_name}'...")
+        remote_objects = {}
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                remote_objects[obj['Key']] = obj
+        print(f"Found {len(remote_objects)} objects\n")
+
+        local_files = []
+        for root, dirs, files in os.walk(local_dir):
+            dirs.sort()
+            for file_name in sorted(files):
+                local_file_path = os.path.join(root, file_name)
+                relative_path = os.path.relpath(local_file_path, local_dir).replace(os.sep, '/')
+                s3_key = prefix + relative_path
+
+                # Check include and exclude patterns
+                if not is_selected(s3_key, include_patterns, exclude_patterns):
+                    skipped_files.append(s3_key)
+                    continue
+
+                local_files.append(
+                    (s3_key, local_file_path, os.path.getsize(local_file_path), remote_objects.get(s3_key))
+                )
+
+        print(f"Checking and uploading {len(local_files)} files with {max_workers} workers...\n")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(upload, *item): item for item in local_files}
+            for future in as_completed(futures):
+                s3_key, local_file_path, file_size, remote = futures[future]
+                try:
+                    if not future.result():
+                        unchanged_files.append(s3_key)
+                        continue
+                    uploaded_files.append({
+                        's3_key': s3_key,
+                        'local_path': local_file_path,
+                        'size': file_size
+                    })
+                    total_size += file_size
+                    print(f"↑ [{len(uploaded_files)}] {s3_key} ({format_size(file_size)})")
+                except ClientError as e:
+                    error_code = e.response['Error']['Code']
+                    print(f"✗ {s3_key}: {error_code}")
+                    failed_files.append({
+                        's3_key': s3_key,
+                        'error': str(e)
+                    })
+                except Exception as e:
+                    print(f"✗ {s3_key}: {e}")
+                    failed_files.append({
+                        's3_key': s3_key,
+                        'error': str(e)
+                    })
+
+        if delete:
+            local_keys = {item[0] for item in local_files}
+            # Only delete objects the patterns select, so excluded ones are kept
+            extra_keys = sorted(
+                s3_key for s3_key in remote_objects
+                if s3_key not in local_keys and is_selected(s3_key, include_patterns, exclude_patterns)
+            )
+            for start in range(0, len(extra_keys), 1000):
+                batch = extra_keys[start:start + 1000]
+                response = s3_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={'Objects': [{'Key': s3_key} for s3_key in batch], 'Quiet': True}
+                )
+                errors = {error['Key']: error for error in response.get('Errors', [])}
+                for s3_key in batch:
+                    if s3_key in errors:
+                        print(f"✗ Not deleted: {s3_key} ({errors[s3_key]['Code']})")
+                        failed_files.append({
+                            's3_key': s3_key,
+                            'error': errors[s3_key]['Message']
+                        })
+                    else:
+                        print(f"- Deleted: {s3_key}")
+                        deleted_files.append(s3_key)
+
+        # Summary
+        print(f"\n{'=' * 50}")
+        print(f"✓ Upload Complete!")
+        print(f"{'=' * 50}")
+        print(f"Uploaded: {len(uploaded_files)} files ({format_size(total_size)})")
+        print(f"Unchanged: {len(unchanged_files)} files")
+        print(f"Deleted: {len(deleted_files)} files")
+        print(f"Skipped: {len(skipped_files)} files")
+        print(f"Failed: {len(failed_files)} files")
+        print(f"{'=' * 50}\n")
+
+        return {
+            'success': True,
+            'uploaded_files': uploaded_files,
+            'unchanged_files': unchanged_files,
+            'deleted_files': deleted_files,
+            'skipped_files': skipped_files,
+            'failed_files': failed_files,
+            'total_files': len(uploaded_files),
+            'total_size': total_size
+        }
+
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        print(f"\n✗ S3 Error: {error_code}")
+        return {
+            'success': False,
+            'error': f"S3 Error: {error_code}",
+            'uploaded_files': uploaded_files,
+            'failed_files': failed_files
+        }
+    except Exception as e:
+        print(f"\n✗ Error: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'uploaded_files': uploaded_files,
+            'failed_files': failed_files
+        }
+
+
+def _content_headers(local_file_path):
+    """
+    The Content-Type and Content-Encoding of a file: precompressed web assets
+    are served with the encoding so browsers decompress them, other
+    compressed files, such as .tar.gz archives, as the compressed file.
+    """
+    content_type, encoding = mimetypes.guess_type(local_file_path)
+    if encoding is None:
+        return {'ContentType': content_type} if content_type else {}
+    is_web_asset = content_type is not None and (
+        content_type.startswith('text/') or content_type in WEB_ASSET_TYPES
+    )
+    if is_web_asset and encoding in CONTENT_ENCODINGS:
+        return {'ContentType': content_type, 'ContentEncoding': encoding}
+    return {'ContentType': COMPRESSED_TYPES.get(encoding, 'application/octet-stream')}
+
+
+def _expected_etag(local_file_path, file_size, multipart_threshold, multipart_chunksize):
+    """The ETag S3 gives the file once uploaded with these transfer settings"""
+    if file_size < multipart_threshold:
+        md5 = hashlib.md5(usedforsecurity=False)
+        with open(local_file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(chunk)
+        return md5.hexdigest()
+
+    # s3transfer grows the part size when there would be too many parts
+    chunksize = ChunksizeAdjuster().adjust_chunksize(multipart_chunksize, file_size)
+    part_digests = []
+    with open(local_file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunksize), b''):
+            part_digests.append(hashlib.md5(chunk, usedforsecurity=False).digest())
+    combined = hashlib.md5(b''.join(part_digests), usedforsecurity=False).hexdigest()
+    return f"{combined}-{len(part_digests)}"
+
+
+# Example usage
+if __name__ == "__main__":
+    config = Config(RepositoryEnv(".env.dev"))
+
+    result = upload_s3_bucket(
+        bucket_name=config('AWS_MEDIA_STORAGE_BUCKET_NAME'),
+        local_dir='./media',
+        aws_access_key_id=config('S3_ACCESS_KEY'),
+        aws_secret_access_key=config('S3_SECRET_KEY'),
+        region_name=config('AWS_S3_REGION_NAME'),
+        prefix='media/',
+        endpoint_url=config('AWS_S3_ENDPOINT_URL', default=None),
+    )
+
+    if result['success']:
+        print(f"\n✓ Successfully uploaded {result['total_files']} files")
+        print(f"  Total size: {format_size(result['total_size'])}")
+    else:
+        print(f"\n✗ Upload failed: {result['error']}")
@@ -0,0 +1,60 @@
+import boto3
+import fnmatch
+from botocore.config import Config as BotoConfig
+
+
+def create_s3_client(
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        region_name='us-east-2',
+        endpoint_url=None,
+        max_pool_connections=10
+):
+    """
+    Create an S3 client that can be shared by threads.
+
+    Args:
+        aws_access_key_id (str, optional): AWS access key (uses default credentials if not provided)
+        aws_secret_access_key (str, optional): AWS secret key
+        region_name (str): AWS region name
+        endpoint_url (str, optional): Endpoint of an S3-compatible service
+        max_pool_connections (int): Size of the connection pool, at least the number of threads
+
+    Returns:
+        botocore.client.S3: The client
+    """
+    config = BotoConfig(max_pool_connections=max_pool_connections)
+    if aws_access_key_id and aws_secret_access_key:
+        return boto3.client(
+            's3',
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            region_name=region_name,
+            endpoint_url=endpoint_url,
+            config=config
+        )
+    # Use default credentials (from ~/.aws/credentials or environment variables)
+    return boto3.client('s3', region_name=region_name, endpoint_url=endpoint_url, config=config)
+
+
+def is_selected(path, include_patterns=None, exclude_patterns=None):
+    """Check a path against glob-style include and exclude patterns"""
+    if exclude_patterns and any(matches_pattern(path, pattern) for pattern in exclude_patterns):
+        return False
+    if include_patterns and not any(matches_pattern(path, pattern) for pattern in include_patterns):
+        return False
+    return True
+
+
+def matches_pattern(path, pattern):
+    """Check if path matches a glob-style pattern"""
+    return fnmatch.fnmatch(path, pattern)
+
+
+def format_size(bytes):
+    """Format bytes to human-readable size"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if bytes < 1024.0:
+            return f"{bytes:.2f} {unit}"
+        bytes /= 1024.0
+    return f"{bytes:.2f} PB"
@@ -0,0 +1,147 @@
+import atexit
+import os
+import threading
+
+import paramiko
+
+# Seconds between keepalive packets on pooled connections
+KEEPALIVE_INTERVAL = 30
+
+
+def load_private_key(key_file, passphrase=None):
+    """
+    Loads a private key of any type paramiko supports (Ed25519, ECDSA, RSA), in
+    OpenSSH or PEM format. Parsed keys are cached until the file changes.
+
+    Args:
+        key_file (str): Path to the private key file
+        passphrase (str, optional): Passphrase of an encrypted key
+
+    Returns:
+        paramiko.PKey: The key
+    """
+    path = os.path.abspath(os.path.expanduser(key_file))
+    cache_key = (path, os.stat(path).st_mtime_ns, passphrase)
+    with _key_lock:
+        key = _keys.get(cache_key)
+    if key is None:
+        key = paramiko.PKey.from_path(path, passphrase.encode() if isinstance(passphrase, str) else passphrase)
+        with _key_lock:
+            _keys[cache_key] = key
+    return key
+
+
+_keys = {}
+_key_lock = threading.Lock()
+
+
+class SSHConnectionPool:
+    """
+    Keeps one authenticated SSH connection per host, port and user, so chained tool
+    calls share a single handshake. Connections send keepalives, are reconnected
+    when they have dropped, and are closed when the process exits.
+    """
+
+    def __init__(self, keepalive_interval=KEEPALIVE_INTERVAL):
+        self.keepalive_interval = keepalive_interval
+        self._clients = {}
+        self._sftp_clients = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get_client(self, host, username, key_file=None, password=None, port=22, timeout=30, passphrase=None):
+        """
+        Returns a connected paramiko.SSHClient, reusing an open connection to the
+        same host, port and user.
+
+        Args:
+            host (str): IP address or hostname of the remote server
+            username (str): SSH username
+            key_file (str, optional): Path to SSH private key file
+            password (str, optional): SSH password
+            port (int, optional): SSH port. Defaults to 22
+            timeout (int, optional): Connection timeout. Defaults to 30
+            passphrase (str, optional): Passphrase of an encrypted key file
+        """
+        if not key_file and not password:
+            raise ValueError("Either key_file or password must be provided")
+
+        pool_key = (host, port, username)
+        # Connecting holds only the lock of this pool key, so a slow host never
+        # blocks calls for other hosts
+        with self._lock:
+            key_lock = self._key_locks.setdefault(pool_key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                client = self._clients.get(pool_key)
+                if client is not None and _is_active(client):
+                    return client
+                if client is not None:
+                    self._discard(pool_key)
+
+            connect_params = {
+                'hostname': host,
+                'port': port,
+                'username': username,
+                'timeout': timeout
+            }
+            if key_file:
+                connect_params['pkey'] = load_private_key(key_file, passphrase)
+            else:
+                connect_params['password'] = password
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            print(f"Connecting to {host}...")
+            client.connect(**connect_params)
+            client.get_transport().set_keepalive(self.keepalive_interval)
+            print("✓ Connected successfully!")
+            with self._lock:
+                self._clients[pool_key] = client
+            return client
+
+    def get_sftp(self, client):
+        """Returns an SFTP channel on client's connection, reused across calls."""
+        transport = client.get_transport()
+        with self._lock:
+            sftp_client = self._sftp_clients.get(transport)
+            if sftp_client is not None and not sftp_client.get_channel().closed:
+                return sftp_client
+
+        # Opening the channel is a round trip, made without holding the lock
+        sftp_client = paramiko.SFTPClient.from_transport(transport)
+        with self._lock:
+            current = self._sftp_clients.get(transport)
+            if current is not None and not current.get_channel().closed:
+                # Another thread opened one first
+                sftp_client.close()
+                return current
+            self._sftp_clients[transport] = sftp_client
+            return sftp_client
+
+    def close_all(self):
+        """Closes every pooled connection."""
+        with self._lock:
+            for pool_key in list(self._clients):
+                self._discard(pool_key)
+
+    def _discard(self, pool_key):
+        client = self._clients.pop(pool_key)
+        sftp_client = self._sftp_clients.pop(client.get_transport(), None)
+        if sftp_client is not None:
+            sftp_client.close()
+        client.close()
+
+
+def _is_active(client):
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+
+# Shared by the tools in this package
+pool = SSHConnectionPool()
+get_client = pool.get_client
+get_sftp = pool.get_sftp
+close_connections = pool.close_all
+
+atexit.register(close_connections)
@@ -0,0 +1,107 @@
+import os
+import shlex
+
+import paramiko
+
+from tools.ssh.tar_stream import _Drain, file_sha256, remote_sha256
+
+
+def remote_listing(ssh_client, remote_folder):
+    """
+    Returns {relative_path: (size, mtime)} for every file under remote_folder, with
+    one remote command. A missing folder has no files.
+    """
+    quoted = shlex.quote(remote_folder)
+    stdin, stdout, stderr = ssh_client.exec_command(
+        f"if [ -d {quoted} ]; then cd {quoted} && find . -type f -printf '%P\\0%s\\0%T@\\0'; fi"
+    )
+    stdin.channel.shutdown_write()
+    # Read both outputs at once, so find reporting unreadable folders on
+    # stderr can never stall on a full channel window
+    output, errors = _Drain(stdout), _Drain(stderr)
+    exit_status = stdout.channel.recv_exit_status()
+    output.join()
+    errors.join()
+    if exit_status != 0:
+        raise paramiko.SSHException(f"Failed to list remote folder {remote_folder}: {errors.text()}")
+
+    fields = output.data().decode(errors='surrogateescape').split("\0")
+    listing = {}
+    for start in range(0, len(fields) - 2, 3):
+        relative_path, size, mtime = fields[start:start + 3]
+        listing[relative_path] = (int(size), int(float(mtime)))
+    return listing
+
+
+def local_listing(local_folder):
+    """Returns {relative_path: (size, mtime)} for every file under local_folder."""
+    listing = {}
+    for root, dirs, files in os.walk(local_folder):
+        for file_name in files:
+            local_path = os.path.join(root, file_name)
+            stat = os.stat(local_path)
+            relative_path = os.path.relpath(local_path, local_folder).replace("\\", "/")
+            listing[relative_path] = (stat.st_size, int(stat.st_mtime))
+    return listing
+
+
+def changed_paths(source, target, source_checksums=None, target_checksums=None):
+    """
+    Returns the paths of source files that are missing from target or differ in size,
+    or, without checksum functions, in modification time. With checksum functions,
+    files of the same size are compared by checksum instead of modification time.
+
+    The checksum functions take a list of relative paths and return a dict of their
+    checksums, so each side can compute them in one batch.
+    """
+    changed = []
+    same_size = []
+    for relative_path, (size, mtime) in sorted(source.items()):
+        if relative_path not in target or target[relative_path][0] != size:
+            changed.append(relative_path)
+        elif source_checksums is None:
+            if target[relative_path][1] != mtime:
+                changed.append(relative_path)
+        else:
+            same_size.append(relative_path)
+
+    if same_size:
+        source_sums = source_checksums(same_size)
+        target_sums = target_checksums(same_size)
+        changed.extend(path for path in same_size if source_sums.get(path) != target_sums.get(path))
+    return sorted(changed)
+
+
+def stale_paths(source, target):
+    """Returns the paths of target files that are not in source."""
+    return sorted(set(target) - set(source))
+
+
+def local_sha256(local_folder):
+    """Checksum function for changed_paths over files under local_folder"""
+    return lambda relative_paths: {
+        relative_path: file_sha256(os.path.join(local_folder, relative_path)) for relative_path in relative_paths
+    }
+
+
+def remote_sha256_of(ssh_client, remote_folder):
+    """Checksum function for changed_paths over files under remote_folder, in one command"""
+    return lambda relative_paths: remote_sha256(ssh_client, remote_folder, relative_paths)
+
+
+def remote_delete(ssh_client, remote_folder, relative_paths):
+    """Deletes files under remote_folder with one command."""
+    if not relative_paths:
+        return
+    # Paths are passed NUL-separated on stdin, so any number fits and none needs escaping
+    stdin, stdout, stderr = ssh_client.exec_command(
+        f"cd {shlex.quote(remote_folder)} && xargs -0 rm -f --"
+    )
+    output, errors = _Drain(stdout), _Drain(stderr)
+    stdin.write("\0".join(relative_paths))
+    stdin.channel.shutdown_write()
+    exit_status = stdout.channel.recv_exit_status()
+    output.join()
+    errors.join()
+    if exit_status != 0:
+        raise paramiko.SSHException(f"Failed to delete remote files: {errors.text()}")
@@ -3,6 +3,12 @@ import paramiko
 from pathlib import Path
 from decouple import Config, RepositoryEnv
 
+from tools.ssh.connection import get_client, get_sftp
+from tools.ssh.delta import (
+    changed_paths, local_listing, local_sha256, remote_listing, remote_sha256_of, stale_paths
+)
+from tools.ssh.tar_stream import tar_download
+
 
 def ssh_download_folder(
         host,
@@ -12,12 +18,29 @@ def ssh_download_folder(
         key_file=None,
         password=None,
         port=22,
-        timeout=30
+        timeout=30,
+        mode='sftp',
+        verify=True,
+        incremental=False,
+        checksum=False,
+        delete=False
 ):
     """
     Downloads all files and subdirectories from a target remote folder to a local folder
     using SFTP. Creates local directories as needed.
 
+    With mode='tar', files are instead received as one gzipped tar stream made by
+    tar on the server, which avoids per-file round trips for trees of many small
+    files, and are verified by SHA-256 checksums unless verify is False. The server
+    needs GNU tar and sha256sum.
+
+    With incremental=True, the remote files are listed with one find command and
+    only new files and files whose size or modification time differ are downloaded;
+    with checksum=True, files of the same size are compared by SHA-256 instead of
+    modification time. Downloaded files keep their remote modification time, so the
+    next run sees them as unchanged. With delete=True, local files that no longer
+    exist remotely are deleted. The server needs GNU find.
+
     Args:
         host (str): IP address or hostname of the remote server
         username (str): SSH username
@@ -27,51 +50,92 @@ def ssh_download_folder(
         password (str, optional): SSH password
         port (int, optional): SSH port. Defaults to 22
         timeout (int, optional): Connection timeout. Defaults to 30
+        mode (str, optional): 'sftp' or 'tar'. Defaults to 'sftp'
+        verify (bool, optional): Verify checksums in 'tar' mode. Defaults to True
+        incremental (bool, optional): Only download new and changed files. Defaults to False
+        checksum (bool, optional): Compare files by checksum in incremental mode. Defaults to False
+        delete (bool, optional): Delete local files missing remotely in incremental mode. Defaults to False
 
     Returns:
         dict: Result dictionary with status and list of downloaded files.
     """
-    ssh_client = None
-    sftp_client = None
     downloaded_files = []
+    failed_files = []
+    deleted_files = []
+    unchanged_count = 0
 
     try:
-        # 1. Initialize SSH client and connect
-        ssh_client = paramiko.SSHClient()
-        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-        connect_params = {
-            'hostname': host,
-            'port': port,
-            'username': username,
-            'timeout': timeout
-        }
+        if mode not in ('sftp', 'tar'):
+            raise ValueError(f"Unknown transfer mode: {mode}")
 
-        if key_file:
-            try:
-                key = paramiko.RSAKey.from_private_key_file(key_file)
-                connect_params['pkey'] = key
-            except paramiko.ssh_exception.SSHException:
-                # Try DSSKey if RSAKey fails
-                key = paramiko.DSSKey.from_private_key_file(key_file)
-                connect_params['pkey'] = key
-        elif password:
-            connect_params['password'] = password
-        else:
-            raise ValueError("Either key_file or password must be provided")
-
-        print(f"Connecting to {host}...")
-        ssh_client.connect(**connect_params)
-        print("✓ Connected successfully!")
-
-        # 2. Open SFTP connection
-        sftp_client = ssh_client.open_sftp()
+        # Connect, or reuse an open connection to the same server
+        ssh_client = get_client(host, username, key_file=key_file, password=password, port=port, timeout=timeout)
 
         # Ensure the local base folder exists
         local_folder_path = Path(local_folder)
         local_folder_path.mkdir(parents=True, exist_ok=True)
         print(f"Ensured local target folder exists: {local_folder_path.resolve()}")
 
+        # None downloads the whole folder
+        relative_paths = None
+        if incremental:
+            # Keep only new and changed files, compared with one remote listing
+            remote_files = remote_listing(ssh_client, remote_folder)
+            local_files = local_listing(local_folder)
+            if checksum:
+                relative_paths = changed_paths(
+                    remote_files,
+                    local_files,
+                    remote_sha256_of(ssh_client, remote_folder),
+                    local_sha256(local_folder)
+                )
+            else:
+                relative_paths = changed_paths(remote_files, local_files)
+            unchanged_count = len(remote_files) - len(relative_paths)
+            print(f"Incremental download: {len(relative_paths)} new or changed files, {unchanged_count} unchanged")
+
+            if delete:
+                deleted_files = stale_paths(remote_files, local_files)
+                for relative_path in deleted_files:
+                    (local_folder_path / relative_path).unlink(missing_ok=True)
+                print(f"Deleted {len(deleted_files)} stale local files")
+
+        result_args = (remote_folder, local_folder_path, unchanged_count, deleted_files)
+
+        if mode == 'tar':
+            # 2. Download files as one tar stream
+            if relative_paths != []:
+                print(f"Starting tar stream download from {remote_folder} to {local_folder}...")
+                results = tar_download(
+                    ssh_client, remote_folder, str(local_folder_path), relative_paths, verify=verify
+                )
+                for relative_path, status in results.items():
+                    if status == 'ok':
+                        downloaded_files.append(str(local_folder_path / relative_path))
+                    else:
+                        print(f"  ✗ {relative_path}: {status}")
+                        failed_files.append({'file': relative_path, 'status': status})
+            return _download_result(downloaded_files, failed_files, *result_args)
+
+        if relative_paths is not None:
+            # 2. Download the listed files, keeping their modification times
+            if relative_paths:
+                print(f"Starting download of {len(relative_paths)} files from {remote_folder} to {local_folder}...")
+                sftp_client = get_sftp(ssh_client)
+            for relative_path in relative_paths:
+                remote_file_path = f"{remote_folder.rstrip('/')}/{relative_path}"
+                local_file_path = local_folder_path / relative_path
+                local_file_path.parent.mkdir(parents=True, exist_ok=True)
+                print(f"  Downloading: {relative_path} -> {local_file_path.resolve()}")
+                sftp_client.get(remote_file_path, str(local_file_path))
+                mtime = remote_files[relative_path][1]
+                os.utime(local_file_path, (mtime, mtime))
+                downloaded_files.append(str(local_file_path))
+            return _download_result(downloaded_files, failed_files, *result_args)
+
+        # 2. Open SFTP connection
+        sftp_client = get_sftp(ssh_client)
+
         # 3. Walk through the remote folder structure
         print(f"Starting download from {remote_folder} to {local_folder}...")
 
@@ -107,15 +171,7 @@ def ssh_download_folder(
         # Start the recursive download
         remote_walk_and_download(remote_folder)
 
-        print(f"✓ Download complete. Total files downloaded: {len(downloaded_files)}")
-
-        return {
-            'success': True,
-            'downloaded_count': len(downloaded_files),
-            'downloaded_files': downloaded_files,
-            'remote_folder': remote_folder,
-            'local_folder': str(local_folder_path.resolve())
-        }
+        return _download_result(downloaded_files, failed_files, *result_args)
 
     except paramiko.AuthenticationException:
         print("✗ Authentication failed!")
@@ -141,13 +197,23 @@ def ssh_download_folder(
             'success': False,
             'error': str(e)
         }
-    finally:
-        # Clean up connections
-        if sftp_client:
-            sftp_client.close()
-        if ssh_client:
-            ssh_client.close()
-            print("Connection closed")
+
+def _download_result(downloaded_files, failed_files, remote_folder, local_folder_path, unchanged_count, deleted_files):
+    print(f"✓ Download complete. Total files downloaded: {len(downloaded_files)}")
+
+    result = {
+        'success': not failed_files,
+        'downloaded_count': len(downloaded_files),
+        'downloaded_files': downloaded_files,
+        'failed_files': failed_files,
+        'unchanged_count': unchanged_count,
+        'deleted_files': deleted_files,
+        'remote_folder': remote_folder,
+        'local_folder': str(local_folder_path.resolve())
+    }
+    if failed_files:
+        result['error'] = f"{len(failed_files)} files failed verification"
+    return result
 
 
 # ---
@@ -0,0 +1,218 @@
+import gzip
+import hashlib
+import os
+import shlex
+import tarfile
+import threading
+
+import paramiko
+
+# Files are read and written in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+
+
+def tar_upload(ssh_client, local_folder, remote_folder, relative_paths, compress_level=6, verify=True):
+    """
+    Uploads files from local_folder as one gzipped tar stream, unpacked on the fly
+    by tar on the remote server, over a single exec channel.
+
+    Args:
+        ssh_client (paramiko.SSHClient): Connected client
+        local_folder (str): Local folder the relative paths are in
+        remote_folder (str): Remote folder to unpack into, created if needed
+        relative_paths (list): Paths of the files to upload, relative to local_folder, with forward slashes
+        compress_level (int, optional): gzip level, 1 (fast) to 9 (small). Defaults to 6
+        verify (bool, optional): Compare SHA-256 checksums after the transfer. Defaults to True
+
+    Returns:
+        dict: Per-file status ('ok', 'missing' or 'mismatch') for every relative path.
+    """
+    quoted = shlex.quote(remote_folder)
+    stdin, stdout, stderr = ssh_client.exec_command(
+        f"mkdir -p -- {quoted} && tar -xzf - -C {quoted}"
+    )
+    # Read both outputs while sending, so a full channel window can never
+    # stall the remote side
+    output, errors = _Drain(stdout), _Drain(stderr)
+
+    local_checksums = {}
+    local_sizes = {}
+    gzip_stream = gzip.GzipFile(fileobj=stdin, mode='wb', compresslevel=compress_level, mtime=0)
+    with tarfile.open(fileobj=gzip_stream, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+        for relative_path in relative_paths:
+            local_path = os.path.join(local_folder, relative_path)
+            info = tar.gettarinfo(local_path, arcname=relative_path)
+            with open(local_path, 'rb') as f:
+                reader = _HashingReader(f)
+                tar.addfile(info, reader)
+            local_checksums[relative_path] = reader.sha256.hexdigest()
+            local_sizes[relative_path] = info.size
+    gzip_stream.close()
+    stdin.channel.shutdown_write()
+
+    exit_status = stdout.channel.recv_exit_status()
+    output.join()
+    errors.join()
+    if exit_status != 0:
+        raise paramiko.SSHException(f"Remote tar failed: {errors.text().strip()}")
+
+    # The unpacked files are checked by checksum, or at least by size, rather
+    # than by the names tar lists, which it escapes outside of ASCII
+    if verify:
+        return _check(relative_paths, local_checksums, remote_sha256(ssh_client, remote_folder, relative_paths))
+    return _check(relative_paths, local_sizes, remote_sizes(ssh_client, remote_folder, relative_paths))
+
+
+def tar_download(ssh_client, remote_folder, local_folder, relative_paths=None, compress_level=6, verify=True):
+    """
+    Downloads files from remote_folder as one gzipped tar stream made by tar on the
+    remote server, unpacked on the fly, over a single exec channel.
+
+    Args:
+        ssh_client (paramiko.SSHClient): Connected client
+        remote_folder (str): Remote folder the relative paths are in
+        local_folder (str): Local folder to unpack into, created if needed
+        relative_paths (list, optional): Paths of the files to download, relative to
+            remote_folder, with forward slashes. Defaults to the whole folder
+        compress_level (int, optional): gzip level, 1 (fast) to 9 (small). Defaults to 6
+        verify (bool, optional): Compare SHA-256 checksums after the transfer. Defaults to True
+
+    Returns:
+        dict: Per-file status ('ok', 'missing' or 'mismatch') for every downloaded path.
+    """
+    os.makedirs(local_folder, exist_ok=True)
+    quoted = shlex.quote(remote_folder)
+    command = f"tar --use-compress-program='gzip -{int(compress_level)}' -cf - -C {quoted}"
+    if relative_paths is None:
+        command += " ."
+    else:
+        # The file list is read NUL-separated from stdin
+        command += " --null -T -"
+    stdin, stdout, stderr = ssh_client.exec_command(command)
+    errors = _Drain(stderr)
+    if relative_paths is not None:
+        stdin.write("\0".join(relative_paths))
+    stdin.channel.shutdown_write()
+
+    local_checksums = {}
+    with tarfile.open(fileobj=stdout, mode='r|gz') as tar:
+        for member in tar:
+            if member.isdir():
+                continue
+            tar.extract(member, local_folder, filter='data')
+            if member.isfile():
+                relative_path = member.name.removeprefix('./')
+                local_checksums[relative_path] = file_sha256(os.path.join(local_folder, relative_path))
+
+    exit_status = stdout.channel.recv_exit_status()
+    errors.join()
+    if exit_status != 0:
+        raise paramiko.SSHException(f"Remote tar failed: {errors.text().strip()}")
+
+    expected = sorted(local_checksums) if relative_paths is None else relative_paths
+    results = {path: 'ok' if path in local_checksums else 'missing' for path in expected}
+    if verify:
+        remote_checksums = remote_sha256(ssh_client, remote_folder, expected)
+        _compare(results, local_checksums, remote_checksums)
+    return results
+
+
+def remote_sha256(ssh_client, remote_folder, relative_paths):
+    """Returns the SHA-256 of remote files by relative path, with one command."""
+    stdin, stdout, stderr = ssh_client.exec_command(
+        f"cd {shlex.quote(remote_folder)} && xargs -0 sha256sum -z --"
+    )
+    output, errors = _Drain(stdout), _Drain(stderr)
+    stdin.write("\0".join(relative_paths))
+    stdin.channel.shutdown_write()
+    stdout.channel.recv_exit_status()
+    output.join()
+    errors.join()
+
+    checksums = {}
+    # With -z, lines end with NUL and names are not escaped
+    for line in output.text().split("\0"):
+        if line:
+            checksum, relative_path = line.split("  ", 1)
+            checksums[relative_path] = checksum
+    return checksums
+
+
+def remote_sizes(ssh_client, remote_folder, relative_paths):
+    """Returns the size of remote files by relative path, with one command."""
+    stdin, stdout, stderr = ssh_client.exec_command(
+        f"cd {shlex.quote(remote_folder)} && xargs -0 stat --printf '%s %n\\0' --"
+    )
+    output, errors = _Drain(stdout), _Drain(stderr)
+    stdin.write("\0".join(relative_paths))
+    stdin.channel.shutdown_write()
+    stdout.channel.recv_exit_status()
+    output.join()
+    errors.join()
+
+    sizes = {}
+    for line in output.text().split("\0"):
+        if line:
+            size, relative_path = line.split(" ", 1)
+            sizes[relative_path] = int(size)
+    return sizes
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _check(relative_paths, local_values, remote_values):
+    """Per-file status of relative_paths, from their local and remote checksums or sizes."""
+    results = {}
+    for path in relative_paths:
+        if path not in remote_values:
+            results[path] = 'missing'
+        elif remote_values[path] != local_values.get(path):
+            results[path] = 'mismatch'
+        else:
+            results[path] = 'ok'
+    return results
+
+
+def _compare(results, local_checksums, remote_checksums):
+    for path, status in results.items():
+        if status == 'ok' and local_checksums.get(path) != remote_checksums.get(path):
+            results[path] = 'mismatch'
+
+
+class _HashingReader:
+    """File wrapper hashing what tarfile reads from it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        return data
+
+
+class _Drain(threading.Thread):
+    """Reads a channel output to the end in the background"""
+
+    def __init__(self, channel_file):
+        super().__init__(daemon=True)
+        self.channel_file = channel_file
+        self.chunks = []
+        self.start()
+
+    def run(self):
+        for chunk in iter(lambda: self.channel_file.read(CHUNK_SIZE), b''):
+            self.chunks.append(chunk)
+
+    def data(self):
+        return b''.join(self.chunks)
+
+    def text(self):
+        return self.data().decode(errors='replace')
@@ -0,0 +1,676 @@
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+import paramiko
+from django.test import SimpleTestCase
+
+from tools.ssh import connection
+from tools.ssh import delta, tar_stream, upload_and_run_bash_script
+from tools.ssh.download_files import ssh_download_folder
+from tools.ssh.upload_files import remote_mkdir_p, ssh_upload_folder
+
+USERNAME = "tester"
+PASSWORD = "secret"
+
+_host_key = None
+
+
+def setUpModule():
+    global _host_key
+    _host_key = paramiko.RSAKey.generate(2048)
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+
+class _SFTPServer(paramiko.SFTPServerInterface):
+    """Serves the local file system, paths being absolute local paths."""
+
+    def __init__(self, server_interface, *args, **kwargs):
+        super().__init__(server_interface, *args, **kwargs)
+        server_interface.server.sftp_sessions += 1
+
+    def _error(self, error):
+        return paramiko.SFTPServer.convert_errno(error.errno)
+
+    def list_folder(self, path):
+        try:
+            entries = []
+            for name in os.listdir(path):
+                attr = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+                attr.filename = name
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return self._error(e)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return self._error(e)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(path, flags, 0o644)
+        except OSError as e:
+            return self._error(e)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = _SFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            return self._error(e)
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        os.replace(oldpath, newpath)
+        return paramiko.SFTP_OK
+
+    rename = posix_rename
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(path)
+        except OSError as e:
+            return self._error(e)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        if attr.st_mtime is not None:
+            os.utime(path, (attr.st_atime, attr.st_mtime))
+        return paramiko.SFTP_OK
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, server):
+        self.server = server
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (USERNAME, PASSWORD):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        command = command.decode()
+        self.server.commands.append(command)
+        threading.Thread(target=_run_command, args=(channel, command), daemon=True).start()
+        return True
+
+
+def _run_command(channel, command):
+    """Runs an exec request with the local bash, piping the channel through it."""
+    process = subprocess.Popen(
+        ['bash', '-c', command], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+    def send_stdin():
+        for data in iter(lambda: channel.recv(32768), b''):
+            process.stdin.write(data)
+        process.stdin.close()
+
+    def send_stderr():
+        for data in iter(lambda: process.stderr.read1(32768), b''):
+            channel.sendall_stderr(data)
+
+    threading.Thread(target=send_stdin, daemon=True).start()
+    stderr_thread = threading.Thread(target=send_stderr, daemon=True)
+    stderr_thread.start()
+    for data in iter(lambda: process.stdout.read1(32768), b''):
+        channel.sendall(data)
+    stderr_thread.join()
+    channel.send_exit_status(process.wait())
+    channel.close()
+
+
+class StandInSSHServer:
+    """
+    In-process SSH server with password authentication, SFTP and exec requests,
+    running commands with the local bash. It records connections, commands and
+    SFTP sessions.
+    """
+
+    def __init__(self):
+        self.commands = []
+        self.sftp_sessions = 0
+        self.transports = []
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(10)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(_host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, _SFTPServer)
+            transport.start_server(server=_ServerInterface(self))
+            self.transports.append(transport)
+
+    def drop_connections(self):
+        for transport in self.transports:
+            transport.close()
+
+    def close(self):
+        self.sock.close()
+        self.drop_connections()
+
+
+class SSHToolTestCase(SimpleTestCase):
+    """Runs the ssh tools against a stand-in server, in temporary folders."""
+
+    def setUp(self):
+        # The tools report their progress on stdout
+        self.enterContext(redirect_stdout(StringIO()))
+        self.server = StandInSSHServer()
+        self.addCleanup(self.server.close)
+        self.addCleanup(connection.close_connections)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.login = {'host': '127.0.0.1', 'port': self.server.port, 'username': USERNAME, 'password': PASSWORD}
+
+    def path(self, *parts):
+        return os.path.join(self.tmp, *parts)
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def make_tree(self, folder):
+        """Writes a small tree of files, with names that need quoting."""
+        files = {
+            "index.html": b"<html></html>",
+            "sub dir/notes.txt": b"notes\n" * 100,
+            "sub dir/-dashed/data.bin": os.urandom(200000),
+            "empty.txt": b"",
+        }
+        for relative_path, content in files.items():
+            self.write(os.path.join(folder, *relative_path.split("/")), content)
+        return files
+
+    def tree(self, folder):
+        """Returns {relative_path: content} of every file under folder."""
+        files = {}
+        for root, dirs, names in os.walk(folder):
+            for name in names:
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, folder).replace(os.sep, "/")] = self.read(path)
+        return files
+
+
+class _InterruptingSFTP:
+    """SFTP client proxy recording where downloads start, and failing after fail_after bytes."""
+
+    def __init__(self, sftp_client, fail_after=None):
+        self.sftp_client = sftp_client
+        self.fail_after = fail_after
+        self.offsets = []
+
+    def __getattr__(self, name):
+        return getattr(self.sftp_client, name)
+
+    def open(self, path, mode='r'):
+        return _InterruptingFile(self, self.sftp_client.open(path, mode))
+
+
+class _InterruptingFile:
+    def __init__(self, proxy, remote_file):
+        self.proxy = proxy
+        self.remote_file = remote_file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.remote_file.close()
+
+    def seek(self, offset):
+        self.proxy.offsets.append(offset)
+        self.remote_file.seek(offset)
+
+    def prefetch(self, file_size):
+        self.remote_file.prefetch(file_size)
+
+    def read(self, size):
+        if self.proxy.fail_after is None:
+            return self.remote_file.read(size)
+        if self.proxy.fail_after <= 0:
+            raise EOFError("Connection lost")
+        data = self.remote_file.read(min(size, self.proxy.fail_after))
+        self.proxy.fail_after -= len(data)
+        return data
+
+
+class ScriptDownloadTests(SSHToolTestCase):
+    """
+    The output file of a script is downloaded again from where an interrupted download stopped.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.script = self.path("scripts", "make_output.sh")
+        self.write(self.script, b"#!/bin/bash\nhead -c 300000 /dev/urandom > \"$1\"\necho done\n")
+        self.remote_file = self.path("remote", "output.bin")
+        os.makedirs(os.path.dirname(self.remote_file))
+        self.local_file = self.path("local", "output.bin")
+
+    def run_script(self, sftp_proxies, **kwargs):
+        proxies = iter(sftp_proxies)
+        real_get_sftp = upload_and_run_bash_script.get_sftp
+
+        def get_sftp(client):
+            proxy = next(proxies)
+            proxy.sftp_client = real_get_sftp(client)
+            return proxy
+
+        with mock.patch.object(upload_and_run_bash_script, 'get_sftp', get_sftp):
+            return upload_and_run_bash_script.ssh_upload_script_execute_and_download(
+                local_script_path=self.script,
+                remote_file_path=self.remote_file,
+                local_download_path=self.local_file,
+                remote_script_dir=self.path("remote"),
+                script_args=self.remote_file,
+                on_stdout=lambda line: None,
+                **self.login,
+                **kwargs
+            )
+
+    def test_interrupted_download_is_resumed_in_the_same_call(self):
+        interrupted = _InterruptingSFTP(None, fail_after=65536)
+        resumed = _InterruptingSFTP(None)
+        result = self.run_script([interrupted, resumed])
+
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(interrupted.offsets, [0])
+        self.assertEqual(resumed.offsets, [65536])
+        self.assertEqual(self.read(self.local_file), self.read(self.remote_file))
+        self.assertFalse(os.path.exists(self.local_file + ".part"))
+
+    def test_download_is_resumed_without_running_the_script_again(self):
+        result = self.run_script([_InterruptingSFTP(None, fail_after=65536)], download_retries=0)
+        self.assertFalse(result['success'])
+        self.assertTrue(os.path.exists(self.local_file + ".part"))
+        output = self.read(self.remote_file)
+        commands = len(self.server.commands)
+
+        resumed = _InterruptingSFTP(None)
+        result = self.run_script([resumed], skip_execution=True)
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(len(self.server.commands), commands)
+        self.assertEqual(resumed.offsets, [65536])
+        self.assertEqual(self.read(self.local_file), output)
+
+
+class ConnectionPoolTests(SSHToolTestCase):
+    """
+    Connections and SFTP channels are reused until they drop or the pool is closed.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.pool = connection.SSHConnectionPool()
+        self.addCleanup(self.pool.close_all)
+
+    def get_client(self, **kwargs):
+        return self.pool.get_client(**{**self.login, **kwargs})
+
+    def test_connection_is_reused(self):
+        client = self.get_client()
+        self.assertIs(self.get_client(), client)
+        self.assertEqual(len(self.server.transports), 1)
+
+    def test_dropped_connection_is_replaced(self):
+        client = self.get_client()
+        self.server.drop_connections()
+        client.get_transport().join(5)
+        self.assertFalse(client.get_transport().is_active())
+
+        replacement = self.get_client()
+        self.assertIsNot(replacement, client)
+        self.assertTrue(replacement.get_transport().is_active())
+        self.assertEqual(len(self.server.transports), 2)
+
+    def test_sftp_channel_is_reused(self):
+        client = self.get_client()
+        sftp_client = self.pool.get_sftp(client)
+        self.assertIs(self.pool.get_sftp(client), sftp_client)
+
+        sftp_client.close()
+        self.assertIsNot(self.pool.get_sftp(client), sftp_client)
+
+    def test_close_all(self):
+        client = self.get_client()
+        sftp_client = self.pool.get_sftp(client)
+        self.pool.close_all()
+        self.assertIsNone(client.get_transport())
+        self.assertTrue(sftp_client.get_channel().closed)
+        self.assertIsNot(self.get_client(), client)
+
+    def test_slow_host_does_not_block_other_hosts(self):
+        # Accepts connections but never answers, like a host behind a dead link
+        silent = socket.socket()
+        silent.bind(('127.0.0.1', 0))
+        silent.listen(1)
+        errors = []
+
+        def connect_to_silent_host():
+            try:
+                self.get_client(port=silent.getsockname()[1], timeout=1)
+            except paramiko.SSHException as e:
+                errors.append(e)
+
+        # The failed handshake is logged by paramiko
+        null_handler = logging.NullHandler()
+        logging.getLogger('paramiko').addHandler(null_handler)
+        self.addCleanup(logging.getLogger('paramiko').removeHandler, null_handler)
+        connecting = threading.Thread(target=connect_to_silent_host, daemon=True)
+        connecting.start()
+        self.addCleanup(connecting.join, 5)
+        self.addCleanup(silent.close)
+        # Wait until it is stuck waiting for the SSH banner
+        silent.settimeout(5)
+        stuck_connection, _ = silent.accept()
+        self.addCleanup(stuck_connection.close)
+
+        finished = threading.Event()
+        threading.Thread(target=lambda: (self.get_client(), finished.set()), daemon=True).start()
+        self.assertTrue(finished.wait(5))
+        self.assertTrue(connecting.is_alive())
+
+
+class FolderTransferTests(SSHToolTestCase):
+    """
+    Folders are uploaded over concurrent SFTP channels and downloaded with SFTP.
+    """
+
+    def test_remote_folders_are_made_with_one_command(self):
+        client = connection.get_client(**self.login)
+        folders = [self.path("remote", "a b", "c"), self.path("remote", "-d"), self.path("remote", "e'f")]
+        remote_mkdir_p(client, folders)
+        self.assertEqual(len(self.server.commands), 1)
+        for folder in folders:
+            self.assertTrue(os.path.isdir(folder))
+
+    def test_upload(self):
+        files = self.make_tree(self.path("local"))
+        result = ssh_upload_folder(
+            local_folder=self.path("local"), remote_folder=self.path("remote"), max_channels=3, **self.login
+        )
+
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['uploaded_count'], len(files))
+        self.assertEqual(self.tree(self.path("remote")), files)
+        self.assertEqual(len([command for command in self.server.commands if "mkdir" in command]), 1)
+        self.assertEqual(self.server.sftp_sessions, 3)
+
+    def test_download(self):
+        files = self.make_tree(self.path("remote"))
+        result = ssh_download_folder(remote_folder=self.path("remote"), local_folder=self.path("local"), **self.login)
+
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(self.tree(self.path("local")), files)
+
+
+class TarStreamTests(SSHToolTestCase):
+    """
+    In tar mode, folders travel as one gzipped tar stream and are checked by SHA-256.
+    """
+
+    def test_upload(self):
+        files = self.make_tree(self.path("local"))
+        result = ssh_upload_folder(
+            local_folder=self.path("local"), remote_folder=self.path("remote"), mode='tar', **self.login
+        )
+
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['uploaded_count'], len(files))
+        self.assertEqual(self.tree(self.path("remote")), files)
+        self.assertEqual(self.server.sftp_sessions, 0)
+        self.assertEqual(len([command for command in self.server.commands if "tar " in command]), 1)
+
+    def test_download(self):
+        files = self.make_tree(self.path("remote"))
+        result = ssh_download_folder(
+            remote_folder=self.path("remote"), local_folder=self.path("local"), mode='tar', **self.login
+        )
+
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(self.tree(self.path("local")), files)
+        self.assertEqual(self.server.sftp_sessions, 0)
+
+    def test_checksum_mismatch_fails_the_transfer(self):
+        self.make_tree(self.path("local"))
+        real_remote_sha256 = tar_stream.remote_sha256
+
+        def corrupted_remote_sha256(*args):
+            checksums = real_remote_sha256(*args)
+            checksums["index.html"] = "0" * 64
+            return checksums
+
+        with mock.patch.object(tar_stream, 'remote_sha256', corrupted_remote_sha256):
+            result = ssh_upload_folder(
+                local_folder=self.path("local"), remote_folder=self.path("remote"), mode='tar', **self.login
+            )
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['failed_files'], [{'file': "index.html", 'status': 'mismatch'}])
+
+    def test_non_ascii_names(self):
+        # tar escapes such names when listing them in the C locale of many servers
+        self.enterContext(mock.patch.dict(os.environ, {"LC_ALL": "C"}))
+        files = {"café/menu ü.txt": b"menu", "tab\tname.txt": b"tab"}
+        for relative_path, content in files.items():
+            self.write(self.path("local", *relative_path.split("/")), content)
+
+        for verify in [True, False]:
+            with self.subTest(verify=verify):
+                result = ssh_upload_folder(
+                    local_folder=self.path("local"), remote_folder=self.path("remote"), mode='tar',
+                    verify=verify, **self.login
+                )
+                self.assertTrue(result['success'], result.get('error'))
+                self.assertEqual(result['uploaded_count'], 2)
+                self.assertEqual(self.tree(self.path("remote")), files)
+
+    def test_size_is_checked_without_verification(self):
+        self.make_tree(self.path("local"))
+        real_remote_sizes = tar_stream.remote_sizes
+
+        def truncated_remote_sizes(*args):
+            sizes = real_remote_sizes(*args)
+            sizes["index.html"] -= 1
+            del sizes["empty.txt"]
+            return sizes
+
+        with mock.patch.object(tar_stream, 'remote_sizes', truncated_remote_sizes):
+            result = ssh_upload_folder(
+                local_folder=self.path("local"), remote_folder=self.path("remote"), mode='tar', verify=False,
+                **self.login
+            )
+
+        self.assertEqual(sorted(result['failed_files'], key=lambda failed: failed['file']), [
+            {'file': "empty.txt", 'status': 'missing'},
+            {'file': "index.html", 'status': 'mismatch'},
+        ])
+
+    def test_verification_can_be_skipped(self):
+        self.make_tree(self.path("remote"))
+        ssh_download_folder(
+            remote_folder=self.path("remote"), local_folder=self.path("local"), mode='tar', verify=False, **self.login
+        )
+        self.assertFalse([command for command in self.server.commands if "sha256sum" in command])
+
+
+class DeltaTests(SimpleTestCase):
+    """
+    Files are compared by size and modification time, or by checksum.
+    """
+
+    source = {"same": (1, 100), "touched": (2, 100), "resized": (3, 100), "new": (4, 100)}
+    target = {"same": (1, 100), "touched": (2, 200), "resized": (5, 100), "stale": (6, 100)}
+
+    def test_changed_paths(self):
+        self.assertEqual(delta.changed_paths(self.source, self.target), ["new", "resized", "touched"])
+
+    def test_changed_paths_by_checksum(self):
+        checksummed = []
+
+        def checksums(values):
+            def get_checksums(relative_paths):
+                checksummed.append(sorted(relative_paths))
+                return {relative_path: values.get(relative_path, "x") for relative_path in relative_paths}
+            return get_checksums
+
+        changed = delta.changed_paths(
+            self.source, self.target, checksums({"touched": "a"}), checksums({"touched": "a", "same": "b"})
+        )
+        self.assertEqual(changed, ["new", "resized", "same"])
+        # Only files of the same size are checksummed, once per side
+        self.assertEqual(checksummed, [["same", "touched"], ["same", "touched"]])
+
+    def test_stale_paths(self):
+        self.assertEqual(delta.stale_paths(self.source, self.target), ["stale"])
+
+
+class IncrementalTransferTests(SSHToolTestCase):
+    """
+    Incremental transfers only send new and changed files, and can delete stale ones.
+    """
+
+    def upload(self, **kwargs):
+        return ssh_upload_folder(
+            local_folder=self.path("local"), remote_folder=self.path("remote"), incremental=True,
+            **self.login, **kwargs
+        )
+
+    def download(self, **kwargs):
+        return ssh_download_folder(
+            remote_folder=self.path("remote"), local_folder=self.path("local"), incremental=True,
+            **self.login, **kwargs
+        )
+
+    def reset(self):
+        shutil.rmtree(self.path("local"), ignore_errors=True)
+        shutil.rmtree(self.path("remote"), ignore_errors=True)
+
+    def rewrite_keeping_mtime(self, path, content):
+        stat = os.stat(path)
+        self.write(path, content)
+        os.utime(path, (stat.st_atime, stat.st_mtime))
+
+    def test_listing_with_much_stderr_output(self):
+        # find reporting more unreadable folders than the channel window holds
+        bin_folder = self.path("bin")
+        self.write(os.path.join(bin_folder, "find"), (
+            b'#!/bin/bash\n'
+            b'head -c 3000000 /dev/zero | tr "\\0" x >&2\n'
+            b'exec ' + shutil.which("find").encode() + b' "$@"\n'
+        ))
+        os.chmod(os.path.join(bin_folder, "find"), 0o755)
+        self.enterContext(mock.patch.dict(os.environ, {"PATH": f"{bin_folder}:{os.environ['PATH']}"}))
+        files = self.make_tree(self.path("remote"))
+
+        ssh_client = connection.get_client(**self.login)
+        listing = []
+        thread = threading.Thread(
+            target=lambda: listing.append(delta.remote_listing(ssh_client, self.path("remote"))), daemon=True
+        )
+        thread.start()
+        thread.join(timeout=30)
+        self.assertFalse(thread.is_alive(), "remote_listing stalled")
+        self.assertEqual(sorted(listing[0]), sorted(files))
+
+    def test_upload(self):
+        for mode in ('sftp', 'tar'):
+            with self.subTest(mode=mode):
+                self.reset()
+                files = self.make_tree(self.path("local"))
+                self.assertEqual(self.upload(mode=mode)['uploaded_count'], len(files))
+
+                result = self.upload(mode=mode)
+                self.assertEqual((result['uploaded_count'], result['unchanged_count']), (0, len(files)))
+
+                self.write(self.path("local", "index.html"), b"<html>changed</html>")
+                result = self.upload(mode=mode)
+                self.assertEqual(result['uploaded_files'], [self.path("remote", "index.html")])
+                self.assertEqual(self.tree(self.path("remote")), self.tree(self.path("local")))
+
+    def test_checksum_finds_changes_of_the_same_size(self):
+        self.make_tree(self.path("local"))
+        self.upload()
+        self.rewrite_keeping_mtime(self.path("local", "sub dir", "notes.txt"), b"NOTES\n" * 100)
+
+        self.assertEqual(self.upload()['uploaded_count'], 0)
+        result = self.upload(checksum=True)
+        self.assertEqual(result['uploaded_files'], [self.path("remote", "sub dir", "notes.txt")])
+        self.assertEqual(self.tree(self.path("remote")), self.tree(self.path("local")))
+
+    def test_upload_deletes_stale_remote_files(self):
+        self.make_tree(self.path("local"))
+        self.upload()
+        os.remove(self.path("local", "sub dir", "notes.txt"))
+
+        self.assertTrue(os.path.exists(self.path("remote", "sub dir", "notes.txt")))
+        result = self.upload(delete=True)
+        self.assertEqual(result['deleted_files'], ["sub dir/notes.txt"])
+        self.assertFalse(os.path.exists(self.path("remote", "sub dir", "notes.txt")))
+
+    def test_download(self):
+        for mode in ('sftp', 'tar'):
+            with self.subTest(mode=mode):
+                self.reset()
+                files = self.make_tree(self.path("remote"))
+                self.assertEqual(self.download(mode=mode)['downloaded_count'], len(files))
+                self.assertEqual(self.tree(self.path("local")), files)
+
+                result = self.download(mode=mode)
+                self.assertEqual(result['downloaded_count'], 0)
+
+                self.rewrite_keeping_mtime(self.path("remote", "sub dir", "notes.txt"), b"NOTES\n" * 100)
+                self.write(self.path("remote", "new.txt"), b"new")
+                os.remove(self.path("remote", "index.html"))
+                result = self.download(mode=mode, checksum=True, delete=True)
+                self.assertEqual(result['downloaded_count'], 2)
+                self.assertEqual(result['deleted_files'], ["index.html"])
+                self.assertEqual(self.tree(self.path("local")), self.tree(self.path("remote")))
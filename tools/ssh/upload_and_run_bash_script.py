@@ -1,8 +1,20 @@
+from collections import deque
 from decouple import Config, RepositoryEnv
+import codecs
+import json
 import os
+import select
+import time
 from pathlib import Path
 import paramiko
 
+from tools.ssh.connection import get_client, get_sftp
+
+# Bytes read from the channel or the remote file at a time
+CHUNK_SIZE = 32768
+# Seconds between two download progress reports
+PROGRESS_INTERVAL = 2
+
 def ssh_upload_script_execute_and_download(
         host,
         username,
@@ -15,11 +27,24 @@ def ssh_upload_script_execute_and_download(
         timeout=30,
         script_args=None,
         remote_script_dir="/tmp",
-        cleanup_script=True
+        cleanup_script=True,
+        on_stdout=None,
+        on_stderr=None,
+        max_output_lines=1000,
+        download_retries=3,
+        skip_execution=False
 ):
     """
     Upload a bash script to AWS VM, execute it, and download the resulting file.
 
+    The script output is streamed while it runs: every line is passed to on_stdout or
+    on_stderr (by default, printed) as soon as it arrives, and only the last
+    max_output_lines lines of each stream are kept for the result. The output file
+    is downloaded with progress reports. An interrupted download is resumed over a
+    new connection, up to download_retries times; if it still fails, a later call
+    with skip_execution=True resumes it without running the script again, which
+    would rewrite the output file and restart the download.
+
     Args:
         host (str): IP address or hostname of the AWS VM
         username (str): SSH username (e.g., 'ec2-user', 'ubuntu')
@@ -33,6 +58,11 @@ def ssh_upload_script_execute_and_download(
         script_args (str, optional): Arguments to pass to the script
         remote_script_dir (str, optional): Directory to upload script to. Defaults to /tmp
         cleanup_script (bool, optional): Delete script after execution. Defaults to True
+        on_stdout (callable, optional): Called with each stdout line. Defaults to printing it
+        on_stderr (callable, optional): Called with each stderr line. Defaults to printing it
+        max_output_lines (int, optional): Lines of each stream kept for the result. Defaults to 1000
+        download_retries (int, optional): Times an interrupted download is resumed. Defaults to 3
+        skip_execution (bool, optional): Only download the output file of an earlier run. Defaults to False
 
     Returns:
         dict: Result dictionary with status, outputs, and file path
@@ -48,106 +78,97 @@ def ssh_upload_script_execute_and_download(
             script_args='--mode production --output report.csv'
         )
     """
-    ssh_client = None
-    sftp_client = None
 
     try:
         # Validate local script exists
-        if not os.path.exists(local_script_path):
+        if not skip_execution and not os.path.exists(local_script_path):
             raise FileNotFoundError(f"Local script not found: {local_script_path}")
 
-        # Initialize SSH client
-        ssh_client = paramiko.SSHClient()
-        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-        # Prepare connection parameters
-        connect_params = {
-            'hostname': host,
-            'port': port,
-            'username': username,
-            'timeout': timeout
-        }
-
-        # Add authentication
-        if key_file:
-            try:
-                key = paramiko.RSAKey.from_private_key_file(key_file)
-                connect_params['pkey'] = key
-            except paramiko.ssh_exception.SSHException:
-                key = paramiko.DSSKey.from_private_key_file(key_file)
-                connect_params['pkey'] = key
-        elif password:
-            connect_params['password'] = password
-        else:
-            raise ValueError("Either key_file or password must be provided")
-
-        # Connect to the server
-        print(f"Connecting to {host}...")
-        ssh_client.connect(**connect_params)
-        print("✓ Connected successfully!")
+        # Connect, or reuse an open connection to the same server
+        ssh_client = get_client(host, username, key_file=key_file, password=password, port=port, timeout=timeout)
 
         # Open SFTP connection for file upload
-        sftp_client = ssh_client.open_sftp()
-
-        # Determine remote script path
-        script_filename = os.path.basename(local_script_path)
-        remote_script_path = f"{remote_script_dir}/{script_filename}"
-
-        # Upload the script
-        print(f"Uploading script {local_script_path} to {remote_script_path}...")
-        sftp_client.put(local_script_path, remote_script_path)
-        print("✓ Script uploaded successfully!")
-
-        # Make script executable
-        print("Making script executable...")
-        stdin, stdout, stderr = ssh_client.exec_command(f"chmod +x {remote_script_path}")
-        stdout.channel.recv_exit_status()  # Wait for command to complete
-        print("✓ Script is now executable")
-
-        # Build command with arguments if provided
-        if script_args:
-            command = f"{remote_script_path} {script_args}"
+        sftp_client = get_sftp(ssh_client)
+
+        if skip_execution:
+            # Only fetch the output of an earlier run, resuming its download
+            print("Skipping script execution")
+            exit_status = None
+            stdout_output = stderr_output = ''
+            line_counts = {'stdout': 0, 'stderr': 0}
+            remote_script_path = None
         else:
-            command = remote_script_path
-
-        # Execute the script
-        print(f"Executing script: {command}")
-        stdin, stdout, stderr = ssh_client.exec_command(command)
-
-        # Wait for script to complete and capture output
-        exit_status = stdout.channel.recv_exit_status()
-        stdout_output = stdout.read().decode('utf-8')
-        stderr_output = stderr.read().decode('utf-8')
-
-        print(f"Script exit status: {exit_status}")
-
-        if stdout_output:
-            print(f"STDOUT:\n{stdout_output}")
-        if stderr_output:
-            print(f"STDERR:\n{stderr_output}")
-
-        # Check if script executed successfully
-        if exit_status != 0:
-            result = {
-                'success': False,
-                'exit_status': exit_status,
-                'stdout': stdout_output,
-                'stderr': stderr_output,
-                'remote_script_path': remote_script_path,
-                'error': 'Script execution failed'
+            # Determine remote script path
+            script_filename = os.path.basename(local_script_path)
+            remote_script_path = f"{remote_script_dir}/{script_filename}"
+
+            # Upload the script
+            print(f"Uploading script {local_script_path} to {remote_script_path}...")
+            sftp_client.put(local_script_path, remote_script_path)
+            print("✓ Script uploaded successfully!")
+
+            # Make script executable
+            print("Making script executable...")
+            stdin, stdout, stderr = ssh_client.exec_command(f"chmod +x {remote_script_path}")
+            stdout.channel.recv_exit_status()  # Wait for command to complete
+            print("✓ Script is now executable")
+
+            # Build command with arguments if provided
+            if script_args:
+                command = f"{remote_script_path} {script_args}"
+            else:
+                command = remote_script_path
+
+            # Execute the script, streaming its output while it runs
+            print(f"Executing script: {command}")
+            channel = ssh_client.get_transport().open_session()
+            channel.exec_command(command)
+            channel.shutdown_write()
+
+            stdout_lines = deque(maxlen=max_output_lines)
+            stderr_lines = deque(maxlen=max_output_lines)
+            callbacks = {
+                'stdout': on_stdout or (lambda line: print(f"  {line}")),
+                'stderr': on_stderr or (lambda line: print(f"  STDERR: {line}")),
             }
-
-            # Cleanup even on failure if requested
-            if cleanup_script:
-                try:
-                    sftp_client.remove(remote_script_path)
-                    print(f"✓ Cleaned up script: {remote_script_path}")
-                except:
-                    pass
-
-            return result
-
-        print("✓ Script executed successfully!")
+            buffers = {'stdout': stdout_lines, 'stderr': stderr_lines}
+            line_counts = {'stdout': 0, 'stderr': 0}
+            for stream, line in iter_command_output(channel):
+                callbacks[stream](line)
+                buffers[stream].append(line)
+                line_counts[stream] += 1
+
+            exit_status = channel.recv_exit_status()
+            stdout_output = "\n".join(stdout_lines)
+            stderr_output = "\n".join(stderr_lines)
+
+            print(f"Script exit status: {exit_status}")
+            for stream, count in line_counts.items():
+                if count > max_output_lines:
+                    print(f"  ({count - max_output_lines} earlier {stream} lines not kept in the result)")
+
+            # Check if script executed successfully
+            if exit_status != 0:
+                result = {
+                    'success': False,
+                    'exit_status': exit_status,
+                    'stdout': stdout_output,
+                    'stderr': stderr_output,
+                    'remote_script_path': remote_script_path,
+                    'error': 'Script execution failed'
+                }
+
+                # Cleanup even on failure if requested
+                if cleanup_script:
+                    try:
+                        sftp_client.remove(remote_script_path)
+                        print(f"✓ Cleaned up script: {remote_script_path}")
+                    except:
+                        pass
+
+                return result
+
+            print("✓ Script executed successfully!")
 
         # Download the output file
         print(f"Downloading file from {remote_file_path}...")
@@ -157,15 +178,23 @@ def ssh_upload_script_execute_and_download(
         if local_dir:
             Path(local_dir).mkdir(parents=True, exist_ok=True)
 
-        # Download the file
-        sftp_client.get(remote_file_path, local_download_path)
+        # Download the file, resuming it over a new connection if it is interrupted
+        for attempt in range(download_retries + 1):
+            try:
+                file_stats = download_with_resume(sftp_client, remote_file_path, local_download_path)
+                break
+            except FileNotFoundError:
+                raise
+            except (EOFError, OSError, paramiko.SSHException) as e:
+                if attempt == download_retries:
+                    raise
+                print(f"⚠ Download interrupted ({e}), resuming...")
+                ssh_client = get_client(host, username, key_file=key_file, password=password, port=port, timeout=timeout)
+                sftp_client = get_sftp(ssh_client)
         print(f"✓ File downloaded successfully to {local_download_path}")
 
-        # Get file stats
-        file_stats = sftp_client.stat(remote_file_path)
-
         # Cleanup script if requested
-        if cleanup_script:
+        if cleanup_script and not skip_execution:
             try:
                 sftp_client.remove(remote_script_path)
                 print(f"✓ Cleaned up script: {remote_script_path}")
@@ -177,11 +206,13 @@ def ssh_upload_script_execute_and_download(
             'exit_status': exit_status,
             'stdout': stdout_output,
             'stderr': stderr_output,
+            'stdout_line_count': line_counts['stdout'],
+            'stderr_line_count': line_counts['stderr'],
             'local_file_path': local_download_path,
             'remote_file_path': remote_file_path,
             'remote_script_path': remote_script_path,
             'file_size': file_stats.st_size,
-            'script_cleaned_up': cleanup_script
+            'script_cleaned_up': cleanup_script and not skip_execution
         }
 
     except paramiko.AuthenticationException:
@@ -208,13 +239,102 @@ def ssh_upload_script_execute_and_download(
             'success': False,
             'error': str(e)
         }
-    finally:
-        # Clean up connections
-        if sftp_client:
-            sftp_client.close()
-        if ssh_client:
-            ssh_client.close()
-            print("Connection closed")
+
+def iter_command_output(channel):
+    """
+    Yields ('stdout', line) and ('stderr', line) pairs from a channel running a
+    command, as they arrive, until the command exits and its output is read.
+
+    Both streams are read as data comes in, so a command writing a lot to one of
+    them can never stall on a full channel window.
+    """
+    decoders = {
+        'stdout': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+        'stderr': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+    }
+    partial = {'stdout': '', 'stderr': ''}
+
+    def feed(stream, data, final=False):
+        text = partial[stream] + decoders[stream].decode(data, final)
+        lines = text.split("\n")
+        partial[stream] = lines.pop()
+        if final and partial[stream]:
+            lines.append(partial[stream])
+        return [(stream, line.rstrip("\r")) for line in lines]
+
+    while True:
+        received = False
+        if channel.recv_ready():
+            yield from feed('stdout', channel.recv(CHUNK_SIZE))
+            received = True
+        if channel.recv_stderr_ready():
+            yield from feed('stderr', channel.recv_stderr(CHUNK_SIZE))
+            received = True
+        if received:
+            continue
+        if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+            break
+        # The channel becomes readable with stdout data; stderr is polled
+        select.select([channel], [], [], 0.1)
+
+    # Drain what arrived with the exit status
+    for stream, recv in (('stdout', channel.recv), ('stderr', channel.recv_stderr)):
+        for data in iter(lambda: recv(CHUNK_SIZE), b''):
+            yield from feed(stream, data)
+        yield from feed(stream, b'', final=True)
+
+
+def download_with_resume(sftp_client, remote_path, local_path):
+    """
+    Downloads a remote file with progress reports, into local_path + '.part' until
+    complete. A '.part' file left by an interrupted download of the same remote
+    file (same size and modification time) is resumed from where it stopped.
+
+    Returns:
+        SFTPAttributes: The stats of the remote file.
+    """
+    file_stats = sftp_client.stat(remote_path)
+    part_path = local_path + '.part'
+    state_path = part_path + '.json'
+    state = {'size': file_stats.st_size, 'mtime': file_stats.st_mtime}
+
+    offset = 0
+    try:
+        with open(state_path) as f:
+            if json.load(f) == state:
+                offset = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        pass
+    if offset > file_stats.st_size:
+        offset = 0
+    if offset:
+        print(f"  Resuming download at {offset / 1048576:.2f} MB")
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+
+    total = file_stats.st_size
+    started = time.monotonic()
+    last_report = started
+    with sftp_client.open(remote_path, 'rb') as remote_file, open(part_path, 'ab' if offset else 'wb') as local_file:
+        remote_file.seek(offset)
+        # Keep many read requests in flight instead of one round trip per chunk
+        remote_file.prefetch(total)
+        received = offset
+        for data in iter(lambda: remote_file.read(CHUNK_SIZE), b''):
+            local_file.write(data)
+            received += len(data)
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                rate = (received - offset) / (now - started) / 1048576
+                print(f"  Downloaded {received / 1048576:.2f}/{total / 1048576:.2f} MB "
+                      f"({received * 100 // max(total, 1)}%, {rate:.2f} MB/s)")
+
+    if received != total:
+        raise IOError(f"Downloaded {received} of {total} bytes of {remote_path}")
+    os.replace(part_path, local_path)
+    os.remove(state_path)
+    return file_stats
 
 
 # Example usage
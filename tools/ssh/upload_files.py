@@ -1,8 +1,22 @@
 import os
+import posixpath
+import queue
+import threading
+import time
 import paramiko
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from decouple import Config, RepositoryEnv
 
+from tools.ssh.connection import get_client
+from tools.ssh.delta import (
+    changed_paths, local_listing, local_sha256, remote_delete, remote_listing, remote_sha256_of, stale_paths
+)
+from tools.ssh.tar_stream import tar_upload
+
+# Seconds between two aggregate progress reports
+PROGRESS_INTERVAL = 2
+
 def ssh_upload_folder(
         host,
         username,
@@ -11,12 +25,36 @@ def ssh_upload_folder(
         key_file=None,
         password=None,
         port=22,
-        timeout=30
+        timeout=30,
+        max_channels=4,
+        mode='sftp',
+        verify=True,
+        incremental=False,
+        checksum=False,
+        delete=False
 ):
     """
     Uploads all files and subdirectories from a local folder to a target remote folder
     using SFTP. Creates remote directories as needed.
 
+    All remote directories are created by a single remote command, then files are
+    uploaded concurrently over max_channels SFTP channels sharing the one SSH
+    connection, with pipelined writes. Progress is reported for the whole upload
+    rather than per file. OpenSSH allows 10 sessions per connection by default
+    (MaxSessions), so keep max_channels below that.
+
+    With mode='tar', files are instead sent as one gzipped tar stream unpacked by
+    tar on the server, which avoids per-file round trips for trees of many small
+    files, and are verified by SHA-256 checksums unless verify is False. The server
+    needs GNU tar and sha256sum.
+
+    With incremental=True, the remote files are listed with one find command and
+    only new files and files whose size or modification time differ are uploaded;
+    with checksum=True, files of the same size are compared by SHA-256 instead of
+    modification time. Uploaded files keep their local modification time, so the
+    next run sees them as unchanged. With delete=True, remote files that no longer
+    exist locally are deleted. The server needs GNU find.
+
     Args:
         host (str): IP address or hostname of the remote server
         username (str): SSH username
@@ -26,100 +64,121 @@ def ssh_upload_folder(
         password (str, optional): SSH password
         port (int, optional): SSH port. Defaults to 22
         timeout (int, optional): Connection timeout. Defaults to 30
+        max_channels (int, optional): Number of concurrent SFTP channels. Defaults to 4
+        mode (str, optional): 'sftp' or 'tar'. Defaults to 'sftp'
+        verify (bool, optional): Verify checksums in 'tar' mode. Defaults to True
+        incremental (bool, optional): Only upload new and changed files. Defaults to False
+        checksum (bool, optional): Compare files by checksum in incremental mode. Defaults to False
+        delete (bool, optional): Delete remote files missing locally in incremental mode. Defaults to False
 
     Returns:
         dict: Result dictionary with status and list of uploaded files.
     """
-    ssh_client = None
-    sftp_client = None
-    uploaded_files = []
-
-    # Helper function to create remote directory using SSH
-    def remote_mkdir_p(client, remote_path):
-        """Ensures remote directory exists, similar to mkdir -p."""
-        command = f"mkdir -p {remote_path}"
-        stdin, stdout, stderr = client.exec_command(command)
-        if stdout.channel.recv_exit_status() != 0:
-            raise paramiko.SSHException(f"Failed to create remote directory {remote_path}: {stderr.read().decode()}")
+    sftp_clients = []
+    failed_files = []
+    deleted_files = []
+    unchanged_count = 0
 
     try:
+        if mode not in ('sftp', 'tar'):
+            raise ValueError(f"Unknown transfer mode: {mode}")
+
         # Validate local folder existence
         local_folder = os.path.abspath(local_folder)
         if not os.path.isdir(local_folder):
             raise FileNotFoundError(f"Local folder not found or is not a directory: {local_folder}")
 
-        # Initialize SSH client
-        ssh_client = paramiko.SSHClient()
-        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-        # Prepare connection parameters
-        connect_params = {
-            'hostname': host,
-            'port': port,
-            'username': username,
-            'timeout': timeout
-        }
+        # Connect, or reuse an open connection to the same server
+        ssh_client = get_client(host, username, key_file=key_file, password=password, port=port, timeout=timeout)
 
-        # Add authentication
-        if key_file:
-            try:
-                key = paramiko.RSAKey.from_private_key_file(key_file)
-                connect_params['pkey'] = key
-            except paramiko.ssh_exception.SSHException:
-                # Try DSSKey if RSAKey fails
-                key = paramiko.DSSKey.from_private_key_file(key_file)
-                connect_params['pkey'] = key
-        elif password:
-            connect_params['password'] = password
-        else:
-            raise ValueError("Either key_file or password must be provided")
-
-        # Connect to the server
-        print(f"Connecting to {host}...")
-        ssh_client.connect(**connect_params)
-        print("✓ Connected successfully!")
-
-        # Open SFTP connection
-        sftp_client = ssh_client.open_sftp()
-
-        # Ensure the remote base folder exists
-        remote_mkdir_p(ssh_client, remote_folder)
-        print(f"Ensured remote target folder exists: {remote_folder}")
-
-        # Walk through the local folder
-        print(f"Starting upload from {local_folder} to {remote_folder}...")
+        # Collect the remote directories and the files to upload
+        remote_dirs = [remote_folder]
+        file_pairs = []
         for root, dirs, files in os.walk(local_folder):
             # Calculate the relative path from the base local_folder
             relative_path = os.path.relpath(root, local_folder)
 
             # Calculate the corresponding remote path for the current root
-            remote_current_dir = os.path.join(remote_folder, relative_path).replace("\\",
-                                                                                    "/")  # Use forward slashes for remote paths
+            remote_current_dir = _remote_join(remote_folder, relative_path)
 
-            # 1. Create subdirectories on the remote server
             for dir_name in dirs:
-                remote_sub_dir = os.path.join(remote_current_dir, dir_name).replace("\\", "/")
-                # Ensure directory exists before uploading files to it
-                remote_mkdir_p(ssh_client, remote_sub_dir)
+                remote_dirs.append(_remote_join(remote_current_dir, dir_name))
 
-            # 2. Upload files
             for file_name in files:
                 local_file_path = os.path.join(root, file_name)
-                remote_file_path = os.path.join(remote_current_dir, file_name).replace("\\", "/")
+                file_pairs.append((local_file_path, _remote_join(remote_current_dir, file_name)))
 
-                print(f"  Uploading: {relative_path}/{file_name} -> {remote_file_path}")
-                sftp_client.put(local_file_path, remote_file_path)
-                uploaded_files.append(remote_file_path)
+        if incremental:
+            # Keep only new and changed files, compared with one remote listing
+            local_files = local_listing(local_folder)
+            remote_files = remote_listing(ssh_client, remote_folder)
+            if checksum:
+                changed = changed_paths(
+                    local_files,
+                    remote_files,
+                    local_sha256(local_folder),
+                    remote_sha256_of(ssh_client, remote_folder)
+                )
+            else:
+                changed = changed_paths(local_files, remote_files)
+            unchanged_count = len(local_files) - len(changed)
+            file_pairs = [
+                (os.path.join(local_folder, *relative_path.split("/")), _remote_join(remote_folder, relative_path))
+                for relative_path in changed
+            ]
+            print(f"Incremental upload: {len(changed)} new or changed files, {unchanged_count} unchanged")
+
+            if delete:
+                deleted_files = stale_paths(local_files, remote_files)
+                remote_delete(ssh_client, remote_folder, deleted_files)
+                print(f"Deleted {len(deleted_files)} stale remote files")
+
+        # 1. Create every remote directory in one round trip
+        if file_pairs or not incremental:
+            remote_mkdir_p(ssh_client, remote_dirs)
+            print(f"Ensured {len(remote_dirs)} remote folders exist under: {remote_folder}")
+
+        if mode == 'tar' and file_pairs:
+            # 2. Upload files as one tar stream
+            print(f"Starting tar stream upload of {len(file_pairs)} files from {local_folder} to {remote_folder}...")
+            relative_paths = [
+                os.path.relpath(local_path, local_folder).replace("\\", "/") for local_path, _ in file_pairs
+            ]
+            results = tar_upload(ssh_client, local_folder, remote_folder, relative_paths, verify=verify)
+            uploaded_files = []
+            for relative_path, status in results.items():
+                if status == 'ok':
+                    uploaded_files.append(_remote_join(remote_folder, relative_path))
+                else:
+                    print(f"  ✗ {relative_path}: {status}")
+                    failed_files.append({'file': relative_path, 'status': status})
+        elif file_pairs:
+            # 2. Upload files over concurrent SFTP channels
+            print(f"Starting upload of {len(file_pairs)} files from {local_folder} to {remote_folder} "
+                  f"over {max_channels} channels...")
+            transport = ssh_client.get_transport()
+            for _ in range(min(max_channels, len(file_pairs))):
+                sftp_clients.append(paramiko.SFTPClient.from_transport(transport))
+            # tar keeps modification times, SFTP only when asked to
+            uploaded_files = upload_files_concurrently(sftp_clients, file_pairs, preserve_times=incremental)
+        else:
+            uploaded_files = []
 
         print(f"✓ Upload complete. Total files uploaded: {len(uploaded_files)}")
 
-        return {
-            'success': True,
+        result = {
+            'success': not failed_files,
             'uploaded_count': len(uploaded_files),
             'uploaded_files': uploaded_files,
+            'failed_files': failed_files,
+            'unchanged_count': unchanged_count,
+            'deleted_files': deleted_files,
             'local_folder': local_folder,
             'remote_folder': remote_folder
         }
+        if failed_files:
+            result['error'] = f"{len(failed_files)} files failed verification"
+        return result
 
     except paramiko.AuthenticationException:
         print("✗ Authentication failed!")
@@ -146,12 +205,85 @@ def ssh_upload_folder(
             'error': str(e)
         }
     finally:
-        # Clean up connections
-        if sftp_client:
+        # Close the upload channels; the connection stays open for reuse
+        for sftp_client in sftp_clients:
             sftp_client.close()
-        if ssh_client:
-            ssh_client.close()
-            print("Connection closed")
+
+
+def remote_mkdir_p(client, remote_paths):
+    """Ensures remote directories exist, similar to mkdir -p, with one command."""
+    # Paths are passed NUL-separated on stdin, so any number fits and none needs escaping
+    stdin, stdout, stderr = client.exec_command("xargs -0 mkdir -p --")
+    stdin.write("\0".join(remote_paths))
+    stdin.channel.shutdown_write()
+    if stdout.channel.recv_exit_status() != 0:
+        raise paramiko.SSHException(f"Failed to create remote directories: {stderr.read().decode()}")
+
+
+def upload_files_concurrently(sftp_clients, file_pairs, preserve_times=False):
+    """
+    Uploads (local_path, remote_path) pairs, each SFTP client uploading one file at
+    a time. Returns the remote paths in the order given.
+    """
+    idle_clients = queue.Queue()
+    for sftp_client in sftp_clients:
+        idle_clients.put(sftp_client)
+    progress = _Progress(
+        len(file_pairs), sum(os.path.getsize(local_path) for local_path, _ in file_pairs), "Uploaded"
+    )
+
+    def upload(local_path, remote_path):
+        sftp_client = idle_clients.get()
+        try:
+            with open(local_path, 'rb') as f:
+                # putfo pipelines the writes; confirm=False saves a stat round trip
+                sftp_client.putfo(f, remote_path, confirm=False)
+            if preserve_times:
+                stat = os.stat(local_path)
+                sftp_client.utime(remote_path, (stat.st_atime, stat.st_mtime))
+        finally:
+            idle_clients.put(sftp_client)
+        progress.add(os.path.getsize(local_path))
+        return remote_path
+
+    with ThreadPoolExecutor(max_workers=len(sftp_clients)) as executor:
+        futures = [executor.submit(upload, *pair) for pair in file_pairs]
+        uploaded_files = [future.result() for future in futures]
+    progress.report(force=True)
+    return uploaded_files
+
+
+class _Progress:
+    """Thread-safe aggregate progress, printed every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, total_files, total_bytes, verb):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.verb = verb
+        self.files = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.last_report = time.monotonic()
+
+    def add(self, size):
+        with self.lock:
+            self.files += 1
+            self.bytes += size
+        self.report()
+
+    def report(self, force=False):
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_report < PROGRESS_INTERVAL:
+                return
+            self.last_report = now
+            print(f"  {self.verb} {self.files}/{self.total_files} files, "
+                  f"{self.bytes / 1048576:.2f}/{self.total_bytes / 1048576:.2f} MB")
+
+
+def _remote_join(*parts):
+    """Joins path parts with forward slashes, for remote paths"""
+    return posixpath.normpath(posixpath.join(*(part.replace("\\", "/") for part in parts)))
 
 
 # Example usage
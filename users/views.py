@@ -10,6 +10,7 @@ from django.urls import reverse_lazy, reverse
 from django.urls.exceptions import NoReverseMatch
 
 from django.views.generic import UpdateView
+from base.sites import resolve_site
 from .forms import UserUpdateForm, UserRegisterForm
 
 User = get_user_model()
@@ -23,10 +24,9 @@ class CustomLoginView(LoginView):
         # Custom code to get the site_root url if it exists.
 
         if self.next_page == "site_root":
-            from wagtail.models import Site
-            site = Site.find_for_request(request)
-            if site:
-                self.next_page = site.root_page.url
+            root_url = resolve_site(request).root_url
+            if root_url:
+                self.next_page = root_url
         return super().dispatch(request, *args, **kwargs)
 
 
@@ -58,10 +58,9 @@ class CustomLogoutView(LogoutView):
         # Custom code to get the site_root url if it exists.
 
         if self.next_page == "site_root":
-            from wagtail.models import Site
-            site = Site.find_for_request(request)
-            if site:
-                self.next_page = site.root_page.url
+            root_url = resolve_site(request).root_url
+            if root_url:
+                self.next_page = root_url
         return super().dispatch(request, *args, **kwargs)
 
 